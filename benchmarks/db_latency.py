@@ -0,0 +1,127 @@
+# chess_opening_trainer/benchmarks/db_latency.py
+"""
+比較預設 SQLite 設定與調校後設定（WAL + pragmas + 複合索引）的查詢與 commit 延遲。
+
+    python -m chess_opening_trainer.benchmarks.db_latency [錯題數]
+
+在暫存目錄建立兩個各含 N 筆（預設 100,000）錯題的資料庫，量測：
+    * 訓練時以 (user_id, position_key) 查詢錯題
+    * 分析時以 (user_id, position_key, opening_id) 查詢錯題
+    * 以 (user_id, last_missed_at) 取出某批次錯題
+    * 單筆更新後 commit 的延遲
+"""
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from ..database.database import Base, create_sqlite_engine
+from ..database.models import Mistake, Opening, User
+
+USERS = 4
+OPENINGS_PER_USER = 5
+QUERIES = 2000
+BATCH_QUERIES = 200
+COMMITS = 300
+
+
+def _random_epd(rng: random.Random) -> str:
+    """產生長度與真實 EPD 相近、且幾乎不重複的字串。"""
+    rows = []
+    for _ in range(8):
+        row = "".join(rng.choice("pnbrqkPNBRQK1234") for _ in range(rng.randint(3, 8)))
+        rows.append(row)
+    return "/".join(rows) + f" {rng.choice('wb')} KQkq -"
+
+
+def _build(path: str, tuned: bool, count: int, seed: int):
+    engine = create_sqlite_engine(f"sqlite:///{path}", tuned=tuned)
+    Base.metadata.create_all(bind=engine)
+    if not tuned:
+        # 對照組：不建立任何次要索引
+        with engine.begin() as conn:
+            for index in Mistake.__table__.indexes:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+    rng = random.Random(seed)
+    base_time = datetime.datetime(2025, 1, 1)
+    batch_times = [base_time + datetime.timedelta(hours=h) for h in range(500)]
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": u, "username": f"user{u}", "lichess_username": f"li{u}"} for u in range(1, USERS + 1)
+        ])
+        conn.execute(Opening.__table__.insert(), [
+            {"id": (u - 1) * OPENINGS_PER_USER + o, "name": f"op{o}", "pgn_path": "x.pgn", "user_id": u, "side": o % 2}
+            for u in range(1, USERS + 1) for o in range(1, OPENINGS_PER_USER + 1)
+        ])
+        rows = []
+        for _ in range(count):
+            user_id = rng.randint(1, USERS)
+            rows.append({
+                "position_key": rng.randint(-(1 << 63), (1 << 63) - 1),
+                "epd": _random_epd(rng),
+                "correct_move_uci": "e2e4",
+                "user_id": user_id,
+                "opening_id": (user_id - 1) * OPENINGS_PER_USER + rng.randint(1, OPENINGS_PER_USER),
+                "miss_count": rng.randint(1, 5),
+                "last_missed_at": rng.choice(batch_times),
+            })
+        conn.execute(Mistake.__table__.insert(), rows)
+        conn.execute(text("ANALYZE"))
+    return engine, rows, batch_times
+
+
+def _timed(fn, repeat: int) -> float:
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.mean(samples)
+
+
+def run(count: int = 100000):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, tuned in (("預設", False), ("調校後", True)):
+            engine, rows, batch_times = _build(os.path.join(tmp, f"{label}.db"), tuned, count, seed=7)
+            session = sessionmaker(bind=engine)()
+            rng = random.Random(11)
+            probes = [rng.choice(rows) for _ in range(QUERIES)]
+
+            key_lookup = _timed(lambda i: session.query(Mistake).filter_by(
+                user_id=probes[i]["user_id"], position_key=probes[i]["position_key"]).first(), QUERIES)
+            upsert_lookup = _timed(lambda i: session.query(Mistake).filter_by(
+                user_id=probes[i]["user_id"], position_key=probes[i]["position_key"],
+                opening_id=probes[i]["opening_id"]).first(), QUERIES)
+            batch_lookup = _timed(lambda i: session.query(Mistake).filter(
+                Mistake.last_missed_at == batch_times[i % len(batch_times)],
+                Mistake.user_id == 1 + i % USERS).all(), BATCH_QUERIES)
+
+            connection = engine.connect()
+
+            def update_and_commit(i):
+                with connection.begin():
+                    connection.execute(text(
+                        "UPDATE mistakes SET miss_count = miss_count + 1 WHERE id = :id"), {"id": i + 1})
+            commit_latency = _timed(update_and_commit, COMMITS)
+            connection.close()
+
+            results[label] = (key_lookup, upsert_lookup, batch_lookup, commit_latency)
+            session.close()
+            engine.dispose()
+
+    print(f"錯題數: {count:,}（平均延遲，毫秒）")
+    print(f"{'':<8}{'(user,key)':>14}{'(user,key,op)':>16}{'批次查詢':>12}{'commit':>12}")
+    for label, (key_lookup, upsert_lookup, batch_lookup, commit_latency) in results.items():
+        print(f"{label:<8}{key_lookup:>14.3f}{upsert_lookup:>16.3f}{batch_lookup:>12.3f}{commit_latency:>12.3f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
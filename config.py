@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import os
+import shutil
 from pathlib import Path
 
 # --- 基本路徑設定 ---
@@ -10,16 +11,52 @@ RESOURCES_DIR = BASE_DIR / "resources"
 # 確保資料目錄存在
 DATA_DIR.mkdir(exist_ok=True)
 (DATA_DIR / "openings").mkdir(exist_ok=True)
+# 由 PGN 編譯出的 mmap 開局樹快取
+COMPILED_OPENINGS_DIR = DATA_DIR / "openings" / "compiled"
+COMPILED_OPENINGS_DIR.mkdir(exist_ok=True)
+# 匯入 Polyglot 開局書時最多展開的走法節點數（換序到達的局面會在每條路線重複展開）
+BOOK_IMPORT_MAX_NODES = 200000
 
 # --- 資料庫設定 ---
 DB_NAME = "trainer_data.db"
 DB_PATH = DATA_DIR / DB_NAME
 # SQLAlchemy 連線字串
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH.as_posix()}"
+# 背景寫入執行緒：最多累積這麼久（秒）或這麼多筆寫入意圖後提交一次
+WRITE_BEHIND_INTERVAL = 0.5
+WRITE_BEHIND_MAX_BATCH = 500
+# 切換帳號前等待背景寫入完成的次數（每次最多 5 秒）；仍未完成時取消切換
+PROFILE_SWITCH_FLUSH_ATTEMPTS = 3
+
+# --- 帳號設定 ---
+# 每個帳號使用獨立的 SQLite 檔；預設帳號沿用上面的 trainer_data.db
+PROFILES_DIR = DATA_DIR / "profiles"
+PROFILES_DIR.mkdir(exist_ok=True)
+DEFAULT_PROFILE = "default"
+# 記錄上次使用的帳號
+ACTIVE_PROFILE_FILE = PROFILES_DIR / "active_profile"
+# 改存資料庫前的練習進度（只有一個開局庫），預設帳號第一次載入該開局庫時匯入後改名
+LEGACY_PROGRESS_FILE = DATA_DIR / "user_data" / "progress.json"
+# 同時保持開啟的帳號資料庫引擎數，超過時關閉最久未使用的
+PROFILE_ENGINE_POOL_SIZE = 4
 
 # --- 訓練設定 ---
 REVIEW_CORRECT_DELAY = 1000   # ms
 REVIEW_CYCLE_DELAY = 1500     # ms
+# 錯題複習每次從資料庫讀取的筆數
+REVIEW_PAGE_SIZE = 200
+# 間隔重複（SM-2）：初始與最低難易度係數；每輪最多加入的新路線數
+SRS_INITIAL_EASE = 2.5
+SRS_MIN_EASE = 1.3
+SRS_NEW_LINES_PER_ROUND = 20
+# 快速練習每次預先排入的局面數（到期錯題優先，其餘從開局樹抽樣）
+DRILL_QUEUE_SIZE = 100
+
+# --- 引擎設定 ---
+# 任何本機 UCI 引擎皆可；未設定時嘗試從 PATH 找 stockfish，找不到則不做引擎評估
+ENGINE_PATH = os.environ.get("CHESS_ENGINE_PATH") or shutil.which("stockfish") or ""
+ENGINE_DEPTH = 16
+ENGINE_POOL_SIZE = os.cpu_count() or 1
 
 # --- API 設定 (Lichess 為範例) ---
 LICHESS_API_BASE_URL = "https://lichess.org/api"
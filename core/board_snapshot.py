@@ -0,0 +1,72 @@
+# chess_opening_trainer/core/board_snapshot.py
+from typing import Dict, NamedTuple, Optional
+
+import chess
+
+# 依 chess.PAWN..chess.KING 的順序
+_PIECE_TYPES = (chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN, chess.KING)
+
+
+class BoardSnapshot(NamedTuple):
+    """
+    給 GUI 顯示用的唯讀局面快照：只有 bitboard、輪到哪方、易位權、過路兵格與上一步，
+    大小固定，與路線深度無關（不複製走法堆疊與局面歷史）。
+    需要判斷合法走法時再以 board() 組回 chess.Board。
+    """
+    white: int
+    black: int
+    pawns: int
+    knights: int
+    bishops: int
+    rooks: int
+    queens: int
+    kings: int
+    turn: chess.Color
+    castling_rights: int
+    ep_square: Optional[int]
+    last_move: Optional[chess.Move] = None
+
+    @classmethod
+    def from_board(cls, board: chess.Board, last_move: Optional[chess.Move] = None) -> "BoardSnapshot":
+        """last_move 未指定時取走法堆疊的最後一步（堆疊為空時為 None）。"""
+        if last_move is None and board.move_stack:
+            last_move = board.peek()
+        return cls(board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK],
+                   board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+                   board.turn, board.castling_rights, board.ep_square, last_move)
+
+    def _type_boards(self):
+        return (self.pawns, self.knights, self.bishops, self.rooks, self.queens, self.kings)
+
+    def piece_at(self, square: chess.Square) -> Optional[chess.Piece]:
+        mask = chess.BB_SQUARES[square]
+        if not (self.white | self.black) & mask:
+            return None
+        color = bool(self.white & mask)
+        for piece_type, bb in zip(_PIECE_TYPES, self._type_boards()):
+            if bb & mask:
+                return chess.Piece(piece_type, color)
+        return None
+
+    def piece_type_at(self, square: chess.Square) -> Optional[chess.PieceType]:
+        piece = self.piece_at(square)
+        return piece.piece_type if piece else None
+
+    def piece_map(self) -> Dict[chess.Square, chess.Piece]:
+        pieces = {}
+        for piece_type, bb in zip(_PIECE_TYPES, self._type_boards()):
+            for square in chess.scan_forward(bb):
+                pieces[square] = chess.Piece(piece_type, bool(self.white & chess.BB_SQUARES[square]))
+        return pieces
+
+    def board(self) -> chess.Board:
+        """組回可產生合法走法的 chess.Board（沒有走法堆疊）。"""
+        board = chess.Board.empty()
+        board.set_piece_map(self.piece_map())
+        board.turn = self.turn
+        board.castling_rights = self.castling_rights
+        board.ep_square = self.ep_square
+        return board
+
+
+STARTING_BOARD_SNAPSHOT = BoardSnapshot.from_board(chess.Board())
@@ -8,7 +8,10 @@ import logging
 # 假設依賴的服務與模型已正確導入
 from ..services.lichess_api import LichessAPI
 from .opening_manager import OpeningManager, Opening
-from ..database.models import Mistake
+from .opponent_replies import OpponentReplyStats
+from .daily_stats import apply_stat_rows, stat_row
+from .mistakes import mistake_row, mistake_upsert_statement
+from ..database.models import AnalysisBatch, BatchMistake, Mistake
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +27,12 @@ class DailyPerformanceAnalyzer:
         self.db_session = db_session
         self.opening_manager = opening_manager
         self.analysis_batch_time = None
+        self.analysis_batch_id = None
+        # (position_key, opening_id) -> 錯題欄位；批次結束時一次寫入
+        self._pending_mistakes: Dict[tuple, dict] = {}
+        # (opening_id, 對局日期) -> 偏差數；daily_stats 依對局當天累加，而不是分析當天
+        self._pending_stats: Dict[tuple, int] = {}
+        self.reply_stats = OpponentReplyStats(db_session, user_id)
 
     def analyze_performance(self, time_range: str = "最近7天") -> Dict:
         """
@@ -31,6 +40,9 @@ class DailyPerformanceAnalyzer:
         """
         try:
             self.analysis_batch_time = datetime.datetime.utcnow()
+            self.analysis_batch_id = None
+            self._pending_mistakes = {}
+            self._pending_stats = {}
             start_time = self._parse_time_range(time_range)
             
             lichess_api = LichessAPI(self.lichess_username)
@@ -60,9 +72,16 @@ class DailyPerformanceAnalyzer:
                             all_deviation_details.extend(res['deviation_details'])
                 except Exception as e:
                     logger.error(f"分析對局時發生錯誤: {e}")
-                    
-            mistake_objs = self._get_last_analysis_mistakes(self.analysis_batch_time)
-            unique_mistakes = self._deduplicate_mistakes(mistake_objs)
+            
+            # 寫入本批次的對手應著統計，並產生未覆蓋應著報告
+            try:
+                self.reply_stats.flush()
+            except Exception as e:
+                logger.error(f"更新對手應著統計失敗: {e}")
+            uncovered_replies = self.get_uncovered_replies()
+
+            self.analysis_batch_id = self._write_batch(time_range, total_games, total_deviations)
+            unique_mistakes = self._get_last_analysis_mistakes(self.analysis_batch_id)
             
             # 新增：按開局名稱對偏差詳情進行分組
             deviation_by_opening = {}
@@ -79,7 +98,8 @@ class DailyPerformanceAnalyzer:
                 'total_deviations': total_deviations,
                 'mistakes': unique_mistakes,
                 'deviation_details': all_deviation_details,  # 新增：所有偏差詳情
-                'deviation_by_opening': deviation_by_opening  # 新增：按開局分組的偏差
+                'deviation_by_opening': deviation_by_opening,  # 新增：按開局分組的偏差
+                'uncovered_replies': uncovered_replies  # 最常見的未覆蓋對手應著
             }
         except Exception as e:
             logger.error(f"執行表現分析時發生錯誤: {e}")
@@ -115,6 +135,9 @@ class DailyPerformanceAnalyzer:
             return {'deviation_count': 0, 'deviation_details': []}
             
         moves = list(game.mainline_moves())
+        # 同一盤棋只計入一次對手應著統計
+        count_replies = self.reply_stats.begin_game(game)
+        game_day = self._game_day(headers)
         deviation_count = 0
         deviation_details = []  # 新增：收集此對局的偏差詳情
         
@@ -159,9 +182,12 @@ class DailyPerformanceAnalyzer:
                     else:
                         # 找出正確的走法
                         correct_moves = []
+                        correct_moves_san = []
                         for child in current_node.variations:
                             if board.is_legal(child.move):
                                 correct_moves.append(child.move.uci())
+                                # .rep 開局樹的 SAN 在編譯時已產生
+                                correct_moves_san.append(child.san())
                         
                         if correct_moves:  # 只有在有正確走法時才記錄偏差
                             logger.info(f"發現偏差: fen={board.fen()}，開局庫={op.name}，move={move.uci()}, 正確走法={correct_moves}")
@@ -174,13 +200,15 @@ class DailyPerformanceAnalyzer:
                                 'fen': board.fen(),
                                 'user_move': move.uci(),
                                 'correct_moves': correct_moves,
+                                'correct_moves_san': correct_moves_san,
+                                'user_move_san': board.san(move),
                                 'move_number': board.fullmove_number,
                                 'position': self._get_position_description(board)
                             }
                             deviation_details.append(deviation_detail)
                             
                             try:
-                                self._save_mistake_from_board(board, current_node, op)
+                                self._save_mistake_from_board(board, current_node, op, game_day)
                                 deviation_count += 1
                             except Exception as e:
                                 logger.error(f"保存偏差時發生錯誤: {e}")
@@ -190,11 +218,13 @@ class DailyPerformanceAnalyzer:
                 else:
                     # 對手走棋，檢查是否在開局庫中有對應走法
                     child_node = self._find_child_node(current_node, move)
+                    if count_replies:
+                        self.reply_stats.record(op.db_model.id, board, move, in_book=child_node is not None)
                     if child_node:
                         # 對手走法在開局庫中，更新節點
                         current_node = child_node
                     else:
-                        # 對手脫譜，不算用戶偏差，但記錄日誌
+                        # 對手脫譜，不算用戶偏差，計入未覆蓋應著統計
                         logger.info(f"對手在第{board.fullmove_number}回合脫譜: {move.uci()}")
                         break  # 對手脫譜後不再比對
                 
@@ -256,20 +286,37 @@ class DailyPerformanceAnalyzer:
                 return child
         return None
 
-    def _save_mistake_from_board(self, board: chess.Board, current_node: chess.pgn.GameNode, opening: Opening):
+    @staticmethod
+    def _game_day(headers) -> datetime.date:
+        """
+        對局進行的本地日期（與 daily_stats 其他寫入使用的 date.today() 相同），
+        依 Lichess 的 UTCDate / UTCTime 換算；缺少時使用 Date 標頭，都無法解析時為今天。
+        """
+        try:
+            played = datetime.datetime.strptime(
+                f"{headers['UTCDate']} {headers.get('UTCTime', '00:00:00')}", "%Y.%m.%d %H:%M:%S")
+            return played.replace(tzinfo=datetime.timezone.utc).astimezone().date()
+        except (KeyError, ValueError):
+            pass
+        try:
+            return datetime.datetime.strptime(headers.get('Date', ''), "%Y.%m.%d").date()
+        except ValueError:
+            return datetime.date.today()
+
+    def _save_mistake_from_board(self, board: chess.Board, current_node: chess.pgn.GameNode, opening: Opening,
+                                 day: Optional[datetime.date] = None):
         """
-        將偏差寫入資料庫，實現 UPSERT。
+        把偏差加入本批次的待寫入錯題；同一局面、同一開局在批次內合併計數，
+        批次結束時由 _write_batch 一次 UPSERT。每日統計記在對局當天（day）。
         """
         fen = board.fen()
         correct_move_uci = None
-        correct_moves = []
         
-        # 找出所有正確的走法
+        # 找出第一個合法的正確走法作為主要正確走法
         for child in current_node.variations:
             if board.is_legal(child.move):
-                correct_moves.append(child.move.uci())
-                if not correct_move_uci:  # 保存第一個作為主要正確走法
-                    correct_move_uci = child.move.uci()
+                correct_move_uci = child.move.uci()
+                break
         
         if not correct_move_uci:
             logger.warning(f"找不到正確走法，跳過保存錯題: {fen}")
@@ -277,58 +324,73 @@ class DailyPerformanceAnalyzer:
             
         logger.info(f"保存錯題: FEN={fen}, 正確走法={correct_move_uci}, 開局={opening.name}")
         
+        # 確保使用 opening.db_model.id 而非 opening.id
+        row = mistake_row(self.user_id, opening.db_model.id, board, correct_move_uci,
+                          missed_at=self.analysis_batch_time)
+        key = (row['position_key'], row['opening_id'])
+        pending = self._pending_mistakes.get(key)
+        if pending is None:
+            self._pending_mistakes[key] = row
+        else:
+            pending['miss_count'] += 1
+        stat_key = (row['opening_id'], day or datetime.date.today())
+        self._pending_stats[stat_key] = self._pending_stats.get(stat_key, 0) + 1
+
+    def _write_batch(self, time_range: str, total_games: int, total_deviations: int) -> Optional[int]:
+        """
+        在同一個交易內寫入分析批次、UPSERT 本批次的錯題、建立 batch_mistakes 對應
+        並把偏差累加到各對局當天的 daily_stats，回傳批次 ID。
+        """
         try:
-            # 確保使用 opening.db_model.id 而非 opening.id
-            opening_id = opening.db_model.id
-            
-            mistake = self.db_session.query(Mistake).filter_by(
-                fen=fen,
+            batch = AnalysisBatch(
                 user_id=self.user_id,
-                opening_id=opening_id
-            ).first()
-            if mistake:
-                mistake.miss_count += 1
-                mistake.last_missed_at = self.analysis_batch_time
-                logger.info(f"更新現有錯題: ID={mistake.id}, 錯誤次數={mistake.miss_count}")
-            else:
-                mistake = Mistake(
-                    fen=fen,
-                    correct_move_uci=correct_move_uci,
-                    user_id=self.user_id,
-                    opening_id=opening_id,
-                    miss_count=1,
-                    last_missed_at=self.analysis_batch_time
-                )
-                self.db_session.add(mistake)
-                logger.info(f"新增錯題: FEN={fen}, 用戶ID={self.user_id}, 開局ID={opening_id}")
+                started_at=self.analysis_batch_time,
+                time_range=time_range,
+                total_games=total_games,
+                total_deviations=total_deviations,
+            )
+            self.db_session.add(batch)
+            self.db_session.flush()
+
+            rows = list(self._pending_mistakes.values())
+            if rows:
+                self.db_session.execute(mistake_upsert_statement(), rows)
+                ids = self.db_session.query(Mistake.id, Mistake.position_key, Mistake.opening_id).filter(
+                    Mistake.user_id == self.user_id,
+                    Mistake.position_key.in_({row['position_key'] for row in rows}),
+                ).all()
+                id_by_key = {(pkey, opening_id): mistake_id for mistake_id, pkey, opening_id in ids}
+                self.db_session.execute(BatchMistake.__table__.insert(), [
+                    {'batch_id': batch.id, 'mistake_id': id_by_key[key], 'deviation_count': row['miss_count']}
+                    for key, row in self._pending_mistakes.items() if key in id_by_key
+                ])
+                apply_stat_rows(self.db_session, [
+                    stat_row(self.user_id, opening_id, day, mistakes_made=count)
+                    for (opening_id, day), count in self._pending_stats.items()
+                ])
             self.db_session.commit()
+            logger.info(f"已寫入分析批次 {batch.id}：{len(rows)} 個錯題。")
+            return batch.id
         except Exception as e:
             self.db_session.rollback()
-            logger.error(f"保存錯題時發生錯誤: {e}")
+            logger.error(f"寫入分析批次時發生錯誤: {e}")
             raise
+        finally:
+            self._pending_mistakes = {}
+            self._pending_stats = {}
 
-    def _get_last_analysis_mistakes(self, batch_time: datetime.datetime) -> List[Mistake]:
+    def _get_last_analysis_mistakes(self, batch_id: Optional[int]) -> List[Mistake]:
         """
-        取得本次分析批次產生的所有 Mistake。
+        取得本次分析批次的所有 Mistake（以 batch_mistakes 主鍵 join，每個錯題只出現一次）。
         """
-        return self.db_session.query(Mistake).filter(
-            Mistake.last_missed_at == batch_time,
-            Mistake.user_id == self.user_id
+        if batch_id is None:
+            return []
+        return self.db_session.query(Mistake).join(
+            BatchMistake, BatchMistake.mistake_id == Mistake.id
+        ).filter(
+            BatchMistake.batch_id == batch_id
         ).all()
 
-    def _deduplicate_mistakes(self, mistakes: List[Mistake]) -> List[Mistake]:
-        """
-        以 (fen, opening_id) 為 key 去重。
-        """
-        seen = set()
-        unique = []
-        for m in mistakes:
-            key = (m.fen, m.opening_id)
-            if key not in seen:
-                seen.add(key)
-                unique.append(m)
-        return unique
-
     def _parse_time_range(self, time_range: str) -> datetime.datetime:
         """
         將時間範圍字串轉為 UTC 起始時間。
@@ -343,19 +405,42 @@ class DailyPerformanceAnalyzer:
         else:
             return now - datetime.timedelta(days=7)
 
+    def get_uncovered_replies(self, limit: int = 20) -> List[Dict]:
+        """
+        取得「最常見未覆蓋應著」報告，並附上開局名稱供顯示。
+        """
+        try:
+            names = {op.db_model.id: (op.name, op.side) for op in self.opening_manager.openings}
+            report = []
+            for entry in self.reply_stats.top_uncovered(limit=limit):
+                if entry['opening_id'] not in names:
+                    continue  # 開局庫已被刪除
+                entry['opening_name'], entry['opening_side'] = names[entry['opening_id']]
+                report.append(entry)
+            return report
+        except Exception as e:
+            logger.error(f"產生未覆蓋應著報告時發生錯誤: {e}")
+            return []
+
     def close(self):
         self.db_session.close()
 
     def get_today_mistakes(self) -> List[Mistake]:
         """
-        取得今天的錯題，供複習使用。
+        取得今天（本地日期，與每日統計相同）各次分析找到的錯題，供複習使用。
         """
         try:
-            today_start = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-            return self.db_session.query(Mistake).filter(
-                Mistake.last_missed_at >= today_start,
-                Mistake.user_id == self.user_id
-            ).all()
+            # started_at 以 UTC 保存：本地今天 00:00 換算成 UTC
+            today_start = datetime.datetime.combine(datetime.date.today(), datetime.time()).astimezone(
+                datetime.timezone.utc).replace(tzinfo=None)
+            return self.db_session.query(Mistake).join(
+                BatchMistake, BatchMistake.mistake_id == Mistake.id
+            ).join(
+                AnalysisBatch, AnalysisBatch.id == BatchMistake.batch_id
+            ).filter(
+                AnalysisBatch.user_id == self.user_id,
+                AnalysisBatch.started_at >= today_start
+            ).distinct().all()
         except Exception as e:
             logger.error(f"獲取今日錯題時發生錯誤: {e}")
             return []
@@ -0,0 +1,108 @@
+# chess_opening_trainer/core/daily_stats.py
+import datetime
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..database.models import DailyStat
+
+STAT_FIELDS = ("mistakes_made", "reviews_passed", "reviews_failed", "lines_completed")
+
+_daily_stats = DailyStat.__table__
+
+
+@dataclass(frozen=True)
+class StatTotals:
+    """一段期間（或某一天）的統計合計。"""
+    mistakes_made: int = 0
+    reviews_passed: int = 0
+    reviews_failed: int = 0
+    lines_completed: int = 0
+
+    @property
+    def reviews(self) -> int:
+        return self.reviews_passed + self.reviews_failed
+
+    @property
+    def pass_rate(self) -> Optional[float]:
+        return self.reviews_passed / self.reviews if self.reviews else None
+
+
+def stat_row(user_id: int, opening_id: Optional[int], day: Optional[datetime.date] = None, **deltas) -> dict:
+    """daily_stats 的增量列；未指定的統計欄位增量為 0。"""
+    row = {
+        'user_id': user_id,
+        'day': day or datetime.date.today(),
+        'opening_id': opening_id or 0,
+    }
+    for name in STAT_FIELDS:
+        row[name] = deltas.get(name, 0)
+    return row
+
+
+def merge_stat_rows(rows: Iterable[dict]) -> List[dict]:
+    """把同一 (user, day, opening) 的增量合併，減少 UPSERT 筆數。"""
+    merged: Dict[tuple, dict] = {}
+    for row in rows:
+        key = (row['user_id'], row['day'], row['opening_id'])
+        target = merged.get(key)
+        if target is None:
+            merged[key] = dict(row)
+        else:
+            for name in STAT_FIELDS:
+                target[name] += row[name]
+    return list(merged.values())
+
+
+def stat_upsert_statement():
+    """把增量累加到 daily_stats 的 UPSERT 敘述，可搭配多筆 stat_row 做 executemany。"""
+    stmt = sqlite_insert(_daily_stats)
+    return stmt.on_conflict_do_update(
+        index_elements=['user_id', 'day', 'opening_id'],
+        set_={name: _daily_stats.c[name] + stmt.excluded[name] for name in STAT_FIELDS},
+    )
+
+
+def apply_stat_rows(session: Session, rows: Iterable[dict]):
+    """在呼叫端的交易中累加統計（不 commit）。"""
+    rows = merge_stat_rows(rows)
+    if rows:
+        session.execute(stat_upsert_statement(), rows)
+
+
+# ---------- 查詢 ---------- #
+def _sums():
+    return [func.coalesce(func.sum(_daily_stats.c[name]), 0) for name in STAT_FIELDS]
+
+
+def _range_filter(query, user_id: int, since: Optional[datetime.date], opening_id: Optional[int]):
+    query = query.filter(DailyStat.user_id == user_id)
+    if since is not None:
+        query = query.filter(DailyStat.day >= since)
+    if opening_id is not None:
+        query = query.filter(DailyStat.opening_id == opening_id)
+    return query
+
+
+def totals(session: Session, user_id: int, since: Optional[datetime.date] = None,
+           opening_id: Optional[int] = None) -> StatTotals:
+    """期間合計；走 (user_id, day) 主鍵前綴的範圍掃描。"""
+    row = _range_filter(session.query(*_sums()), user_id, since, opening_id).one()
+    return StatTotals(*row)
+
+
+def daily_totals(session: Session, user_id: int, since: Optional[datetime.date] = None,
+                 opening_id: Optional[int] = None) -> List[tuple]:
+    """每日合計 [(day, StatTotals)]，新的日期在前。"""
+    query = _range_filter(session.query(DailyStat.day, *_sums()), user_id, since, opening_id)
+    rows = query.group_by(DailyStat.day).order_by(DailyStat.day.desc()).all()
+    return [(row[0], StatTotals(*row[1:])) for row in rows]
+
+
+def opening_totals(session: Session, user_id: int, since: Optional[datetime.date] = None) -> Dict[int, StatTotals]:
+    """各開局庫的期間合計 {opening_id: StatTotals}。"""
+    query = _range_filter(session.query(DailyStat.opening_id, *_sums()), user_id, since, None)
+    return {row[0]: StatTotals(*row[1:]) for row in query.group_by(DailyStat.opening_id).all()}
@@ -0,0 +1,223 @@
+# chess_opening_trainer/core/drill_session.py
+"""
+快速練習：連續作答單一局面，不經過電腦走棋與延遲。
+
+開始時預先排好一批 (局面, 正確走法) ——先放今天到期的錯題，其餘從開局樹（依局面合併的 DAG）
+隨機抽出輪到玩家走棋的局面；開局庫在同一局面有多個走法時都算正確。
+顯示目前局面後，下一個局面的棋盤快照在事件迴圈空閒時預先建立，答對時直接切換。
+"""
+import datetime
+import logging
+import random
+import time
+from collections import deque
+from typing import Deque, FrozenSet, List, Optional
+
+import chess
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from ..config import DRILL_QUEUE_SIZE
+from ..database.database import SessionLocal
+from .board_snapshot import BoardSnapshot
+from .opening_manager import Opening
+from .review_queue import ReviewItem, ReviewQueue
+from .spaced_repetition import QUALITY_FAIL, QUALITY_GOOD, review, save_mistake_schedule
+
+logger = logging.getLogger(__name__)
+
+
+class DrillItem:
+    """一個待作答的局面；board 與 snapshot 在輪到它之前才建立。"""
+
+    __slots__ = ("position_key", "nodes", "mistake", "moves", "expected", "sans", "board", "snapshot")
+
+    def __init__(self, position_key: int, nodes: List[int] = (), mistake: Optional[ReviewItem] = None):
+        self.position_key = position_key
+        self.nodes = list(nodes)
+        self.mistake = mistake
+        self.moves: List[chess.Move] = []          # 正確走法，依開局庫順序
+        self.expected: FrozenSet[chess.Move] = frozenset()
+        self.sans: List[str] = []
+        self.board: Optional[chess.Board] = None
+        self.snapshot: Optional[BoardSnapshot] = None
+
+
+class DrillSession(QObject):
+    """快速練習會話，見模組說明。"""
+
+    state_changed = pyqtSignal(object)                    # BoardSnapshot
+    feedback_provided = pyqtSignal(bool, str)             # is_correct, 正確走法（SAN）
+    stats_changed = pyqtSignal(int, int, float, float)    # 作答數, 答對數, 每分鐘局面數, 平均思考時間 (ms)
+    drill_finished = pyqtSignal()
+
+    def __init__(self, opening: Opening, player_color: chess.Color, user_id: int, writer=None,
+                 error_display_delay: int = 1000, queue_size: int = DRILL_QUEUE_SIZE,
+                 session_factory=SessionLocal, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.opening = opening
+        self.player_color = player_color
+        self.user_id = user_id
+        self.error_display_delay = error_display_delay
+        self.queue_size = queue_size
+        self.today = datetime.date.today()
+        self._writer = writer
+        self._session_factory = session_factory
+        self._queue: Deque[DrillItem] = deque()
+        self._positions: List[List[int]] = []   # 開局樹中輪到玩家的局面（各自的節點）
+        self.current: Optional[DrillItem] = None
+        self._waiting = False
+        self._stopped = False
+        # 計時器屬於會話，stop() 時一併停止，避免停止後仍切換局面或讀取已關閉的開局樹
+        self._advance_timer = QTimer(self)
+        self._advance_timer.setSingleShot(True)
+        self._advance_timer.timeout.connect(self.present_next)
+        self._prefetch_timer = QTimer(self)
+        self._prefetch_timer.setSingleShot(True)
+        self._prefetch_timer.timeout.connect(self._prepare_next)
+        # 統計
+        self.answered = 0
+        self.correct = 0
+        self._started_at = 0.0
+        self._shown_at = 0.0
+        self._think_total = 0.0
+        self._overhead_total = 0.0
+
+    # ---------- 佇列 ---------- #
+    def _build_queue(self):
+        """到期錯題優先，不足 queue_size 時從開局樹局面中隨機補足。"""
+        store = self.opening.store
+        if store is not None and not self._positions:
+            self._positions = [
+                nodes for _, nodes in store.iter_positions()
+                if store.to_move(nodes[0]) == self.player_color and any(store.children(idx) for idx in nodes)
+            ]
+        queued = {item.position_key for item in self._queue}
+        if not self.answered:
+            due = ReviewQueue(self.user_id, [self.opening.db_model.id], due_by=self.today,
+                              session_factory=self._session_factory, page_size=self.queue_size)
+            for mistake in next(due.pages(), []):
+                if mistake.position_key not in queued:
+                    queued.add(mistake.position_key)
+                    nodes = store.find(mistake.position_key) if store is not None else []
+                    self._queue.append(DrillItem(mistake.position_key, nodes, mistake))
+        needed = self.queue_size - len(self._queue)
+        if needed > 0 and self._positions:
+            for nodes in random.sample(self._positions, min(needed, len(self._positions))):
+                key = store.key(nodes[0])
+                if key not in queued:
+                    queued.add(key)
+                    self._queue.append(DrillItem(key, nodes))
+
+    def _prepare(self, item: DrillItem) -> DrillItem:
+        """建立棋盤、快照與正確走法（每個局面只做一次）。"""
+        if item.snapshot is not None:
+            return item
+        store = self.opening.store
+        last_move = None
+        if item.mistake is not None:
+            item.board = chess.Board(item.mistake.fen)
+        else:
+            idx = item.nodes[0]
+            item.board = store.board_at(idx)
+            last_move = store.move(idx)
+        moves, sans = [], []
+        for idx in item.nodes:
+            for child in store.children(idx):
+                move = store.move(child)
+                if move not in moves:
+                    moves.append(move)
+                    sans.append(store.san(child))
+        if item.mistake is not None:
+            move = chess.Move.from_uci(item.mistake.correct_move_uci)
+            if move not in moves:
+                moves.append(move)
+                sans.append(item.board.san(move) if item.board.is_legal(move) else move.uci())
+        item.moves = moves
+        item.expected = frozenset(moves)
+        item.sans = sans
+        item.snapshot = BoardSnapshot.from_board(item.board, last_move)
+        return item
+
+    def _prepare_next(self):
+        """在事件迴圈空閒時預先建立下一個局面。"""
+        if self._stopped:
+            return
+        if not self._queue:
+            self._build_queue()
+        if self._queue:
+            self._prepare(self._queue[0])
+
+    # ---------- 流程 ---------- #
+    def start(self):
+        self._build_queue()
+        if not self._queue:
+            self.drill_finished.emit()
+            return
+        self._started_at = time.perf_counter()
+        self.present_next()
+
+    def present_next(self, answered_at: Optional[float] = None):
+        if self._stopped:
+            return
+        self._waiting = False
+        if not self._queue:
+            self._build_queue()
+        if not self._queue:
+            self.drill_finished.emit()
+            return
+        self.current = self._prepare(self._queue.popleft())
+        self.state_changed.emit(self.current.snapshot)
+        self._shown_at = time.perf_counter()
+        if answered_at is not None:
+            self._overhead_total += self._shown_at - answered_at
+        self._prefetch_timer.start(0)
+
+    def handle_user_move(self, move: chess.Move):
+        item = self.current
+        if item is None or self._waiting or self._stopped:
+            return
+        answered_at = time.perf_counter()
+        self._think_total += answered_at - self._shown_at
+        self.answered += 1
+        is_correct = move in item.expected
+        if is_correct:
+            self.correct += 1
+        if item.mistake is not None and item.mistake.id is not None:
+            item.mistake.schedule = review(item.mistake.schedule, QUALITY_GOOD if is_correct else QUALITY_FAIL,
+                                           self.today)
+            save_mistake_schedule(item.mistake.id, item.mistake.schedule, self._writer, self._session_factory)
+        self._emit_stats()
+        self.feedback_provided.emit(is_correct, " / ".join(item.sans))
+        if is_correct:
+            self.present_next(answered_at)
+            return
+        if self._writer is not None and item.mistake is None and item.moves:
+            # 答錯的開局樹局面記為錯題，之後會出現在錯題複習與下一次快速練習（錯題本身已在上面重新排程）
+            self._writer.record_mistake(self.user_id, self.opening.db_model.id, item.board, item.moves[0].uci())
+        self._waiting = True
+        self._advance_timer.start(self.error_display_delay)
+
+    def _emit_stats(self):
+        elapsed = time.perf_counter() - self._started_at
+        per_minute = self.answered * 60.0 / elapsed if elapsed > 0 else 0.0
+        self.stats_changed.emit(self.answered, self.correct, per_minute, self.average_think_ms())
+
+    def average_think_ms(self) -> float:
+        return 1000.0 * self._think_total / self.answered if self.answered else 0.0
+
+    def average_overhead_ms(self) -> float:
+        """答對後到下一個局面送出之間的平均耗時（不含使用者思考時間）。"""
+        return 1000.0 * self._overhead_total / self.correct if self.correct else 0.0
+
+    def stop(self):
+        self._stopped = True
+        self._advance_timer.stop()
+        self._prefetch_timer.stop()
+        if self.answered:
+            elapsed = time.perf_counter() - self._started_at
+            logger.info(
+                f"快速練習結束：{self.answered} 題、答對 {self.correct} 題，"
+                f"{self.answered * 60.0 / elapsed:.1f} 局面/分鐘，平均思考 {self.average_think_ms():.0f} ms，"
+                f"切換局面平均 {self.average_overhead_ms():.2f} ms。"
+            )
+        self.current = None
@@ -0,0 +1,90 @@
+# chess_opening_trainer/core/line_sampler.py
+import math
+import random
+from typing import List, Optional, Sequence
+
+
+class AliasTable:
+    """Vose alias method：O(n) 建表，O(1) 抽樣。"""
+
+    __slots__ = ("prob", "alias", "total")
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        self.total = float(sum(weights))
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        if n == 0 or self.total <= 0:
+            return
+        scaled = [w * n / self.total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # 浮點誤差剩下的項目機率視為 1
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def sample(self, rng: random.Random) -> int:
+        i = int(rng.random() * len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class AliasSampler:
+    """
+    依權重抽出路線索引的分塊 alias 抽樣器。
+
+    權重被切成約 √n 大小的區塊，每個區塊各自一張 alias 表，
+    上層再以各區塊權重總和建一張 alias 表：
+    * draw()：兩次 O(1) 查表。
+    * update()：只重建該區塊與上層表，O(√n)，不必重建整個分佈。
+    """
+
+    def __init__(self, weights: Sequence[float], rng: Optional[random.Random] = None,
+                 block_size: Optional[int] = None):
+        self.rng = rng or random.Random()
+        self.weights: List[float] = [max(0.0, float(w)) for w in weights]
+        n = len(self.weights)
+        self.block_size = block_size or max(1, int(math.isqrt(n)))
+        self.blocks: List[AliasTable] = [
+            AliasTable(self.weights[start:start + self.block_size])
+            for start in range(0, n, self.block_size)
+        ]
+        self._rebuild_top()
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    def _rebuild_top(self):
+        self.top = AliasTable([block.total for block in self.blocks])
+
+    def draw(self) -> int:
+        """抽出一個路線索引；若所有權重皆為 0 則均勻抽樣。"""
+        n = len(self.weights)
+        if n == 0:
+            raise IndexError("AliasSampler 沒有可抽樣的路線")
+        if self.top.total <= 0:
+            return self.rng.randrange(n)
+        b = self.top.sample(self.rng)
+        return b * self.block_size + self.blocks[b].sample(self.rng)
+
+    def update(self, index: int, weight: float):
+        """修改單一路線權重，只重建其所在區塊。"""
+        self.update_many({index: weight})
+
+    def update_many(self, changes: dict):
+        """批次修改多條路線權重；每個受影響區塊與上層表各只重建一次。"""
+        touched = set()
+        for index, weight in changes.items():
+            self.weights[index] = max(0.0, float(weight))
+            touched.add(index // self.block_size)
+        if not touched:
+            return
+        for b in touched:
+            start = b * self.block_size
+            self.blocks[b] = AliasTable(self.weights[start:start + self.block_size])
+        self._rebuild_top()
@@ -0,0 +1,179 @@
+# chess_opening_trainer/core/mastery.py
+from array import array
+from typing import Iterator, Optional, Set, Tuple, Union
+
+import chess
+
+from .repertoire_store import RepertoireStore, StoreNode
+
+
+class LineBitset:
+    """
+    以路線編號（line ID，= 開局樹葉節點的 DFS 順序）為索引的位元集合。
+    第 i 條路線對應第 i // 8 個 byte 的第 i % 8 個位元（低位在前），序列化後直接存成 BLOB。
+    """
+
+    __slots__ = ("size", "_bits")
+
+    def __init__(self, size: int, data: Optional[bytes] = None):
+        self.size = size
+        self._bits = bytearray((size + 7) // 8)
+        if data:
+            n = min(len(data), len(self._bits))
+            self._bits[:n] = data[:n]
+            # 路線數變少時清掉超出範圍的位元
+            extra = len(self._bits) * 8 - size
+            if extra:
+                self._bits[-1] &= 0xFF >> extra
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes], size: Optional[int] = None) -> "LineBitset":
+        data = bytes(data or b"")
+        return cls(len(data) * 8 if size is None else size, data)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits)
+
+    def __contains__(self, line_id: int) -> bool:
+        return 0 <= line_id < self.size and bool(self._bits[line_id >> 3] >> (line_id & 7) & 1)
+
+    def add(self, line_id: int) -> bool:
+        """設定位元；原本未設定時回傳 True。"""
+        if not 0 <= line_id < self.size:
+            raise IndexError(line_id)
+        mask = 1 << (line_id & 7)
+        if self._bits[line_id >> 3] & mask:
+            return False
+        self._bits[line_id >> 3] |= mask
+        return True
+
+    def discard(self, line_id: int) -> bool:
+        """清除位元；原本已設定時回傳 True。"""
+        if line_id not in self:
+            return False
+        self._bits[line_id >> 3] &= ~(1 << (line_id & 7)) & 0xFF
+        return True
+
+    def __iter__(self) -> Iterator[int]:
+        for byte_index, byte in enumerate(self._bits):
+            while byte:
+                low = byte & -byte
+                yield (byte_index << 3) + low.bit_length() - 1
+                byte ^= low
+
+    def count(self) -> int:
+        return sum(bin(byte).count("1") for byte in self._bits)
+
+
+class MasteryIndex:
+    """
+    開局樹每個節點子樹內「已掌握路線數」的彙總。
+    標記一條路線只需沿葉節點往上更新祖先（O(深度)），
+    任一節點的掌握比例則直接讀取計數與 .rep 中預先算好的葉節點區間，為 O(1)。
+
+    指定 side 時，掌握度同時記在依局面合併的 DAG 邊上（side 一方的 (局面, 走法)）：
+    一條路線的所有 side 走法都已在其他路線（換序）掌握時，也算作已掌握。
+    """
+
+    def __init__(self, store: RepertoireStore, bitset: Optional[LineBitset] = None,
+                 side: Optional[chess.Color] = None):
+        self.store = store
+        self.bitset = bitset if bitset is not None else LineBitset(store.leaf_count)
+        self.side = side
+        self._mastered = array("I", bytes(4 * store.node_count))
+        self._edges: Set[Tuple[int, int]] = set()
+        for line_id in self.bitset:
+            self._propagate(line_id, 1)
+            self._add_edges(line_id)
+        if self._edges:
+            self._credit_all()
+
+    @classmethod
+    def from_blob(cls, store: RepertoireStore, data: Optional[bytes],
+                  side: Optional[chess.Color] = None) -> "MasteryIndex":
+        return cls(store, LineBitset(store.leaf_count, data), side)
+
+    def _player_nodes(self, line_id: int) -> Iterator[int]:
+        for idx in self.store.ancestors(self.store.leaf(line_id)):
+            if idx and self.store.mover(idx) == self.side:
+                yield idx
+
+    def _add_edges(self, line_id: int) -> list:
+        """記錄路線上 side 一方的邊，回傳新加入的邊。"""
+        if self.side is None:
+            return []
+        added = []
+        for idx in self._player_nodes(line_id):
+            edge = self.store.edge(idx)
+            if edge not in self._edges:
+                self._edges.add(edge)
+                added.append(edge)
+        return added
+
+    def _covered(self, line_id: int) -> bool:
+        return all(self.store.edge(idx) in self._edges for idx in self._player_nodes(line_id))
+
+    def _credit(self, line_id: int):
+        if self.bitset.add(line_id):
+            self._propagate(line_id, 1)
+
+    def _credit_all(self):
+        """依節點編號順序（父節點一定在子節點之前）走一次，找出所有邊都已掌握的路線。O(節點數)。"""
+        store = self.store
+        covered = bytearray(store.node_count)
+        covered[0] = 1
+        for idx in range(1, store.node_count):
+            parent, _, child_count, raw, depth, _, first_leaf, _ = store.node(idx)
+            ok = covered[parent]
+            if ok and store.mover(idx) == self.side:
+                ok = (store.node(parent)[5], raw) in self._edges
+            covered[idx] = ok
+            if ok and not child_count:
+                self._credit(first_leaf)
+
+    def _propagate(self, line_id: int, delta: int):
+        for idx in self.store.ancestors(self.store.leaf(line_id)):
+            self._mastered[idx] += delta
+
+    @staticmethod
+    def _index(node: Union[int, StoreNode]) -> int:
+        return node.idx if isinstance(node, StoreNode) else node
+
+    def mark(self, line_id: int) -> bool:
+        """
+        把路線標記為已掌握；已標記過時回傳 False。
+        新掌握的邊若也出現在其他路線（換序），一併檢查那些路線是否已全部掌握。
+        """
+        if not self.bitset.add(line_id):
+            return False
+        self._propagate(line_id, 1)
+        for edge in self._add_edges(line_id):
+            for idx in self.store.nodes_with_edge(edge):
+                for other in self.store.leaf_range(idx):
+                    if other not in self.bitset and self._covered(other):
+                        self._credit(other)
+        return True
+
+    def unmark(self, line_id: int) -> bool:
+        """取消路線的掌握標記；已記錄的 DAG 邊與換序得到的掌握度不會撤回。"""
+        if not self.bitset.discard(line_id):
+            return False
+        self._propagate(line_id, -1)
+        return True
+
+    def is_mastered(self, line_id: int) -> bool:
+        return line_id in self.bitset
+
+    def mastered_count(self, node: Union[int, StoreNode] = 0) -> int:
+        return self._mastered[self._index(node)]
+
+    def line_count(self, node: Union[int, StoreNode] = 0) -> int:
+        return len(self.store.leaf_range(self._index(node)))
+
+    def percent(self, node: Union[int, StoreNode] = 0) -> float:
+        """節點子樹中已掌握路線的百分比（0–100）。"""
+        total = self.line_count(node)
+        return 100.0 * self.mastered_count(node) / total if total else 0.0
+
+    def to_blob(self) -> bytes:
+        return self.bitset.to_bytes()
@@ -0,0 +1,63 @@
+# chess_opening_trainer/core/mistakes.py
+import datetime
+from typing import Optional
+
+import chess
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.sql import func, literal_column
+
+from ..database.models import Mistake
+from .position_key import position_key, position_epd
+
+_mistakes = Mistake.__table__
+
+
+def mistake_row(user_id: int, opening_id: Optional[int], board: chess.Board, correct_move_uci: str,
+                missed_at: Optional[datetime.datetime] = None, count: int = 1) -> dict:
+    """
+    一次錯題紀錄的欄位值；missed_at 為 None 時由資料庫填入目前時間。
+    局面與正確走法在此驗證一次（不合法時拋出 ValueError），複習時不必再檢查。
+    """
+    if not board.is_valid():
+        raise ValueError(f"不合法的錯題局面: {board.fen()}")
+    if not board.is_legal(chess.Move.from_uci(correct_move_uci)):
+        raise ValueError(f"正確走法 {correct_move_uci} 在局面 {board.fen()} 不合法")
+    return {
+        'position_key': position_key(board),
+        'epd': position_epd(board),
+        'correct_move_uci': correct_move_uci,
+        'user_id': user_id,
+        'opening_id': opening_id,
+        'miss_count': count,
+        'last_missed_at': missed_at if missed_at is not None else func.now(),
+        'due_on': datetime.date.today(),
+    }
+
+
+def mistake_upsert_statement():
+    """
+    「記錄錯題」的 UPSERT 敘述，可搭配多筆 mistake_row 做 executemany：
+    以 (user_id, position_key, COALESCE(opening_id, 0)) 唯一索引判斷是否已存在（opening_id 為 None 的錯題也會合併），
+    已存在則累加 miss_count 並更新 last_missed_at，不需先查詢再寫入。
+    再次答錯視為遺忘：間隔重複排程歸零並於今天到期（難易度係數保留）。
+    """
+    stmt = sqlite_insert(_mistakes)
+    return stmt.on_conflict_do_update(
+        # 衝突目標須與索引運算式一致，0 不能以參數綁定
+        index_elements=['user_id', 'position_key', func.coalesce(_mistakes.c.opening_id, literal_column("0"))],
+        set_={
+            'miss_count': _mistakes.c.miss_count + stmt.excluded.miss_count,
+            'last_missed_at': stmt.excluded.last_missed_at,
+            'interval_days': 0,
+            'repetitions': 0,
+            'due_on': stmt.excluded.due_on,
+        },
+    )
+
+
+def mistake_upsert(user_id: int, opening_id: Optional[int], board: chess.Board, correct_move_uci: str,
+                   missed_at: Optional[datetime.datetime] = None, count: int = 1):
+    """單筆錯題的 UPSERT 敘述。"""
+    return mistake_upsert_statement().values(
+        **mistake_row(user_id, opening_id, board, correct_move_uci, missed_at, count)
+    )
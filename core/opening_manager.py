@@ -1,11 +1,16 @@
 # chess_opening_trainer/core/opening_manager.py
 import chess
 import chess.pgn
+import hashlib
 import logging
 import os
-from typing import List, Tuple, Optional
-from ..database.models import Opening as OpeningModel
+from typing import Dict, List, Sequence, Tuple, Optional
+from ..database.models import Opening as OpeningModel, LineReview, TrainingProgress, TrainingProgressMistake
 from ..database.database import SessionLocal
+from ..config import COMPILED_OPENINGS_DIR
+from .position_key import position_key
+from .mastery import LineBitset, MasteryIndex
+from .repertoire_store import RepertoireStore, STORE_SUFFIX, compile_store, is_up_to_date, unpack_line_keys
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +21,10 @@ class Opening:
         self.pgn_path = db_model.pgn_path
         self.root_node: Optional[chess.pgn.GameNode] = None
         self.all_lines: List[List[chess.Move]] = []
+        self.store: Optional[RepertoireStore] = None
+        self._mastery: Optional[MasteryIndex] = None
+        self._branch_plies: Optional[Sequence[int]] = None
+        self._drill_plan: Optional[Tuple[Sequence[int], Sequence[int]]] = None
         # 直接存 int（0/1），確保與 chess.WHITE/chess.BLACK 一致
         self.side = db_model.side if db_model.side in (0, 1) else int(bool(db_model.side))
         self.load_and_parse()
@@ -24,20 +33,109 @@ class Opening:
         self.side = int(side)
         self.db_model.side = int(side)
 
+    @property
+    def compiled_path(self) -> str:
+        """PGN 編譯後的 .rep 快取路徑；直接指定 .rep 檔時即為該檔。"""
+        if self.pgn_path.endswith(STORE_SUFFIX):
+            return self.pgn_path
+        digest = hashlib.sha1(os.path.abspath(self.pgn_path).encode('utf-8')).hexdigest()[:16]
+        return str(COMPILED_OPENINGS_DIR / f"{digest}{STORE_SUFFIX}")
+
     def load_and_parse(self):
+        """
+        載入開局樹。PGN 只在第一次或檔案變動後解析一次並編譯成 .rep 檔，
+        之後直接以 mmap 開啟；root_node 與 all_lines 都由檔案惰性提供。
+        """
         try:
-            with open(self.pgn_path, 'r', encoding='utf-8') as pgn_file:
-                game = chess.pgn.read_game(pgn_file)
+            store_path = self.compiled_path
+            if store_path != self.pgn_path and not is_up_to_date(store_path, self.pgn_path):
+                game = self._read_pgn()
                 if not game:
-                    logger.error(f"無法從 {self.pgn_path} 讀取遊戲。")
                     return
-                self.root_node = game
-                self._extract_all_lines()
-                logger.info(f"成功從 '{self.name}' 載入 {len(self.all_lines)} 條路線。")
+                try:
+                    stat = os.stat(self.pgn_path)
+                    compile_store(game, store_path, stat.st_mtime_ns, stat.st_size)
+                except OSError as e:
+                    # 無法寫入快取時仍可直接使用記憶體中的 PGN 樹
+                    logger.warning(f"無法編譯開局樹快取 {store_path}，改用 PGN: {e}")
+                    self.root_node = game
+                    self._extract_all_lines()
+                    logger.info(f"成功從 '{self.name}' 載入 {len(self.all_lines)} 條路線。")
+                    return
+            self.store = RepertoireStore(store_path)
+            self.root_node = self.store.root
+            self.all_lines = self.store.lines
+            logger.info(f"成功從 '{self.name}' 載入 {len(self.all_lines)} 條路線。")
         except Exception as e:
             logger.error(f"解析 PGN 檔案 {self.pgn_path} 失敗: {e}")
+            self.close()
             self.root_node = None
             self.all_lines = []
+
+    @property
+    def mastery(self) -> Optional[MasteryIndex]:
+        """各節點子樹的已掌握路線彙總（換序到達的局面共用掌握度）；開局樹未以 .rep 載入時為 None。"""
+        if self._mastery is None and self.store is not None:
+            self._mastery = MasteryIndex.from_blob(self.store, self.db_model.mastered_lines, self.side)
+        return self._mastery
+
+    def branch_plies(self) -> Sequence[int]:
+        """
+        依 all_lines 順序（開局樹 DFS 順序）連續練習時，每條路線與前一條路線共用的步數；
+        練習該路線只需從這一步開始。第一次呼叫時計算並快取。
+        """
+        if self._branch_plies is None:
+            if self.store is not None:
+                self._branch_plies = self.store.branch_depths()
+            else:
+                plies, previous = [], []
+                for line in self.all_lines:
+                    shared = 0
+                    for a, b in zip(previous, line):
+                        if a != b:
+                            break
+                        shared += 1
+                    plies.append(shared)
+                    previous = line
+                self._branch_plies = plies
+        return self._branch_plies
+
+    def drill_plan(self) -> Tuple[Sequence[int], Sequence[int]]:
+        """
+        依開局樹順序練習時每條路線要練的 ply 區間 (starts, ends)，見 RepertoireStore.drill_plan：
+        換序到達的局面只練一次。開局樹未以 .rep 載入時只省略與前一條路線共用的前綴。
+        """
+        if self._drill_plan is None:
+            if self.store is not None:
+                self._drill_plan = self.store.drill_plan(self.side)
+            else:
+                starts = [min(ply, max(len(line) - 1, 0)) for ply, line in zip(self.branch_plies(), self.all_lines)]
+                self._drill_plan = (starts, [len(line) for line in self.all_lines])
+        return self._drill_plan
+
+    def line_sans(self, line_id: int) -> Optional[List[str]]:
+        """路線每一步的 SAN（編譯時產生）；開局樹未以 .rep 載入時為 None。"""
+        return self.store.line_sans(line_id) if self.store is not None else None
+
+    def move_san(self, key: int, move: chess.Move) -> Optional[str]:
+        """局面 key 下開局庫走法的 SAN；查不到時為 None。"""
+        return self.store.move_san(key, move) if self.store is not None else None
+
+    def _read_pgn(self) -> Optional[chess.pgn.Game]:
+        with open(self.pgn_path, 'r', encoding='utf-8') as pgn_file:
+            game = chess.pgn.read_game(pgn_file)
+        if not game:
+            logger.error(f"無法從 {self.pgn_path} 讀取遊戲。")
+        return game
+
+    def close(self):
+        """釋放 mmap 開局樹。"""
+        self._mastery = None
+        self._branch_plies = None
+        self._drill_plan = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
             
     def _extract_all_lines(self):
         if not self.root_node: return
@@ -52,10 +150,48 @@ class Opening:
                 current_path.pop()
         recurse(self.root_node, [])
 
+    def line_weights(self, reply_counts: Dict[Tuple[int, str], int]) -> List[float]:
+        """
+        依實戰中對手應著的頻率計算每條路線的權重（與 all_lines 順序一致）。
+        路線權重 = 沿途每個對手回合「對手走出該步」的估計機率相乘，
+        機率以 (次數 + 1) / (該局面總次數 + 開局庫分支數) 做平滑，
+        沒有統計資料的局面視為各分支均等。
+        reply_counts: {(position_key, reply_uci): count}
+        """
+        if not self.root_node:
+            return []
+        totals: Dict[int, int] = {}
+        for (pkey, _), count in reply_counts.items():
+            totals[pkey] = totals.get(pkey, 0) + count
+
+        weights: List[float] = []
+        board = self.root_node.board()
+
+        def recurse(node: chess.pgn.GameNode, weight: float):
+            if node.is_end():
+                if node is not self.root_node:
+                    weights.append(weight)
+                return
+            opponent_turn = board.turn != self.side
+            if opponent_turn:
+                pkey = position_key(board)
+                denominator = totals.get(pkey, 0) + len(node.variations)
+            for variation in node.variations:
+                child_weight = weight
+                if opponent_turn:
+                    numerator = reply_counts.get((pkey, variation.move.uci()), 0) + 1
+                    child_weight *= numerator / denominator
+                board.push(variation.move)
+                recurse(variation, child_weight)
+                board.pop()
+        recurse(self.root_node, 1.0)
+        return weights
+
 class OpeningManager:
     # ... (init, load_openings_for_user, add_opening, get_opening_by_name, get_all_opening_names 保持不變)
-    def __init__(self, user_id: int):
+    def __init__(self, user_id: int, writer=None):
         self.user_id = user_id
+        self.writer = writer
         self.db = SessionLocal()
         self.openings: List[Opening] = []
         self.load_openings_for_user()
@@ -63,6 +199,58 @@ class OpeningManager:
     def load_openings_for_user(self):
         db_openings = self.db.query(OpeningModel).filter(OpeningModel.user_id == self.user_id).all()
         self.openings = [Opening(db_model) for db_model in db_openings]
+        for opening in self.openings:
+            self._sync_line_keys(opening)
+
+    def _sync_line_keys(self, opening: Opening):
+        """
+        以 line ID 為 key 的資料（已掌握路線、路線排程、最後練習的路線）在 PGN 插入或刪除變化後會對到錯的路線。
+        開局樹的路線識別碼與上次載入時不同時，依識別碼把這些資料移到新的 line ID，已刪除的路線一併捨棄；
+        練習進度的路線順序與指標無法逐一對應，讓該開局庫從新的一輪開始。
+        第一次載入（尚未記錄識別碼）時只記錄目前的識別碼。
+        """
+        if opening.store is None:
+            return
+        db_model = opening.db_model
+        keys = opening.store.line_keys_blob()
+        if db_model.line_keys == keys:
+            return
+        try:
+            if db_model.line_keys is not None:
+                self._remap_lines(db_model, unpack_line_keys(db_model.line_keys), unpack_line_keys(keys))
+            db_model.line_keys = keys
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"對應開局庫 '{opening.name}' 的路線編號時發生錯誤: {e}")
+
+    def _remap_lines(self, db_model: OpeningModel, old_keys: Sequence[int], new_keys: Sequence[int]):
+        new_ids: Dict[int, int] = {}
+        for line_id, key in enumerate(new_keys):
+            new_ids.setdefault(key, line_id)
+        moved = {old_id: new_ids[key] for old_id, key in enumerate(old_keys) if key in new_ids}
+
+        if db_model.mastered_lines:
+            bits = LineBitset(len(new_keys))
+            for old_id in LineBitset.from_bytes(db_model.mastered_lines):
+                if old_id in moved:
+                    bits.add(moved[old_id])
+            db_model.mastered_lines = bits.to_bytes()
+        db_model.last_trained_line_index = moved.get(db_model.last_trained_line_index or 0, 0)
+
+        reviews = self.db.query(LineReview).filter(LineReview.opening_id == db_model.id)
+        rows = [
+            {'user_id': row.user_id, 'opening_id': row.opening_id, 'line_index': moved[row.line_index],
+             'ease': row.ease, 'interval_days': row.interval_days, 'repetitions': row.repetitions,
+             'due_on': row.due_on}
+            for row in reviews if row.line_index in moved
+        ]
+        reviews.delete(synchronize_session=False)
+        if rows:
+            self.db.execute(LineReview.__table__.insert(), rows)
+        for model in (TrainingProgressMistake, TrainingProgress):
+            self.db.query(model).filter(model.opening_id == db_model.id).delete(synchronize_session=False)
+        logger.info(f"開局庫 '{db_model.name}' 的路線已變動：{len(moved)}/{len(old_keys)} 條路線的資料移到新的編號。")
 
     def get_opening_by_name_and_side(self, name: str, side: bool) -> Optional[Opening]:
         result = next((op for op in self.openings if op.name == name and op.side == side), None)
@@ -91,6 +279,7 @@ class OpeningManager:
                 self.db.delete(new_opening_db)
                 self.db.commit()
                 return None
+            self._sync_line_keys(new_opening)
             self.openings.append(new_opening)
             logger.info(f"已為用戶 {self.user_id} 新增開局庫: {name} ({'白方' if side else '黑方'})")
             return new_opening
@@ -109,11 +298,22 @@ class OpeningManager:
         if not opening_to_remove:
             logger.warning(f"試圖移除不存在的開局庫: {name}（{side}）")
             return False
+        # 先等背景寫入執行緒提交佇列中的進度與排程，否則刪除後仍在佇列中的 UPSERT 會重新建立孤兒資料列
+        if self.writer is not None and not self.writer.flush():
+            logger.error(f"移除開局庫 '{name}'（{side}）前無法完成背景寫入，已取消移除。")
+            return False
         try:
             db_model = opening_to_remove.db_model
+            # 練習進度與路線排程只屬於此開局庫，一併刪除
+            for model in (TrainingProgressMistake, TrainingProgress, LineReview):
+                self.db.query(model).filter(model.opening_id == db_model.id).delete(synchronize_session=False)
             self.db.delete(db_model)
             self.db.commit()
             self.openings.remove(opening_to_remove)
+            opening_to_remove.close()
+            compiled_path = opening_to_remove.compiled_path
+            if compiled_path != opening_to_remove.pgn_path and os.path.exists(compiled_path):
+                os.remove(compiled_path)
             logger.info(f"成功移除開局庫: {name}（{side}）")
             return True
         except Exception as e:
@@ -135,4 +335,11 @@ class OpeningManager:
 
     def get_openings_by_side(self, side: bool) -> List[Opening]:
         """取得所有同色（白/黑）的開局庫"""
-        return [op for op in self.openings if op.side == side]
\ No newline at end of file
+        return [op for op in self.openings if op.side == side]
+
+    def close(self):
+        """釋放所有開局樹並關閉資料庫會話（切換帳號時使用）。"""
+        for op in self.openings:
+            op.close()
+        self.openings = []
+        self.db.close()
\ No newline at end of file
@@ -0,0 +1,170 @@
+# chess_opening_trainer/core/opponent_replies.py
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import chess
+import chess.pgn
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..database.models import AnalyzedGame, OpponentReply
+from .position_key import position_key, position_epd
+
+logger = logging.getLogger(__name__)
+
+
+class OpponentReplyStats:
+    """
+    收集實戰中對手在開局庫局面下的應著，並彙總成「最常見未覆蓋應著」報告。
+
+    * 以 (開局, position_key, 應著) 為 key 在記憶體累加，批次結束時一次 UPSERT。
+    * position_key 為 Zobrist 雜湊，不同走法次序到達的同一局面會合併計數。
+    * 每盤棋以 game_id 去重，重複分析同一時間範圍不會重複計數。
+    """
+
+    def __init__(self, db_session: Session, user_id: int):
+        self.db_session = db_session
+        self.user_id = user_id
+        # (opening_id, position_key, reply_uci) -> [epd, reply_san, fullmove_number, in_book, count]
+        self._pending: Dict[Tuple[int, int, str], list] = {}
+        self._pending_games: List[str] = []
+        self._known_games = None
+
+    # ---------- 收集 ---------- #
+    @staticmethod
+    def game_id(game: chess.pgn.Game) -> str:
+        """Lichess 對局以 Site 網址識別；沒有網址時以表頭與走法的雜湊代替。"""
+        site = game.headers.get("Site", "")
+        if site.startswith("http"):
+            return site
+        digest = hashlib.sha1()
+        for tag in ("White", "Black", "Date", "UTCTime", "Result"):
+            digest.update(game.headers.get(tag, "").encode("utf-8"))
+        for move in game.mainline_moves():
+            digest.update(move.uci().encode("ascii"))
+        return digest.hexdigest()
+
+    def begin_game(self, game: chess.pgn.Game) -> bool:
+        """登記一盤對局；若此局已計入統計則回傳 False，呼叫端應略過記錄。"""
+        if self._known_games is None:
+            rows = self.db_session.query(AnalyzedGame.game_id).filter(
+                AnalyzedGame.user_id == self.user_id
+            ).all()
+            self._known_games = {row[0] for row in rows}
+        gid = self.game_id(game)
+        if gid in self._known_games:
+            return False
+        self._known_games.add(gid)
+        self._pending_games.append(gid)
+        return True
+
+    def record(self, opening_id: int, board: chess.Board, reply: chess.Move, in_book: bool):
+        """記錄對手在 board 局面（走子前）下走出的 reply。"""
+        key = (opening_id, position_key(board), reply.uci())
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = [position_epd(board), board.san(reply), board.fullmove_number, in_book, 1]
+        else:
+            entry[4] += 1
+
+    def flush(self):
+        """把本批次累積的統計一次寫入資料庫。"""
+        if not self._pending and not self._pending_games:
+            return
+        rows = [
+            {
+                'user_id': self.user_id,
+                'opening_id': opening_id,
+                'position_key': pkey,
+                'epd': epd,
+                'reply_uci': reply_uci,
+                'reply_san': reply_san,
+                'fullmove_number': fullmove_number,
+                'in_book': in_book,
+                'count': count,
+            }
+            for (opening_id, pkey, reply_uci), (epd, reply_san, fullmove_number, in_book, count)
+            in self._pending.items()
+        ]
+        try:
+            if rows:
+                stmt = sqlite_insert(OpponentReply.__table__)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['user_id', 'opening_id', 'position_key', 'reply_uci'],
+                    set_={
+                        'count': OpponentReply.__table__.c.count + stmt.excluded.count,
+                        'in_book': stmt.excluded.in_book,
+                        'last_seen_at': func.now(),
+                    },
+                )
+                self.db_session.execute(stmt, rows)
+            if self._pending_games:
+                self.db_session.execute(
+                    sqlite_insert(AnalyzedGame.__table__).on_conflict_do_nothing(),
+                    [{'user_id': self.user_id, 'game_id': gid} for gid in self._pending_games],
+                )
+            self.db_session.commit()
+            logger.info(f"已寫入 {len(rows)} 筆對手應著統計，{len(self._pending_games)} 盤新對局。")
+        except Exception as e:
+            self.db_session.rollback()
+            logger.error(f"寫入對手應著統計時發生錯誤: {e}")
+            raise
+        finally:
+            self._pending.clear()
+            self._pending_games = []
+
+    def reply_counts(self, opening_id: int) -> Dict[Tuple[int, str], int]:
+        """某開局庫內對手應著的累計次數：{(position_key, reply_uci): count}。"""
+        rows = self.db_session.query(
+            OpponentReply.position_key, OpponentReply.reply_uci, OpponentReply.count
+        ).filter(
+            OpponentReply.user_id == self.user_id,
+            OpponentReply.opening_id == opening_id,
+            OpponentReply.in_book.is_(True),
+        ).all()
+        return {(pkey, reply_uci): count for pkey, reply_uci, count in rows}
+
+    # ---------- 報告 ---------- #
+    def top_uncovered(self, limit: int = 20, opening_id: Optional[int] = None) -> List[Dict]:
+        """
+        依出現次數排序的「最常見未覆蓋應著」。
+        排序走 (user_id, in_book, count) 索引，只讀取前 limit 筆，與對局總數無關。
+        """
+        query = self.db_session.query(OpponentReply).filter(
+            OpponentReply.user_id == self.user_id,
+            OpponentReply.in_book.is_(False),
+        )
+        if opening_id is not None:
+            query = query.filter(OpponentReply.opening_id == opening_id)
+        top = query.order_by(OpponentReply.count.desc()).limit(limit).all()
+        if not top:
+            return []
+
+        # 該局面下所有應著（含開局庫內）的總次數，用來計算佔比
+        totals = defaultdict(int)
+        rows = self.db_session.query(
+            OpponentReply.opening_id, OpponentReply.position_key, func.sum(OpponentReply.count)
+        ).filter(
+            OpponentReply.user_id == self.user_id,
+            OpponentReply.position_key.in_({r.position_key for r in top}),
+        ).group_by(OpponentReply.opening_id, OpponentReply.position_key).all()
+        for op_id, pkey, total in rows:
+            totals[(op_id, pkey)] = total
+
+        report = []
+        for r in top:
+            total = totals.get((r.opening_id, r.position_key)) or r.count
+            report.append({
+                'opening_id': r.opening_id,
+                'position_key': r.position_key,
+                'epd': r.epd,
+                'move_number': r.fullmove_number,
+                'reply_uci': r.reply_uci,
+                'reply_san': r.reply_san,
+                'count': r.count,
+                'share': r.count / total,
+            })
+        return report
@@ -0,0 +1,25 @@
+# chess_opening_trainer/core/position_key.py
+import chess
+import chess.polyglot
+
+_SIGN_BIT = 1 << 63
+
+
+def position_key(board: chess.Board) -> int:
+    """
+    回傳局面的 Zobrist 雜湊（Polyglot 規格），轉為 SQLite 可存放的有號 int64。
+    只取決於棋子位置、走子方、易位權與吃過路兵格，與回合數無關，
+    因此不同走法次序到達的同一局面會得到相同的 key。
+    """
+    key = chess.polyglot.zobrist_hash(board)
+    return key - (1 << 64) if key & _SIGN_BIT else key
+
+
+def unsigned_key(key: int) -> int:
+    """把有號 int64 key 轉回 Polyglot 使用的無號 64-bit 值。"""
+    return key & 0xFFFFFFFFFFFFFFFF
+
+
+def position_epd(board: chess.Board) -> str:
+    """顯示用的正規化局面字串（不含半回合與回合數）。"""
+    return board.epd()
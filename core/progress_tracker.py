@@ -1,93 +1,437 @@
 ## core/progress_tracker.py
-from dataclasses import dataclass, asdict
+from array import array
+from dataclasses import dataclass, field
 import json
+import logging
 import os
+from pathlib import Path
 import random
-from typing import List
+import sys
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..config import SRS_NEW_LINES_PER_ROUND
+from ..database.database import SessionLocal
+from ..database.models import TrainingProgress, TrainingProgressMistake
+from .line_sampler import AliasSampler
+from .spaced_repetition import (
+    QUALITY_FAIL, QUALITY_GOOD, SrsState, due_lines, line_schedule_row, line_schedule_statement,
+    load_line_state, review,
+)
+
+logger = logging.getLogger(__name__)
+
+_progress = TrainingProgress.__table__
+_progress_mistakes = TrainingProgressMistake.__table__
+
+# 每次前進只更新這些欄位；line_order 只在新一輪開始時寫入
+STATE_FIELDS = ("current_line_ptr", "ply_index", "schedule", "num_lines", "current_line")
+
+
+def pack_line_order(order: Sequence[int]) -> bytes:
+    """路線順序打包成 little-endian u32 BLOB。"""
+    packed = array('I', order)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_line_order(data: Optional[bytes]) -> array:
+    order = array('I')
+    if data:
+        order.frombytes(data)
+        if sys.byteorder == 'big':
+            order.byteswap()
+    return order
+
+
+def progress_upsert_statement():
+    """寫入 (user, opening) 進度的 UPSERT；只更新傳入的欄位，可搭配多筆參數做 executemany。"""
+    stmt = sqlite_insert(_progress)
+    return stmt.on_conflict_do_update(
+        index_elements=['user_id', 'opening_id'],
+        set_={name: stmt.excluded[name] for name in STATE_FIELDS + ('line_order',)},
+    )
+
+
+def progress_state_statement():
+    """不含 line_order 的 UPSERT，避免每次前進都改寫整個路線順序。"""
+    stmt = sqlite_insert(_progress)
+    return stmt.on_conflict_do_update(
+        index_elements=['user_id', 'opening_id'],
+        set_={name: stmt.excluded[name] for name in STATE_FIELDS},
+    )
+
+
+def progress_mistake_statement():
+    """記錄本輪錯誤；同一 (路線, ply) 已存在時忽略。"""
+    return sqlite_insert(_progress_mistakes).on_conflict_do_nothing()
+
+
+def read_legacy_progress(path: Path) -> Optional[dict]:
+    """
+    讀取舊版進度快照 progress.json，並重播同一世代的 progress.journal 紀錄。
+    檔案不存在或無法解析時回傳 None。
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+    except (OSError, ValueError) as e:
+        if not isinstance(e, FileNotFoundError):
+            logger.warning(f"無法讀取舊版進度檔 {path}: {e}")
+        return None
+    generation = raw.get('generation', 0)
+    try:
+        journal = open(path.with_suffix('.journal'), 'r', encoding='utf-8')
+    except OSError:
+        return raw
+    with journal:
+        for line in journal:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('g') != generation:
+                continue
+            if record['op'] == 'ply':
+                raw['ply_index'] += 1
+            elif record['op'] == 'line':
+                raw['current_line_ptr'] += 1
+                raw['ply_index'] = 0
+                if 'current_line' in record:
+                    raw['current_line'] = record['current_line']
+            elif record['op'] == 'mistake':
+                raw['mistakes'].append(record)
+    return raw
+
 
 @dataclass
 class ProgressData:
-    opening_id: str
-    line_order: List[int]
+    opening_id: int
+    line_order: array
     current_line_ptr: int
     ply_index: int
-    mistakes: List[dict]  # 每個錯誤儲存 {"line_ptr": int, "ply": int, "move": str}
+    # 本輪的錯誤 {(line_ptr, ply): move}
+    mistakes: Dict[Tuple[int, int], str] = field(default_factory=dict)
+    # "shuffle" 隨機排列 | "weighted" 依對手頻率抽樣 | "spaced" 間隔重複到期路線
+    # | "tree" 依開局樹 DFS 順序（即 all_lines 順序）
+    schedule: str = "shuffle"
+    num_lines: int = 0
+    current_line: int = 0      # weighted 模式下目前抽到的路線索引
+
+    def state(self) -> dict:
+        return {name: getattr(self, name) for name in STATE_FIELDS}
+
 
 class ProgressTracker:
     """
-    保存並讀取練習進度。
-    檔案位置: data/user_data/progress.json
+    保存並讀取練習進度，每個 (用戶, 開局庫) 各自一份，存放在 training_progress 表；
+    各路線的間隔重複排程存放在 line_reviews 表。
+    切換開局庫只以主鍵讀取該列（已載入過的直接取自記憶體），不會重設其他開局庫的進度；
+    每次前進只寫入幾個整數欄位，交給背景寫入執行緒合併提交（未提供時直接提交）。
     """
-    SAVE_PATH = os.path.join(
-        os.path.dirname(__file__), os.pardir, 'data', 'user_data', 'progress.json'
-    )
 
-    def __init__(self):
-        self._ensure_file()
-        self.load()
-
-    def _ensure_file(self):
-        folder = os.path.dirname(self.SAVE_PATH)
-        os.makedirs(folder, exist_ok=True)
-        if not os.path.exists(self.SAVE_PATH):
-            # 初始空白資料
-            initial = ProgressData('', [], 0, 0, [])
-            with open(self.SAVE_PATH, 'w', encoding='utf-8') as f:
-                json.dump(asdict(initial), f, ensure_ascii=False, indent=2)
-
-    def load(self) -> ProgressData:
-        with open(self.SAVE_PATH, 'r', encoding='utf-8') as f:
-            raw = json.load(f)
-        self.data = ProgressData(**raw)
-        return self.data
+    def __init__(self, user_id: int, writer=None, session_factory=SessionLocal,
+                 legacy_path: Optional[Path] = None):
+        self.user_id = user_id
+        self._writer = writer
+        self._session_factory = session_factory
+        # 舊版 progress.json；該開局庫在資料庫中還沒有進度時匯入一次
+        self._legacy_path = legacy_path
+        self._loaded: Dict[int, ProgressData] = {}
+        self._samplers: Dict[int, AliasSampler] = {}
+        # 已讀取或算過的路線排程 {(opening_id, line_index): SrsState}
+        self._line_states: Dict[Tuple[int, int], SrsState] = {}
+        # weighted 模式預先抽出的下一條路線 {opening_id: line_index}，見 next_line_index
+        self._next_draws: Dict[int, int] = {}
+        self.data: Optional[ProgressData] = None
+        self.sampler: Optional[AliasSampler] = None
 
-    def save(self):
-        with open(self.SAVE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(asdict(self.data), f, ensure_ascii=False, indent=2)
+    # ---------- 讀取 ---------- #
+    def _load(self, opening_id: int) -> Optional[ProgressData]:
+        session = self._session_factory()
+        try:
+            row = session.get(TrainingProgress, (self.user_id, opening_id))
+            if row is None:
+                return self._import_legacy(session, opening_id)
+            mistakes = session.query(
+                TrainingProgressMistake.line_ptr, TrainingProgressMistake.ply, TrainingProgressMistake.move
+            ).filter(
+                TrainingProgressMistake.user_id == self.user_id,
+                TrainingProgressMistake.opening_id == opening_id,
+            ).all()
+            return ProgressData(
+                opening_id=opening_id,
+                line_order=unpack_line_order(row.line_order),
+                current_line_ptr=row.current_line_ptr,
+                ply_index=row.ply_index,
+                mistakes={(line_ptr, ply): move for line_ptr, ply, move in mistakes},
+                schedule=row.schedule,
+                num_lines=row.num_lines,
+                current_line=row.current_line,
+            )
+        finally:
+            session.close()
 
-    def init_opening(self, opening_id: str, num_lines: int):
+    def _import_legacy(self, session, opening_id: int) -> Optional[ProgressData]:
         """
-        新開局時，隨機排列所有路線並重設進度與錯題。
+        舊版進度檔屬於此開局庫時寫入資料庫（直接提交，不經背景寫入執行緒），
+        再把 progress.json 與 progress.journal 改名為 *.imported，之後不再讀取。
         """
-        order = list(range(num_lines))
-        random.shuffle(order)
+        if self._legacy_path is None:
+            return None
+        raw = read_legacy_progress(self._legacy_path)
+        if raw is None or raw.get('opening_id') != str(opening_id):
+            return None
+        line_order = raw.get('line_order') or []
+        data = ProgressData(
+            opening_id=opening_id,
+            line_order=array('I', line_order),
+            current_line_ptr=raw.get('current_line_ptr', 0),
+            ply_index=raw.get('ply_index', 0),
+            mistakes={(m['line_ptr'], m['ply']): m['move'] for m in raw.get('mistakes', [])},
+            schedule=raw.get('schedule', 'shuffle'),
+            # 最早的進度檔沒有 num_lines，當時只有隨機排列，路線數即 line_order 長度
+            num_lines=raw.get('num_lines') or len(line_order),
+            current_line=raw.get('current_line', 0),
+        )
+        keys = {'user_id': self.user_id, 'opening_id': opening_id}
+        session.execute(progress_upsert_statement(),
+                        {**keys, **data.state(), 'line_order': pack_line_order(data.line_order)})
+        if data.mistakes:
+            session.execute(progress_mistake_statement(), [
+                {**keys, 'line_ptr': line_ptr, 'ply': ply, 'move': move}
+                for (line_ptr, ply), move in data.mistakes.items()
+            ])
+        session.commit()
+        for path in (self._legacy_path, self._legacy_path.with_suffix('.journal')):
+            try:
+                os.replace(path, path.with_name(f"{path.name}.imported"))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"無法改名舊版進度檔 {path}: {e}")
+        logger.info(f"已從 {self._legacy_path} 匯入開局庫 {opening_id} 的練習進度。")
+        return data
+
+    # ---------- 寫入 ---------- #
+    def _write_state(self, reset: bool = False):
+        values = self.data.state()
+        if reset:
+            values['line_order'] = pack_line_order(self.data.line_order)
+        if self._writer is not None:
+            self._writer.save_training_progress(self.user_id, self.data.opening_id, values, reset=reset)
+            return
+        session = self._session_factory()
+        try:
+            keys = {'user_id': self.user_id, 'opening_id': self.data.opening_id}
+            if reset:
+                session.query(TrainingProgressMistake).filter_by(**keys).delete(synchronize_session=False)
+                session.execute(progress_upsert_statement(), {**keys, **values})
+            else:
+                session.execute(progress_state_statement(), {**keys, **values})
+            session.commit()
+        finally:
+            session.close()
+
+    def _write_line_schedule(self, line_index: int, state: SrsState):
+        row = line_schedule_row(self.user_id, self.data.opening_id, line_index, state)
+        if self._writer is not None:
+            self._writer.schedule_line(row)
+            return
+        session = self._session_factory()
+        try:
+            session.execute(line_schedule_statement(), row)
+            session.commit()
+        finally:
+            session.close()
+
+    def _write_mistake(self, line_ptr: int, ply: int, move: str):
+        if self._writer is not None:
+            self._writer.record_training_mistake(self.user_id, self.data.opening_id, line_ptr, ply, move)
+            return
+        session = self._session_factory()
+        try:
+            session.execute(progress_mistake_statement(), {
+                'user_id': self.user_id, 'opening_id': self.data.opening_id,
+                'line_ptr': line_ptr, 'ply': ply, 'move': move,
+            })
+            session.commit()
+        finally:
+            session.close()
+
+    # ---------- 開局庫 ---------- #
+    def init_opening(self, opening_id: int, num_lines: int,
+                     line_weights: Optional[Sequence[float]] = None, schedule: Optional[str] = None):
+        """
+        為此開局庫開始新的一輪（只影響這個開局庫）。
+        schedule 未指定時：沒有權重則隨機排列所有路線；提供權重時改為依權重抽樣，
+        每完成一條線才以 O(1) 抽出下一條，不預先排列整個順序。
+        "spaced" 一輪只包含今天到期的路線與少量新路線（見 spaced_repetition.due_lines）；
+        "tree" 依 all_lines 順序（開局樹 DFS 順序）練習，不需保存路線順序。
+        """
+        schedule = schedule or ("shuffle" if line_weights is None else "weighted")
+        self._next_draws.pop(opening_id, None)
+        if schedule == "spaced":
+            with self._session_factory() as session:
+                order, states = due_lines(session, self.user_id, opening_id, num_lines, SRS_NEW_LINES_PER_ROUND)
+            for line_index, state in states.items():
+                self._line_states[(opening_id, line_index)] = state
+            self.sampler = None
+        elif schedule == "tree":
+            order = []
+            self.sampler = None
+        elif schedule == "weighted":
+            order = []
+            self.sampler = AliasSampler(line_weights)
+        else:
+            order = list(range(num_lines))
+            random.shuffle(order)
+            self.sampler = None
         self.data = ProgressData(
             opening_id=opening_id,
-            line_order=order,
+            line_order=array('I', order),
             current_line_ptr=0,
             ply_index=0,
-            mistakes=[]
+            schedule=schedule,
+            num_lines=num_lines,
         )
-        self.save()
+        if schedule == "weighted":
+            self.data.current_line = self._draw_line()
+        self._loaded[opening_id] = self.data
+        self._samplers[opening_id] = self.sampler
+        self._write_state(reset=True)
+
+    def forget_opening(self, opening_id: int):
+        """開局庫被刪除後丟棄記憶體中的進度、抽樣器與路線排程。"""
+        self._loaded.pop(opening_id, None)
+        self._samplers.pop(opening_id, None)
+        self._next_draws.pop(opening_id, None)
+        for key in [key for key in self._line_states if key[0] == opening_id]:
+            del self._line_states[key]
+        if self.data is not None and self.data.opening_id == opening_id:
+            self.data = None
+            self.sampler = None
+
+    def ensure_opening(self, opening_id: int, num_lines: int,
+                       line_weights: Optional[Sequence[float]] = None, schedule: Optional[str] = None):
+        """
+        切換到此開局庫並沿用其進度；只有尚無進度、開局樹路線數改變、
+        排程模式不同或上一輪已練完時才為這個開局庫開始新的一輪。
+        weighted 模式沿用進度時只更新抽樣權重。
+        """
+        data = self._loaded.get(opening_id)
+        if data is None:
+            data = self._load(opening_id)
+            if data is not None:
+                self._loaded[opening_id] = data
+        self.data = data
+        self.sampler = self._samplers.get(opening_id)
+        schedule = schedule or ("shuffle" if line_weights is None else "weighted")
+        if (data is None or data.num_lines != num_lines or data.schedule != schedule
+                or data.current_line_ptr >= self.line_total()):
+            self.init_opening(opening_id, num_lines, line_weights, schedule)
+        elif line_weights is not None:
+            self.set_line_weights(line_weights)
 
-    def ensure_opening(self, opening_id: str, num_lines: int):
+    def set_line_weights(self, line_weights: Sequence[float]):
         """
-        若進度檔非對應開局，初始化新開局。
+        設定 weighted 模式的路線權重。
+        已有抽樣器時只重建權重有變動的區塊。
         """
-        if self.data.opening_id != opening_id:
-            self.init_opening(opening_id, num_lines)
+        self._next_draws.pop(self.data.opening_id, None)
+        if self.sampler is None or len(self.sampler) != len(line_weights):
+            self.sampler = AliasSampler(line_weights)
+            self._samplers[self.data.opening_id] = self.sampler
+            return
+        changes = {
+            i: w for i, (old, w) in enumerate(zip(self.sampler.weights, line_weights))
+            if old != w
+        }
+        self.sampler.update_many(changes)
+
+    def update_line_weight(self, line_index: int, weight: float):
+        """單一路線權重改變（例如新的實戰統計）時增量更新抽樣器。"""
+        if self.sampler is not None:
+            self._next_draws.pop(self.data.opening_id, None)
+            self.sampler.update(line_index, weight)
+
+    def _draw_line(self) -> int:
+        if self.sampler is not None and len(self.sampler):
+            return self.sampler.draw()
+        return random.randrange(self.data.num_lines) if self.data.num_lines else 0
+
+    def current_line_index(self) -> int:
+        """目前應練習的路線索引（all_lines 的下標）。"""
+        if self.data.schedule == "weighted":
+            return self.data.current_line
+        if self.data.schedule == "tree":
+            return self.data.current_line_ptr
+        return self.data.line_order[self.data.current_line_ptr]
+
+    def next_line_index(self) -> Optional[int]:
+        """
+        advance_line 之後要練的路線索引，本輪已沒有下一條時為 None；供練習時預先準備下一條路線。
+        weighted 模式在這裡先抽出下一條，advance_line 沿用同一次抽樣。
+        """
+        ptr = self.data.current_line_ptr + 1
+        if ptr >= self.line_total():
+            return None
+        if self.data.schedule == "weighted":
+            opening_id = self.data.opening_id
+            if opening_id not in self._next_draws:
+                self._next_draws[opening_id] = self._draw_line()
+            return self._next_draws[opening_id]
+        if self.data.schedule == "tree":
+            return ptr
+        return self.data.line_order[ptr]
+
+    def line_total(self) -> int:
+        """一輪練習的路線數；weighted 模式下一輪抽樣次數等於路線總數，tree 模式走過所有路線。"""
+        if self.data.schedule in ("weighted", "tree"):
+            return self.data.num_lines
+        return len(self.data.line_order)
+
+    def record_line_review(self, line_index: int, passed: bool):
+        """
+        一條路線練完後以 SM-2 更新其排程（不論目前的排程模式）：
+        整條線沒有答錯視為記得，否則視為忘記、明天再練。
+        """
+        state = review(self.prefetch_line_state(line_index), QUALITY_GOOD if passed else QUALITY_FAIL)
+        self._line_states[(self.data.opening_id, line_index)] = state
+        self._write_line_schedule(line_index, state)
+
+    def prefetch_line_state(self, line_index: int) -> SrsState:
+        """讀取並快取路線排程；練習中預先呼叫，路線結束時 record_line_review 就不必查詢資料庫。"""
+        key = (self.data.opening_id, line_index)
+        state = self._line_states.get(key)
+        if state is None:
+            with self._session_factory() as session:
+                state = load_line_state(session, self.user_id, self.data.opening_id, line_index)
+            self._line_states[key] = state
+        return state
 
     def record_mistake(self, line_ptr: int, ply: int, move: str):
         """
         記錄一次新的錯誤，避免重複。
         """
-        if not any(
-            e['line_ptr'] == line_ptr and e['ply'] == ply
-            for e in self.data.mistakes
-        ):
-            self.data.mistakes.append({
-                'line_ptr': line_ptr,
-                'ply': ply,
-                'move': move
-            })
-            self.save()
+        key = (line_ptr, ply)
+        if key not in self.data.mistakes:
+            self.data.mistakes[key] = move
+            self._write_mistake(line_ptr, ply, move)
+
+    def seek_ply(self, ply: int):
+        """目前路線從第 ply 步開始練習（tree 模式從與前一條路線的分歧處開始）。"""
+        self.data.ply_index = ply
+        self._write_state()
 
     def advance_ply(self):
         """
         當答對當前步，前進一個 ply。
         """
         self.data.ply_index += 1
-        self.save()
+        self._write_state()
 
     def advance_line(self):
         """
@@ -95,4 +439,7 @@ class ProgressTracker:
         """
         self.data.current_line_ptr += 1
         self.data.ply_index = 0
-        self.save()
\ No newline at end of file
+        if self.data.schedule == "weighted":
+            drawn = self._next_draws.pop(self.data.opening_id, None)
+            self.data.current_line = self._draw_line() if drawn is None else drawn
+        self._write_state()
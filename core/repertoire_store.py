@@ -0,0 +1,535 @@
+# chess_opening_trainer/core/repertoire_store.py
+"""
+磁碟上的開局樹格式（.rep），以 mmap 開啟、struct.unpack_from 直接讀取：
+
+    header   HEADER_STRUCT + 起始 FEN (utf-8)
+    nodes    node_count 筆 NODE_STRUCT，節點 0 為根；同一父節點的子節點連續存放，
+             並記錄子樹涵蓋的葉節點區間 [first_leaf, first_leaf + leaf_count)
+    leaves   leaf_count 筆 u32 節點編號，依 DFS 順序排列（= all_lines 的順序）
+    keys     leaf_count 筆 u64 路線識別碼（走法序列的雜湊），與 leaves 順序一致
+    index    node_count 筆 INDEX_STRUCT (position_key, node)，依 key 排序
+    san      node_count 筆 SAN_STRUCT，到達該節點那一步的 SAN（根節點為空）
+
+路線編號（line ID）是葉節點的 DFS 順序，編輯 PGN 插入變化後會位移；路線識別碼只取決於走法序列，
+可用來把以 line ID 為 key 的資料（已掌握路線、路線排程）對應到重新編譯後的 line ID。
+
+SAN 在編譯時產生一次；UCI 可直接由走法編碼還原，走完該步的局面 key 即節點的 position_key，
+因此回饋文字、提示與偏差表都不需要在互動時產生合法走法。
+
+同一局面經不同走法順序（換序）到達時在樹中是不同節點；以 (走棋前局面 key, 走法) 作為邊，
+即可把樹視為依局面合併的 DAG：edge() 取得節點對應的邊，find() 由局面 key 找回所有節點。
+
+所有整數皆為 little-endian。讀取只會碰到被查詢的節點所在的分頁，
+常駐記憶體與開局樹大小無關。
+"""
+import hashlib
+import logging
+import mmap
+from array import array
+import os
+import struct
+import sys
+from bisect import bisect_left
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import chess
+import chess.pgn
+
+from .position_key import position_key
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"OCTREP\x00\x00"
+FORMAT_VERSION = 4
+STORE_SUFFIX = ".rep"
+
+# magic, version, node_count, leaf_count, source_mtime_ns, source_size,
+# nodes_offset, leaves_offset, index_offset, san_offset, fen_length
+HEADER_STRUCT = struct.Struct("<8sIIIqqQQQQH")
+# parent, first_child, child_count, move, depth, position_key, first_leaf, leaf_count
+NODE_STRUCT = struct.Struct("<IIHHHqII")
+LEAF_STRUCT = struct.Struct("<I")
+LINE_KEY_STRUCT = struct.Struct("<Q")
+INDEX_STRUCT = struct.Struct("<qI")
+# SAN 最長 7 個字元（如 exd8=Q#、Qh4xe1+），以 NUL 補滿 8 bytes
+SAN_STRUCT = struct.Struct("8s")
+
+NO_PARENT = 0xFFFFFFFF
+# drill_plan 中不需要練習（所有走法都已在前面的路線練過）的路線
+NO_DRILL = 0xFFFF
+
+
+def encode_move(move: chess.Move) -> int:
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def decode_move(raw: int) -> chess.Move:
+    promotion = raw >> 12
+    return chess.Move(raw & 0x3F, (raw >> 6) & 0x3F, promotion or None)
+
+
+def _path_hash(parent_hash: bytes, raw: int) -> bytes:
+    """走法序列的 64 位元雜湊：由父節點的雜湊與這一步的走法編碼遞推。"""
+    return hashlib.blake2b(parent_hash + raw.to_bytes(2, "little"), digest_size=LINE_KEY_STRUCT.size).digest()
+
+
+def unpack_line_keys(data: Optional[bytes]) -> array:
+    """路線識別碼 BLOB（little-endian u64，與 .rep 的 keys 區段相同）轉成 array。"""
+    keys = array('Q')
+    if data:
+        keys.frombytes(data)
+        if sys.byteorder == 'big':
+            keys.byteswap()
+    return keys
+
+
+# ---------------------------------------------------------------------------
+# 編譯
+# ---------------------------------------------------------------------------
+def compile_store(root: chess.pgn.GameNode, path: str, source_mtime_ns: int = 0, source_size: int = 0) -> int:
+    """
+    把 PGN 變化樹編譯成 .rep 檔，回傳路線（葉節點）數。
+    子節點在走訪父節點時一次配置連續的編號，因此子節點區間只需 (first_child, child_count)。
+    """
+    nodes = bytearray(NODE_STRUCT.size)
+    sans: List[bytes] = [b""]
+    leaves: List[int] = []
+    line_keys: List[bytes] = []
+    index: List[tuple] = []
+    board = root.board()
+    start_fen = board.fen()
+    depth_limit = sys.getrecursionlimit()
+
+    def allocate(count: int) -> int:
+        first = len(nodes) // NODE_STRUCT.size
+        nodes.extend(bytes(NODE_STRUCT.size * count))
+        sans.extend([b""] * count)
+        return first
+
+    def visit(pgn_node: chess.pgn.GameNode, idx: int, parent: int, depth: int, path_hash: bytes):
+        if depth >= depth_limit - 50:
+            raise ValueError(f"路線過深（{depth} 步），無法編譯。")
+        key = position_key(board)
+        index.append((key, idx))
+        variations = pgn_node.variations
+        first_child = allocate(len(variations)) if variations else 0
+        move = encode_move(pgn_node.move) if pgn_node.move else 0
+        first_leaf = len(leaves)
+        if not variations:
+            if idx != 0:
+                leaves.append(idx)
+                line_keys.append(path_hash)
+        for offset, variation in enumerate(variations):
+            sans[first_child + offset] = board.san(variation.move).encode("ascii")
+            board.push(variation.move)
+            visit(variation, first_child + offset, idx, depth + 1,
+                  _path_hash(path_hash, encode_move(variation.move)))
+            board.pop()
+        # 葉節點依 DFS 順序排列，因此每個子樹的葉節點是一段連續區間
+        NODE_STRUCT.pack_into(nodes, idx * NODE_STRUCT.size,
+                              parent, first_child, len(variations), move, depth, key,
+                              first_leaf, len(leaves) - first_leaf)
+
+    visit(root, 0, NO_PARENT, 0, bytes(LINE_KEY_STRUCT.size))
+    node_count = len(nodes) // NODE_STRUCT.size
+    index.sort()
+
+    fen_bytes = start_fen.encode("utf-8")
+    nodes_offset = HEADER_STRUCT.size + len(fen_bytes)
+    leaves_offset = nodes_offset + len(nodes)
+    index_offset = leaves_offset + (LEAF_STRUCT.size + LINE_KEY_STRUCT.size) * len(leaves)
+    san_offset = index_offset + INDEX_STRUCT.size * len(index)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER_STRUCT.pack(MAGIC, FORMAT_VERSION, node_count, len(leaves),
+                                   source_mtime_ns, source_size,
+                                   nodes_offset, leaves_offset, index_offset, san_offset, len(fen_bytes)))
+        f.write(fen_bytes)
+        f.write(nodes)
+        f.write(b"".join(LEAF_STRUCT.pack(leaf) for leaf in leaves))
+        f.write(b"".join(line_keys))
+        f.write(b"".join(INDEX_STRUCT.pack(key, idx) for key, idx in index))
+        f.write(b"".join(SAN_STRUCT.pack(san) for san in sans))
+    os.replace(tmp_path, path)
+    logger.info(f"已編譯開局樹 {path}: {node_count} 個節點，{len(leaves)} 條路線。")
+    return len(leaves)
+
+
+def read_header(path: str) -> Optional[tuple]:
+    """讀取檔頭；檔案不存在、格式或版本不符時回傳 None。"""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(HEADER_STRUCT.size)
+    except OSError:
+        return None
+    if len(raw) != HEADER_STRUCT.size:
+        return None
+    header = HEADER_STRUCT.unpack(raw)
+    if header[0] != MAGIC or header[1] != FORMAT_VERSION:
+        return None
+    return header
+
+
+def is_up_to_date(store_path: str, source_path: str) -> bool:
+    header = read_header(store_path)
+    if header is None:
+        return False
+    try:
+        stat = os.stat(source_path)
+    except OSError:
+        return False
+    return header[4] == stat.st_mtime_ns and header[5] == stat.st_size
+
+
+# ---------------------------------------------------------------------------
+# 讀取
+# ---------------------------------------------------------------------------
+class RepertoireStore:
+    """以 mmap 開啟的唯讀開局樹。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        (magic, version, self.node_count, self.leaf_count, _, _,
+         self._nodes_offset, self._leaves_offset, self._index_offset, self._san_offset,
+         fen_length) = HEADER_STRUCT.unpack_from(self._view, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} 不是有效的開局樹檔案（版本 {version}）。")
+        self._line_keys_offset = self._leaves_offset + LEAF_STRUCT.size * self.leaf_count
+        fen_start = HEADER_STRUCT.size
+        self.start_fen = bytes(self._view[fen_start:fen_start + fen_length]).decode("utf-8")
+        self.start_turn = self.start_fen.split()[1] == "w"
+        self.lines = StoreLines(self)
+        self.root = StoreNode(self, 0)
+
+    # ---------- 節點 ---------- #
+    def node(self, idx: int) -> tuple:
+        """(parent, first_child, child_count, move, depth, position_key, first_leaf, leaf_count)"""
+        return NODE_STRUCT.unpack_from(self._view, self._nodes_offset + idx * NODE_STRUCT.size)
+
+    def parent(self, idx: int) -> Optional[int]:
+        parent = self.node(idx)[0]
+        return None if parent == NO_PARENT else parent
+
+    def children(self, idx: int) -> range:
+        _, first_child, child_count, _, _, _, _, _ = self.node(idx)
+        return range(first_child, first_child + child_count)
+
+    def move(self, idx: int) -> Optional[chess.Move]:
+        return decode_move(self.node(idx)[3]) if idx else None
+
+    def depth(self, idx: int) -> int:
+        return self.node(idx)[4]
+
+    def key(self, idx: int) -> int:
+        return self.node(idx)[5]
+
+    def san(self, idx: int) -> str:
+        """到達節點那一步的 SAN（編譯時已產生）。"""
+        raw = SAN_STRUCT.unpack_from(self._view, self._san_offset + idx * SAN_STRUCT.size)[0]
+        return raw.rstrip(b"\x00").decode("ascii")
+
+    def uci(self, idx: int) -> str:
+        return decode_move(self.node(idx)[3]).uci() if idx else ""
+
+    def mover(self, idx: int) -> chess.Color:
+        """走出到達節點那一步的一方。"""
+        return self.start_turn if self.node(idx)[4] % 2 else not self.start_turn
+
+    def to_move(self, idx: int) -> chess.Color:
+        """節點局面輪到走棋的一方。"""
+        return not self.mover(idx) if idx else self.start_turn
+
+    def edge(self, idx: int) -> Tuple[int, int]:
+        """到達節點那一步在依局面合併的 DAG 中的邊：(走棋前局面 key, 走法編碼)。"""
+        parent, _, _, raw, _, _, _, _ = self.node(idx)
+        return self.node(parent)[5], raw
+
+    def nodes_with_edge(self, edge: Tuple[int, int]) -> List[int]:
+        """DAG 中同一條邊在樹中對應的所有節點（換序時不只一個）。"""
+        key, raw = edge
+        nodes = []
+        for idx in self.find(key):
+            child = self._child_with_raw(idx, raw)
+            if child is not None:
+                nodes.append(child)
+        return nodes
+
+    def child_with_move(self, idx: int, move: chess.Move) -> Optional[int]:
+        """idx 底下走法為 move 的子節點；只比對走法編碼，不產生合法走法。"""
+        return self._child_with_raw(idx, encode_move(move))
+
+    def _child_with_raw(self, idx: int, raw: int) -> Optional[int]:
+        for child in self.children(idx):
+            if self.node(child)[3] == raw:
+                return child
+        return None
+
+    def path_nodes(self, idx: int) -> List[int]:
+        """從根的第一個子節點到 idx 的節點序列（不含根）。"""
+        nodes = []
+        while idx:
+            nodes.append(idx)
+            idx = self.node(idx)[0]
+        nodes.reverse()
+        return nodes
+
+    def path_moves(self, idx: int) -> List[chess.Move]:
+        """從根到 idx 的走法序列。"""
+        moves = []
+        while idx:
+            parent, _, _, raw, _, _, _, _ = self.node(idx)
+            moves.append(decode_move(raw))
+            idx = parent
+        moves.reverse()
+        return moves
+
+    def board_at(self, idx: int) -> chess.Board:
+        board = chess.Board(self.start_fen)
+        for move in self.path_moves(idx):
+            board.push(move)
+        return board
+
+    def leaf_range(self, idx: int) -> range:
+        """節點子樹涵蓋的路線編號（line ID）區間。"""
+        _, _, _, _, _, _, first_leaf, leaf_count = self.node(idx)
+        return range(first_leaf, first_leaf + leaf_count)
+
+    def ancestors(self, idx: int) -> Iterator[int]:
+        """由 idx 本身往上到根的所有節點。"""
+        while True:
+            yield idx
+            parent = self.node(idx)[0]
+            if parent == NO_PARENT:
+                return
+            idx = parent
+
+    # ---------- 路線 ---------- #
+    def leaf(self, line_id: int) -> int:
+        if not 0 <= line_id < self.leaf_count:
+            raise IndexError(line_id)
+        return LEAF_STRUCT.unpack_from(self._view, self._leaves_offset + line_id * LEAF_STRUCT.size)[0]
+
+    def line_keys_blob(self) -> bytes:
+        """所有路線的識別碼（little-endian u64，依 line ID 順序），可直接與資料庫中保存的 BLOB 比較。"""
+        return bytes(self._view[self._line_keys_offset:self._line_keys_offset + LINE_KEY_STRUCT.size * self.leaf_count])
+
+    def branch_depths(self) -> array:
+        """
+        依 DFS 順序（line ID 順序）連續練習時，每條路線與前一條路線的分歧深度（第 0 條為 0）。
+        從葉節點往上走，只經過「子樹第一條路線就是這條」的節點，每個節點只被走過一次，
+        整體為 O(節點數)。
+        """
+        depths = array('H', bytes(2 * self.leaf_count))
+        for line_id in range(self.leaf_count):
+            idx = self.leaf(line_id)
+            while True:
+                parent = self.node(idx)[0]
+                if parent == NO_PARENT:
+                    break
+                parent_node = self.node(parent)
+                if parent_node[6] != line_id:
+                    depths[line_id] = parent_node[4]
+                    break
+                idx = parent
+        return depths
+
+    def drill_plan(self, side: chess.Color) -> Tuple[array, array]:
+        """
+        依 DFS 順序練習、且換序到達的局面只練一次時，每條路線要練的 ply 區間 [start, end)。
+        side 一方的每條 DAG 邊只在第一次出現的路線中練習：start 為該路線第一個新邊的 ply，
+        end 為最後一個新邊的下一步（之後的走法都已在別的路線練過）；沒有新邊的路線 start 為 NO_DRILL。
+        只走過每條路線與前一條分歧後的新節點，整體為 O(節點數)。
+        """
+        starts = array('H', [NO_DRILL]) * self.leaf_count
+        ends = array('H', bytes(2 * self.leaf_count))
+        branch = self.branch_depths()
+        seen = set()
+        for line_id in range(self.leaf_count):
+            segment = []
+            idx = self.leaf(line_id)
+            while self.node(idx)[4] > branch[line_id]:
+                segment.append(idx)
+                idx = self.node(idx)[0]
+            for idx in reversed(segment):
+                if self.mover(idx) != side:
+                    continue
+                edge = self.edge(idx)
+                if edge in seen:
+                    continue
+                seen.add(edge)
+                ply = self.node(idx)[4] - 1
+                if starts[line_id] == NO_DRILL:
+                    starts[line_id] = ply
+                ends[line_id] = ply + 1
+        return starts, ends
+
+    def line_sans(self, line_id: int) -> List[str]:
+        """路線每一步的 SAN，與 lines[line_id] 一一對應。"""
+        return [self.san(idx) for idx in self.path_nodes(self.leaf(line_id))]
+
+    # ---------- 局面索引 ---------- #
+    def _index_key(self, i: int) -> int:
+        return INDEX_STRUCT.unpack_from(self._view, self._index_offset + i * INDEX_STRUCT.size)[0]
+
+    def find(self, key: int) -> List[int]:
+        """回傳局面 key 對應的所有節點（換序時不只一個）。二分搜尋，不載入索引。"""
+        keys = _IndexKeys(self)
+        i = bisect_left(keys, key)
+        found = []
+        while i < self.node_count:
+            entry_key, idx = INDEX_STRUCT.unpack_from(self._view, self._index_offset + i * INDEX_STRUCT.size)
+            if entry_key != key:
+                break
+            found.append(idx)
+            i += 1
+        return found
+
+    def iter_positions(self) -> Iterator[Tuple[int, List[int]]]:
+        """依 key 順序逐一產生 (局面 key, 該局面的所有節點)，即 DAG 中的每個局面。O(節點數)。"""
+        key, nodes = None, []
+        for i in range(self.node_count):
+            entry_key, idx = INDEX_STRUCT.unpack_from(self._view, self._index_offset + i * INDEX_STRUCT.size)
+            if entry_key != key and nodes:
+                yield key, nodes
+                nodes = []
+            key = entry_key
+            nodes.append(idx)
+        if nodes:
+            yield key, nodes
+
+    def find_board(self, board: chess.Board) -> List[int]:
+        return self.find(position_key(board))
+
+    def move_san(self, key: int, move: chess.Move) -> Optional[str]:
+        """局面 key 下開局庫走法 move 的 SAN；不在開局庫中時回傳 None。"""
+        for idx in self.find(key):
+            child = self.child_with_move(idx, move)
+            if child is not None:
+                return self.san(child)
+        return None
+
+    def close(self):
+        if self._view is not None:
+            self.lines = None
+            self.root = None
+            self._view.release()
+            self._view = None
+            self._mmap.close()
+            self._file.close()
+
+
+class _IndexKeys(Sequence):
+    """讓 bisect 直接在 mmap 上的索引區二分搜尋。"""
+
+    def __init__(self, store: RepertoireStore):
+        self._store = store
+
+    def __len__(self) -> int:
+        return self._store.node_count
+
+    def __getitem__(self, i: int) -> int:
+        return self._store._index_key(i)
+
+
+class StoreLines(Sequence):
+    """
+    all_lines 的惰性版本：line[i] 在存取時才由葉節點往回組出走法列表。
+    保留上一次組出的路線；下一條路線只需從兩者的分歧點往下補，依序走訪整體為 O(節點數)。
+    """
+
+    def __init__(self, store: RepertoireStore):
+        self._store = store
+        self._path: List[int] = []
+        self._moves: List[chess.Move] = []
+
+    def __len__(self) -> int:
+        return self._store.leaf_count
+
+    def __getitem__(self, line_id: int) -> List[chess.Move]:
+        if line_id < 0:
+            line_id += len(self)
+        self._walk_to(self._store.leaf(line_id))
+        return list(self._moves)
+
+    def __iter__(self) -> Iterator[List[chess.Move]]:
+        for line_id in range(len(self)):
+            yield self[line_id]
+
+    def _walk_to(self, idx: int):
+        """把快取的路徑改成到 idx：由 idx 往上走到與快取路徑重合的節點，再接上其下的走法。"""
+        store, path = self._store, self._path
+        suffix = []
+        while idx:
+            parent, _, _, raw, depth, _, _, _ = store.node(idx)
+            if depth <= len(path) and path[depth - 1] == idx:
+                break
+            suffix.append((idx, raw))
+            idx = parent
+        shared = store.depth(idx) if idx else 0
+        del path[shared:]
+        del self._moves[shared:]
+        for idx, raw in reversed(suffix):
+            path.append(idx)
+            self._moves.append(decode_move(raw))
+
+
+class StoreNode:
+    """
+    與 chess.pgn.GameNode 介面相容的輕量節點（move / variations / is_end / board / headers），
+    讓訓練、比對與分析程式碼不需區分資料來源。
+    """
+
+    __slots__ = ("store", "idx")
+
+    def __init__(self, store: RepertoireStore, idx: int):
+        self.store = store
+        self.idx = idx
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, StoreNode) and other.store is self.store and other.idx == self.idx
+
+    def __hash__(self) -> int:
+        return hash((id(self.store), self.idx))
+
+    @property
+    def move(self) -> Optional[chess.Move]:
+        return self.store.move(self.idx)
+
+    @property
+    def parent(self) -> Optional["StoreNode"]:
+        parent = self.store.parent(self.idx)
+        return None if parent is None else StoreNode(self.store, parent)
+
+    @property
+    def variations(self) -> List["StoreNode"]:
+        return [StoreNode(self.store, child) for child in self.store.children(self.idx)]
+
+    @property
+    def headers(self) -> dict:
+        if self.store.start_fen != chess.STARTING_FEN:
+            return {"FEN": self.store.start_fen, "SetUp": "1"}
+        return {}
+
+    @property
+    def position_key(self) -> int:
+        return self.store.key(self.idx)
+
+    def san(self) -> str:
+        return self.store.san(self.idx)
+
+    def uci(self) -> str:
+        return self.store.uci(self.idx)
+
+    def is_end(self) -> bool:
+        return not self.store.children(self.idx)
+
+    def ply(self) -> int:
+        return self.store.depth(self.idx)
+
+    def board(self) -> chess.Board:
+        return self.store.board_at(self.idx)
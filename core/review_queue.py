@@ -0,0 +1,104 @@
+# chess_opening_trainer/core/review_queue.py
+"""
+錯題複習佇列。
+
+複習只需要 (id, 局面 key, FEN, 正確走法, 開局) 與間隔重複排程，因此直接以 Core select 取欄位值，
+組成不經過 ORM 的輕量紀錄，並依 (due_on, id) 以 keyset 分頁逐頁讀取：
+開始複習只需查一次筆數與第一頁，指定 due_by 時只讀取到期的錯題，與使用者的錯題總數無關。
+局面在寫入時（core.mistakes.mistake_row）已驗證過，讀取時不再建立棋盤檢查。
+"""
+import datetime
+import logging
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from sqlalchemy import func, select, tuple_
+
+from ..config import REVIEW_PAGE_SIZE, SRS_INITIAL_EASE
+from ..database.database import SessionLocal
+from ..database.models import Mistake
+from .spaced_repetition import SrsState
+
+logger = logging.getLogger(__name__)
+
+_mistakes = Mistake.__table__
+
+
+class ReviewItem:
+    """一個待複習的錯題局面。"""
+
+    __slots__ = ("id", "position_key", "fen", "correct_move_uci", "opening_id", "schedule")
+
+    def __init__(self, id: int, position_key: int, fen: str, correct_move_uci: str, opening_id: Optional[int],
+                 ease: Optional[float] = None, interval_days: Optional[int] = None,
+                 repetitions: Optional[int] = None, due_on: Optional[datetime.date] = None):
+        self.id = id
+        self.position_key = position_key
+        self.fen = fen
+        self.correct_move_uci = correct_move_uci
+        self.opening_id = opening_id
+        self.schedule = SrsState(
+            SRS_INITIAL_EASE if ease is None else ease, interval_days or 0, repetitions or 0, due_on,
+        )
+
+    @classmethod
+    def from_mistake(cls, mistake: Mistake) -> "ReviewItem":
+        return cls(mistake.id, mistake.position_key, mistake.epd, mistake.correct_move_uci, mistake.opening_id,
+                   mistake.ease, mistake.interval_days, mistake.repetitions, mistake.due_on)
+
+    def __repr__(self) -> str:
+        return f"ReviewItem(id={self.id}, fen={self.fen!r}, move={self.correct_move_uci})"
+
+
+_COLUMNS = (_mistakes.c.id, _mistakes.c.position_key, _mistakes.c.epd,
+            _mistakes.c.correct_move_uci, _mistakes.c.opening_id,
+            _mistakes.c.ease, _mistakes.c.interval_days, _mistakes.c.repetitions, _mistakes.c.due_on)
+
+
+class ReviewQueue:
+    """
+    以 SQL 過濾（使用者、開局庫、到期日）並分頁讀取的錯題來源。
+    opening_ids 為 None 時不限開局庫；為空集合時沒有任何錯題。
+    due_by 為 None 時讀取所有錯題，否則只讀取 due_on 不晚於該日的錯題。
+    """
+
+    def __init__(self, user_id: int, opening_ids: Optional[Iterable[int]] = None,
+                 due_by: Optional[datetime.date] = None,
+                 session_factory: Callable = SessionLocal, page_size: int = REVIEW_PAGE_SIZE):
+        self.user_id = user_id
+        self.opening_ids = None if opening_ids is None else sorted(set(opening_ids))
+        self.due_by = due_by
+        self.session_factory = session_factory
+        self.page_size = page_size
+
+    def _filtered(self, stmt):
+        stmt = stmt.where(_mistakes.c.user_id == self.user_id)
+        if self.opening_ids is not None:
+            stmt = stmt.where(_mistakes.c.opening_id.in_(self.opening_ids))
+        if self.due_by is not None:
+            stmt = stmt.where(_mistakes.c.due_on <= self.due_by)
+        return stmt
+
+    def count(self) -> int:
+        if self.opening_ids == []:
+            return 0
+        with self.session_factory() as session:
+            return session.execute(self._filtered(select(func.count()).select_from(_mistakes))).scalar()
+
+    def pages(self) -> Iterator[List[ReviewItem]]:
+        """逐頁產生 ReviewItem；每頁一次短查詢，不持有跨頁的連線或游標。"""
+        if self.opening_ids == []:
+            return
+        last = None
+        while True:
+            stmt = self._filtered(select(*_COLUMNS))
+            if last is not None:
+                stmt = stmt.where(tuple_(_mistakes.c.due_on, _mistakes.c.id) > last)
+            stmt = stmt.order_by(_mistakes.c.due_on, _mistakes.c.id).limit(self.page_size)
+            with self.session_factory() as session:
+                rows = session.execute(stmt).all()
+            if not rows:
+                return
+            last = (rows[-1].due_on, rows[-1].id)
+            yield [ReviewItem(*row) for row in rows]
+            if len(rows) < self.page_size:
+                return
@@ -1,97 +1,169 @@
 # chess_opening_trainer/core/review_session.py
 import chess
+import datetime
 import random
 from PyQt5.QtCore import QObject, pyqtSignal, QTimer
-from typing import List, Tuple, Optional
-from ..database.models import Mistake
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple
 from ..database.database import SessionLocal
+from ..database.models import Mistake
+from .board_snapshot import BoardSnapshot
+from .review_queue import ReviewItem, ReviewQueue
+from .spaced_repetition import (
+    QUALITY_FAIL, QUALITY_GOOD, DueHeap, review, save_mistake_schedule,
+)
 import logging
 
 class ReviewSession(QObject):
-    """管理一個錯題複習會話。"""
-    state_changed = pyqtSignal(object, int, int) # board, remaining_count, total_count
-    review_finished = pyqtSignal(str) # "completed" or "no_mistakes"
+    """
+    管理一個錯題複習會話。
+    錯題依間隔重複（SM-2）排程：從資料庫只讀取今天已到期的錯題，逐頁放進以到期日排序的最小堆積；
+    每題第一次作答的結果更新排程，答錯的題目在本次會話稍後再出現一次。
+    使用者思考時預先建立堆積頂端下一題的棋盤與正確走法 SAN（必要時也先讀取下一頁），換題時直接換上。
+    """
+    state_changed = pyqtSignal(object, int, int) # BoardSnapshot, remaining_count, total_count
+    review_finished = pyqtSignal(str) # "completed"、"no_mistakes" 或 "nothing_due"
     feedback_provided = pyqtSignal(bool, str) # is_correct, correct_move_san
 
-    def __init__(self, user_id: int, custom_mistakes: Optional[List[Mistake]] = None):
+    def __init__(self, user_id: int, custom_mistakes: Optional[List[Mistake]] = None,
+                 opening_ids: Optional[Iterable[int]] = None,
+                 san_lookup: Optional[Callable[[ReviewItem, chess.Move], Optional[str]]] = None,
+                 writer=None, session_factory=SessionLocal):
         super().__init__()
         self.user_id = user_id
-        self.db = SessionLocal()
         self.board = chess.Board()
         
-        self.mistakes_queue: List[Mistake] = []
-        self.failed_mistakes: List[Mistake] = []
+        self.current: Optional[ReviewItem] = None
         self.total_count = 0
+        self.answered = 0
         self.custom_mistakes = custom_mistakes
+        self.opening_ids = opening_ids
+        # 由開局庫預先編譯的 SAN 表查詢正確走法的記譜，查不到時才在棋盤上產生
+        self.san_lookup = san_lookup
+        self.today = datetime.date.today()
+        self._writer = writer
+        self._session_factory = session_factory
+        self._pages: Iterator[List[ReviewItem]] = iter(())
+        self._heap = DueHeap()
+        self._fresh = 0              # 堆積中尚未作答過的錯題數
+        self._relearn: Set[int] = set()  # 本次會話答錯過的錯題（以物件 id 識別），之後出現都是重練
+        self._current_san = ""
+        self._prepared: Optional[Tuple[ReviewItem, chess.Board, str]] = None  # 預先準備的下一題
 
     def start(self):
         """開始複習會話。"""
         if self.custom_mistakes:
-            # 使用自定義錯題列表（如今日錯題）
-            self.mistakes_queue = self.custom_mistakes.copy()
-            logging.info(f"使用自定義錯題列表，錯題數量: {len(self.mistakes_queue)}")
+            # 使用自定義錯題列表（如今日錯題），不論是否到期
+            items = [m if isinstance(m, ReviewItem) else ReviewItem.from_mistake(m) for m in self.custom_mistakes]
+            self.total_count = len(items)
+            self._pages = iter([items])
+            logging.info(f"使用自定義錯題列表，錯題數量: {self.total_count}")
         else:
-            # 使用所有錯題
-            self.mistakes_queue = self.db.query(Mistake).filter_by(user_id=self.user_id).order_by(Mistake.miss_count.desc()).all()
-            logging.info(f"從資料庫載入所有錯題，錯題數量: {len(self.mistakes_queue)}")
-        
-        # 檢查錯題是否有效
-        valid_mistakes = []
-        for mistake in self.mistakes_queue:
-            try:
-                # 嘗試解析FEN，確保錯題有效
-                board = chess.Board(mistake.fen)
-                valid_mistakes.append(mistake)
-            except Exception as e:
-                logging.error(f"無效的錯題FEN: {mistake.fen}, 錯誤: {e}")
-        
-        self.mistakes_queue = valid_mistakes
-        logging.info(f"有效錯題數量: {len(self.mistakes_queue)}")
-        
-        random.shuffle(self.mistakes_queue)
+            # 使用今天到期的錯題：開局庫與到期日過濾在 SQL 完成，並逐頁讀取
+            queue = ReviewQueue(self.user_id, self.opening_ids, due_by=self.today,
+                                session_factory=self._session_factory)
+            self.total_count = queue.count()
+            self._pages = queue.pages()
+            logging.info(f"從資料庫載入到期錯題，錯題數量: {self.total_count}")
         
-        if not self.mistakes_queue:
-            self.review_finished.emit("no_mistakes")
+        self._heap = DueHeap()
+        self._fresh = 0
+        self._relearn = set()
+        self._prepared = None
+        self.current = None
+        self.answered = 0
+        if not self.total_count:
+            if self.custom_mistakes or not ReviewQueue(self.user_id, self.opening_ids,
+                                                       session_factory=self._session_factory).count():
+                self.review_finished.emit("no_mistakes")
+            else:
+                self.review_finished.emit("nothing_due")
             return
-        
-        self.total_count = len(self.mistakes_queue)
-        self.failed_mistakes = []
         self.present_next_mistake()
 
+    def _next_page(self) -> bool:
+        """讀取下一頁錯題放入堆積（同一天到期的題目順序打亂）；沒有更多錯題時回傳 False。"""
+        page = next(self._pages, None)
+        if not page:
+            return False
+        random.shuffle(page)
+        for item in page:
+            self._heap.push(item.schedule.due_on or self.today, item)
+        self._fresh += len(page)
+        return True
+
     def present_next_mistake(self):
         """呈現下一個錯題。"""
-        if not self.mistakes_queue:
-            if self.failed_mistakes:
-                # 如果有答錯的，再來一輪
-                self.mistakes_queue = self.failed_mistakes
-                self.failed_mistakes = []
-                self.total_count = len(self.mistakes_queue)
-                self.present_next_mistake()
-            else:
-                self.review_finished.emit("completed")
+        # 堆積中只剩重練的題目時先讀下一頁，讓新的到期題目排在前面
+        if not self._fresh:
+            self._next_page()
+        if not self._heap:
+            self.current = None
+            self.review_finished.emit("completed")
+            return
+
+        self.current = self._heap.pop()
+        if id(self.current) not in self._relearn:
+            self._fresh -= 1
+        if self._prepared is not None and self._prepared[0] is self.current:
+            _, self.board, self._current_san = self._prepared
+        else:
+            self.board, self._current_san = self._prepare(self.current)
+        self._prepared = None
+        self.state_changed.emit(BoardSnapshot.from_board(self.board), self.total_count - self.answered, self.total_count)
+        QTimer.singleShot(0, self._prefetch_next)
+
+    def _prepare(self, item: ReviewItem) -> Tuple[chess.Board, str]:
+        """建立錯題的棋盤與正確走法的 SAN。"""
+        board = chess.Board(item.fen)
+        correct_move = chess.Move.from_uci(item.correct_move_uci)
+        correct_move_san = self.san_lookup(item, correct_move) if self.san_lookup else None
+        if correct_move_san is None:
+            correct_move_san = self._board_san(board, correct_move)
+        return board, correct_move_san
+
+    def _prefetch_next(self):
+        """在事件迴圈空閒時準備堆積頂端的下一題；答錯的題目之後才放回堆積，不會排到它前面。"""
+        if self.current is None:
             return
+        if not self._fresh:
+            self._next_page()
+        if self._heap:
+            item = self._heap.peek()
+            if item is not self.current and (self._prepared is None or self._prepared[0] is not item):
+                self._prepared = (item, *self._prepare(item))
 
-        current_mistake = self.mistakes_queue[0]
-        self.board.set_fen(current_mistake.fen)
-        self.state_changed.emit(self.board.copy(), len(self.mistakes_queue), self.total_count)
+    @staticmethod
+    def _board_san(board: chess.Board, correct_move: chess.Move) -> str:
+        """開局庫查不到時，在棋盤上產生 SAN 記譜法；失敗則使用 UCI。"""
+        if correct_move in board.legal_moves:
+            try:
+                return board.san(correct_move)
+            except Exception:
+                return correct_move.uci()
+        # 不合法，直接用 UCI 並給提示
+        return correct_move.uci() + "（此局面下不合法，請檢查保存/分析流程）"
 
     def handle_user_move(self, move: chess.Move):
         """處理用戶的回答。"""
-        current_mistake = self.mistakes_queue[0]
+        current_mistake = self.current
+        if current_mistake is None:
+            return
         correct_move = chess.Move.from_uci(current_mistake.correct_move_uci)
         is_correct = (move == correct_move)
-        # 嘗試生成 SAN 記譜法，如果失敗則使用 UCI
-        if correct_move in self.board.legal_moves:
-            try:
-                correct_move_san = self.board.san(correct_move)
-            except Exception:
-                correct_move_san = correct_move.uci()
-        else:
-            # 不合法，直接用 UCI 並給提示
-            correct_move_san = correct_move.uci() + "（此局面下不合法，請檢查保存/分析流程）"
-        self.feedback_provided.emit(is_correct, correct_move_san)
-        if is_correct:
-            self.mistakes_queue.pop(0)
-        else:
-            self.failed_mistakes.append(self.mistakes_queue.pop(0))
-        QTimer.singleShot(1500, self.present_next_mistake)
\ No newline at end of file
+        self.feedback_provided.emit(is_correct, self._current_san)
+        self.answered += 1
+        if id(current_mistake) not in self._relearn:
+            self._reschedule(current_mistake, QUALITY_GOOD if is_correct else QUALITY_FAIL)
+        if not is_correct:
+            # 排在目前已讀取的到期題目之後再練一次
+            self.total_count += 1
+            self._relearn.add(id(current_mistake))
+            self._heap.push(self.today, current_mistake)
+        QTimer.singleShot(1500, self.present_next_mistake)
+
+    def _reschedule(self, item: ReviewItem, quality: int):
+        """以本次會話第一次作答的結果更新排程；沒有資料庫 id 的錯題不排程。"""
+        if item.id is None:
+            return
+        item.schedule = review(item.schedule, quality, self.today)
+        save_mistake_schedule(item.id, item.schedule, self._writer, self._session_factory)
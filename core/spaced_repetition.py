@@ -0,0 +1,162 @@
+# chess_opening_trainer/core/spaced_repetition.py
+"""
+間隔重複排程（SM-2）。
+
+錯題局面（mistakes）與開局路線（line_reviews）都保存 (ease, interval_days, repetitions, due_on)，
+並以 (user, due_on) 索引：開始複習或新的一輪練習時只讀取今天已到期的項目。
+會話中的待複習項目放在 DueHeap（最小堆積），取出下一個到期項目為 O(log n)。
+"""
+import datetime
+import heapq
+import itertools
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..config import SRS_INITIAL_EASE, SRS_MIN_EASE
+from ..database.database import SessionLocal
+from ..database.models import LineReview, Mistake
+
+_mistakes = Mistake.__table__
+_line_reviews = LineReview.__table__
+
+# SM-2 的回答品質（0–5，低於 3 視為忘記）
+QUALITY_FAIL = 1   # 答錯
+QUALITY_GOOD = 4   # 答對
+
+SCHEDULE_FIELDS = ("ease", "interval_days", "repetitions", "due_on")
+
+
+@dataclass(frozen=True)
+class SrsState:
+    ease: float = SRS_INITIAL_EASE
+    interval_days: int = 0
+    repetitions: int = 0
+    due_on: Optional[datetime.date] = None
+
+    def values(self) -> dict:
+        return {name: getattr(self, name) for name in SCHEDULE_FIELDS}
+
+
+def review(state: SrsState, quality: int, today: Optional[datetime.date] = None) -> SrsState:
+    """依 SM-2 以一次回答的品質計算新的排程。"""
+    today = today or datetime.date.today()
+    if quality < 3:
+        repetitions, interval = 0, 1
+    else:
+        if state.repetitions == 0:
+            interval = 1
+        elif state.repetitions == 1:
+            interval = 6
+        else:
+            interval = max(1, round(state.interval_days * state.ease))
+        repetitions = state.repetitions + 1
+    ease = max(SRS_MIN_EASE, state.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return SrsState(ease, interval, repetitions, today + datetime.timedelta(days=interval))
+
+
+class DueHeap:
+    """依到期日排序的最小堆積；到期日相同時先放入的先取出。"""
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime.date, int, Any]] = []
+        self._counter = itertools.count()
+
+    def push(self, due_on: datetime.date, item: Any):
+        heapq.heappush(self._heap, (due_on, next(self._counter), item))
+
+    def pop(self) -> Any:
+        return heapq.heappop(self._heap)[2]
+
+    def peek(self) -> Any:
+        return self._heap[0][2]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+# ---------- 錯題 ---------- #
+def mistake_schedule_statement():
+    """依 id 更新錯題排程，可搭配多筆 {'mistake_id', ease, interval_days, repetitions, due_on} 做 executemany。"""
+    return update(_mistakes).where(_mistakes.c.id == bindparam('mistake_id'))
+
+
+def mistake_schedule_row(mistake_id: int, state: SrsState) -> dict:
+    return {'mistake_id': mistake_id, **state.values()}
+
+
+def save_mistake_schedule(mistake_id: int, state: SrsState, writer=None, session_factory=SessionLocal):
+    """寫入錯題排程：有背景寫入執行緒時交給它合併提交，否則直接提交。"""
+    row = mistake_schedule_row(mistake_id, state)
+    if writer is not None:
+        writer.schedule_mistake(row)
+        return
+    session = session_factory()
+    try:
+        session.execute(mistake_schedule_statement(), row)
+        session.commit()
+    finally:
+        session.close()
+
+
+# ---------- 路線 ---------- #
+def line_schedule_statement():
+    """寫入路線排程的 UPSERT，可搭配多筆 line_schedule_row 做 executemany。"""
+    stmt = sqlite_insert(_line_reviews)
+    return stmt.on_conflict_do_update(
+        index_elements=['user_id', 'opening_id', 'line_index'],
+        set_={name: stmt.excluded[name] for name in SCHEDULE_FIELDS},
+    )
+
+
+def line_schedule_row(user_id: int, opening_id: int, line_index: int, state: SrsState) -> dict:
+    return {'user_id': user_id, 'opening_id': opening_id, 'line_index': line_index, **state.values()}
+
+
+def _line_state(row) -> SrsState:
+    return SrsState(row.ease, row.interval_days, row.repetitions, row.due_on)
+
+
+def load_line_state(session, user_id: int, opening_id: int, line_index: int) -> SrsState:
+    row = session.get(LineReview, (user_id, opening_id, line_index))
+    return _line_state(row) if row is not None else SrsState()
+
+
+def due_lines(session, user_id: int, opening_id: int, num_lines: int, new_limit: int,
+              today: Optional[datetime.date] = None) -> Tuple[List[int], Dict[int, SrsState]]:
+    """
+    一輪練習的路線：先是已到期的路線（依到期日），再加入最多 new_limit 條尚未練過的路線（依開局樹順序）。
+    兩者都沒有時提前複習最快到期的 new_limit 條，讓每一輪都有路線可練。
+    回傳 (路線順序, {路線: 排程})。
+    """
+    today = today or datetime.date.today()
+    base = select(_line_reviews).where(
+        _line_reviews.c.user_id == user_id,
+        _line_reviews.c.opening_id == opening_id,
+        _line_reviews.c.line_index < num_lines,
+    )
+    rows = session.execute(
+        base.where(_line_reviews.c.due_on <= today)
+        .order_by(_line_reviews.c.due_on, _line_reviews.c.line_index)
+    ).all()
+    states = {row.line_index: _line_state(row) for row in rows}
+    order = [row.line_index for row in rows]
+
+    scheduled = set(session.execute(
+        select(_line_reviews.c.line_index).where(
+            _line_reviews.c.user_id == user_id, _line_reviews.c.opening_id == opening_id,
+        )
+    ).scalars())
+    new_lines = itertools.islice((i for i in range(num_lines) if i not in scheduled), new_limit)
+    order.extend(new_lines)
+
+    if not order:
+        rows = session.execute(
+            base.order_by(_line_reviews.c.due_on, _line_reviews.c.line_index).limit(new_limit)
+        ).all()
+        states = {row.line_index: _line_state(row) for row in rows}
+        order = [row.line_index for row in rows]
+    return order, states
+
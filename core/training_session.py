@@ -2,14 +2,25 @@ import chess
 import logging
 import random
 from PyQt5.QtCore import QObject, pyqtSignal, QTimer
-from typing import List, Optional
+from typing import List, NamedTuple, Optional, Set, Tuple
 
+from .board_snapshot import BoardSnapshot
 from .opening_manager import Opening
+from .repertoire_store import NO_DRILL
 from .progress_tracker import ProgressTracker
 
 logger = logging.getLogger(__name__)
 
 
+class PreparedLine(NamedTuple):
+    """載入一條路線所需的一切：走法、SAN、每個 ply 的局面快照與起始步（tree 模式的分歧處）。"""
+    line_index: int
+    moves: List[chess.Move]
+    sans: List[str]
+    ply_boards: List[chess.Board]
+    start: int
+
+
 class TrainingSession(QObject):
     """單一路線「學習 ➜ 複習」一體化流程（V4：加入進度訊號）。
 
@@ -20,7 +31,7 @@ class TrainingSession(QObject):
     """
 
     # ---------- Qt Signals ---------- #
-    state_changed = pyqtSignal(str, object)           # (event_type, board)
+    state_changed = pyqtSignal(str, object)           # (event_type, BoardSnapshot)
     info_updated = pyqtSignal(str)                    # 文字提示
     mistake_made = pyqtSignal(object, object)         # (user_move, expected_move)
     line_completed = pyqtSignal(int)                  # 成功掌握一整條路線
@@ -34,6 +45,9 @@ class TrainingSession(QObject):
         player_color: chess.Color,
         computer_move_delay: int = 500,
         error_display_delay: int = 1000,
+        line_weights: Optional[List[float]] = None,
+        progress: Optional[ProgressTracker] = None,
+        schedule: Optional[str] = None,
         parent: Optional[QObject] = None,
     ) -> None:
         super().__init__(parent)
@@ -50,15 +64,29 @@ class TrainingSession(QObject):
         self.review_queue: List[int] = []  # review 模式用，存 ply index
         self.next_round_mistakes: List[int] = []  # review 下一輪
         self.mistakes_in_line: List[int] = []  # 全部錯誤 (去重)
+        self._ply_boards: List[chess.Board] = []  # 目前路線每個 ply 的局面快照
+        self._board_ply: int = 0  # self.board 由哪個 ply 的快照複製而來（快照沒有走法堆疊）
+        self.current_sans: List[str] = []  # 目前路線每一步的 SAN
+        # 使用者思考時預先準備好的下一條路線；換線時直接換上，不必在換線當下走一遍路線
+        self._next_line: Optional[PreparedLine] = None
+        self._prefetch_pending = False
+        # 延遲執行的下一步都由會話自己的計時器排程，stop() 時一併取消
+        self._timers: Set[QTimer] = set()
+        self._stopped = False
 
         # 進度
-        self.progress = ProgressTracker()
-        self.progress.ensure_opening(str(opening.db_model.id), len(opening.all_lines))
+        # 進度由呼叫端共用同一個 ProgressTracker，切換開局庫時沿用各自的進度
+        self.progress = progress or ProgressTracker(opening.db_model.user_id)
+        # schedule 見 ProgressTracker.init_opening；"tree" 時每條路線從與前一條的分歧處開始
+        self.progress.ensure_opening(opening.db_model.id, len(opening.all_lines), line_weights, schedule)
 
     # ---------------------------------------------------------------------
     # Public API
     # ---------------------------------------------------------------------
     def start_new_line(self) -> None:
+        if not self._skip_drilled_lines():
+            self._finish_round()
+            return
         self._load_progress_line()
         self._enter_learn_mode()
 
@@ -70,12 +98,30 @@ class TrainingSession(QObject):
             return self.current_line[idx]
         return None
 
+    def get_hint_san(self) -> Optional[str]:
+        """提示走法的 SAN（取自預先產生的表）。"""
+        if self.mode == "learn" and self.current_move_index < len(self.current_line):
+            return self.current_sans[self.current_move_index]
+        if self.mode == "review" and self.review_queue:
+            return self.current_sans[self.review_queue[0]]
+        return None
+
     def handle_user_move(self, move: chess.Move) -> None:
+        if self._stopped:
+            return
         if self.mode == "learn":
             self._handle_user_move_learn(move)
         else:
             self._handle_user_move_review(move)
 
+    def stop(self) -> None:
+        """停止會話：取消尚未執行的電腦走棋、複習與換線，之後不再寫入進度。"""
+        self._stopped = True
+        for timer in self._timers:
+            timer.stop()
+            timer.deleteLater()
+        self._timers.clear()
+
     # ---------------------------------------------------------------------
     # Internal – Learn mode
     # ---------------------------------------------------------------------
@@ -89,19 +135,21 @@ class TrainingSession(QObject):
             self.board.push(move)
             self.current_move_index += 1
             self.progress.advance_ply()
-            self.state_changed.emit("board_updated", self.board.copy())
+            self.state_changed.emit("board_updated", self._snapshot())
             self._emit_progress()
             # 立即處理下一個位置（不延遲，不顯示提示）
             self._process_next_position()
         else:
-            # 錯誤 — 不推進，收錄錯題
+            # 錯誤 — 不推進，收錄錯題；同時記入進度，中途關閉後回到這條路線仍會進入複習
             if self.current_move_index not in self.mistakes_in_line:
                 self.mistakes_in_line.append(self.current_move_index)
-            san = self.board.san(expected)
+                self.progress.record_mistake(self.progress.data.current_line_ptr, self.current_move_index,
+                                             expected.uci())
+            san = self.current_sans[self.current_move_index]
             self.info_updated.emit(f"錯誤！正確走法: {san}")
             self.mistake_made.emit(move, expected)
             # 錯誤時延遲
-            QTimer.singleShot(self.error_display_delay, self._process_next_position)
+            self._later(self.error_display_delay, self._process_next_position)
 
     def _process_next_position(self) -> None:
         if self.mode != "learn":
@@ -120,13 +168,14 @@ class TrainingSession(QObject):
             move = self.current_line[self.current_move_index]
             self.info_updated.emit("電腦走棋中…")
             # 延遲後再執行電腦走棋
-            QTimer.singleShot(self.computer_move_delay, lambda: self._execute_computer_move(move))
+            self._later(self.computer_move_delay, lambda: self._execute_computer_move(move))
             return
 
         # 玩家回合
-        self.state_changed.emit("board_updated", self.board.copy())
+        self.state_changed.emit("board_updated", self._snapshot())
         self.info_updated.emit("輪到你了。")
         self._emit_progress()
+        self._schedule_prefetch()
         # 延遲後允許用戶輸入
         QTimer.singleShot(self.computer_move_delay, lambda: None)
 
@@ -137,10 +186,10 @@ class TrainingSession(QObject):
             
         self.board.push(move)
         self.current_move_index += 1
-        self.state_changed.emit("board_updated", self.board.copy())
+        self.state_changed.emit("board_updated", self._snapshot())
         self._emit_progress()
         # 延遲後處理下一個位置
-        QTimer.singleShot(self.computer_move_delay, self._process_next_position)
+        self._later(self.computer_move_delay, self._process_next_position)
 
     # ---------------------------------------------------------------------
     # Internal – Review mode
@@ -152,7 +201,7 @@ class TrainingSession(QObject):
         self.next_round_mistakes = []
         self.info_updated.emit("進入複習階段！")
         # 延遲後準備第一個錯誤局面
-        QTimer.singleShot(self.computer_move_delay, self._prepare_next_review_item)
+        self._later(self.computer_move_delay, self._prepare_next_review_item)
 
     def _prepare_next_review_item(self) -> None:
         if not self.review_queue:
@@ -164,12 +213,12 @@ class TrainingSession(QObject):
             self.next_round_mistakes = []
             self.info_updated.emit("新的複習輪開始！")
             # 延遲後準備第一個錯誤局面
-            QTimer.singleShot(self.computer_move_delay, self._prepare_next_review_item)
+            self._later(self.computer_move_delay, self._prepare_next_review_item)
             return
 
         idx = self.review_queue[0]
         self._setup_board_to_ply(idx)
-        self.state_changed.emit("board_updated", self.board.copy())
+        self.state_changed.emit("board_updated", self._snapshot())
         self.info_updated.emit("複習：請走正確一步。")
         self._emit_progress(step_override=idx + 1)
         # 延遲後允許用戶輸入
@@ -182,75 +231,192 @@ class TrainingSession(QObject):
         expected = self.current_line[idx]
         if move == expected and move in self.board.legal_moves:
             self.board.push(move)
-            self.state_changed.emit("board_updated", self.board.copy())
+            self.state_changed.emit("board_updated", self._snapshot())
             self.info_updated.emit("答對！")
             self.review_queue.pop(0)
             self._emit_progress(step_override=idx + 1)
             # 複習階段仍保留延遲
-            QTimer.singleShot(self.error_display_delay, self._prepare_next_review_item)
+            self._later(self.error_display_delay, self._prepare_next_review_item)
         else:
             if idx not in self.next_round_mistakes:
                 self.next_round_mistakes.append(idx)
-            san = self.board.san(expected)
+            san = self.current_sans[idx]
             self.info_updated.emit(f"錯誤！正確走法: {san}")
             self.mistake_made.emit(move, expected)
             # 錯誤時延遲
-            QTimer.singleShot(self.error_display_delay, self._prepare_next_review_item)
+            self._later(self.error_display_delay, self._prepare_next_review_item)
 
     # ---------------------------------------------------------------------
     # Helpers
     # ---------------------------------------------------------------------
-    def _setup_board_to_ply(self, ply: int) -> None:
-        self.board.reset()
-        fen = chess.STARTING_FEN
+    def _later(self, delay: int, callback) -> None:
+        """delay 毫秒後呼叫 callback；計時器屬於會話，stop() 後不會再觸發。"""
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+
+        def fire():
+            self._timers.discard(timer)
+            timer.deleteLater()
+            if not self._stopped:
+                callback()
+        timer.timeout.connect(fire)
+        self._timers.add(timer)
+        timer.start(delay)
+
+    def _start_board(self) -> chess.Board:
+        board = chess.Board()
         if self.opening.root_node:
             fen = self.opening.root_node.headers.get("FEN", chess.STARTING_FEN)
-        try:
-            self.board.set_fen(fen)
-        except ValueError:
-            pass
-        for mv in self.current_line[:ply]:
-            if mv in self.board.legal_moves:
-                self.board.push(mv)
-            else:
+            try:
+                board.set_fen(fen)
+            except ValueError:
+                pass
+        return board
+
+    def _line_boards(self, line: List[chess.Move], line_sans: Optional[List[str]]
+                     ) -> Tuple[List[chess.Board], List[str]]:
+        """
+        走一遍路線並保存每個 ply 的局面快照（只做一次合法性檢查），
+        之後跳到任何 ply 都只需複製快照。遇到不合法走法時，之後的 ply 都停在最後的合法局面。
+        開局樹沒有預先編譯的 SAN 時（直接從 PGN 載入）順便在這裡產生。
+        """
+        board = self._start_board()
+        boards = [board.copy(stack=False)]
+        sans = [] if line_sans is None else None
+        for mv in line:
+            if mv not in board.legal_moves:
                 break
+            if sans is not None:
+                sans.append(board.san(mv))
+            board.push(mv)
+            boards.append(board.copy(stack=False))
+        if sans is not None:
+            # 不合法走法之後的步數只能顯示 UCI
+            sans.extend(mv.uci() for mv in line[len(sans):])
+            line_sans = sans
+        return boards, line_sans
+
+    def _build_ply_boards(self) -> None:
+        self._ply_boards, self.current_sans = self._line_boards(self.current_line, self.current_sans)
+
+    def _setup_board_to_ply(self, ply: int) -> None:
+        if not self._ply_boards:
+            self._build_ply_boards()
+        self._board_ply = min(ply, len(self._ply_boards) - 1)
+        self.board = self._ply_boards[self._board_ply].copy(stack=False)
+
+    def _snapshot(self) -> BoardSnapshot:
+        """發給 GUI 的唯讀局面；上一步取自走法堆疊，堆疊為空時由路線取得。"""
+        if self.board.move_stack:
+            return BoardSnapshot.from_board(self.board)
+        last_move = self.current_line[self._board_ply - 1] if self._board_ply > 0 else None
+        return BoardSnapshot.from_board(self.board, last_move)
 
     def _complete_current_line(self) -> None:
-        data = self.progress.data
-        line_ptr = data.line_order[data.current_line_ptr]
+        line_ptr = self.progress.current_line_index()
+        self.progress.record_line_review(line_ptr, passed=not self.mistakes_in_line)
         self.line_completed.emit(line_ptr)
         self.progress.advance_line()
-        self.progress.save()
-        if self.progress.data.current_line_ptr >= len(data.line_order):
-            self.info_updated.emit("恭喜！所有路線已完成訓練。")
-            self.session_completed.emit()
+        if not self._skip_drilled_lines():
+            self._finish_round()
             return
         self._load_progress_line()
         self._enter_learn_mode()
 
+    def _finish_round(self) -> None:
+        self.info_updated.emit("恭喜！所有路線已完成訓練。")
+        self.session_completed.emit()
+
+    def _skip_drilled_lines(self) -> bool:
+        """
+        tree 模式跳過所有走法都已在前面路線練過（換序到達同一局面）的路線。
+        一輪已練完時回傳 False。
+        """
+        progress = self.progress
+        if progress.data.schedule == "tree" and progress.data.ply_index == 0:
+            starts, _ = self.opening.drill_plan()
+            while (progress.data.current_line_ptr < progress.line_total()
+                   and starts[progress.current_line_index()] == NO_DRILL):
+                progress.advance_line()
+        return progress.data.current_line_ptr < progress.line_total()
+
+    def _prepare_line(self, line_index: int) -> PreparedLine:
+        moves = self.opening.all_lines[line_index]
+        sans = self.opening.line_sans(line_index)
+        start = 0
+        if self.progress.data.schedule == "tree":
+            # 依開局樹順序練習時，與前面路線共用的前綴、以及換序後已練過的結尾都不再重播
+            starts, ends = self.opening.drill_plan()
+            if starts[line_index] != NO_DRILL:
+                start, end = starts[line_index], ends[line_index]
+                moves = moves[:end]
+                if sans is not None:
+                    sans = sans[:end]
+        ply_boards, sans = self._line_boards(moves, sans)
+        return PreparedLine(line_index, moves, sans, ply_boards, start)
+
+    def _schedule_prefetch(self) -> None:
+        """每條路線第一次輪到玩家思考時，在事件迴圈空閒時準備下一條路線。"""
+        if not self._prefetch_pending:
+            self._prefetch_pending = True
+            self._later(0, self._prefetch_next_line)
+
+    def _prefetch_next_line(self) -> None:
+        """
+        預先讀取目前路線的排程（路線結束時 record_line_review 不必查詢資料庫），
+        並準備下一條路線的走法、SAN 與局面快照；tree 模式跳過換序後已練過的路線。
+        """
+        progress = self.progress
+        progress.prefetch_line_state(progress.current_line_index())
+        line_index = progress.next_line_index()
+        if line_index is not None and progress.data.schedule == "tree":
+            starts, _ = self.opening.drill_plan()
+            while line_index < progress.line_total() and starts[line_index] == NO_DRILL:
+                line_index += 1
+            if line_index >= progress.line_total():
+                line_index = None
+        if line_index is not None and (self._next_line is None or self._next_line.line_index != line_index):
+            self._next_line = self._prepare_line(line_index)
+
     def _load_progress_line(self) -> None:
         data = self.progress.data
-        line_ptr = data.line_order[data.current_line_ptr]
-        self.current_line = self.opening.all_lines[line_ptr]
+        line_ptr = self.progress.current_line_index()
+        prepared = self._next_line
+        if prepared is None or prepared.line_index != line_ptr:
+            prepared = self._prepare_line(line_ptr)
+        self._next_line = None
+        self._prefetch_pending = False
+        self.current_line = prepared.moves
+        self.current_sans = prepared.sans
+        self._ply_boards = prepared.ply_boards
         self.current_move_index = data.ply_index
-        self.mistakes_in_line = []
+        if data.ply_index == 0 and prepared.start:
+            self.progress.seek_ply(prepared.start)
+            self.current_move_index = prepared.start
+        # 從中途恢復的路線沿用先前記下的錯誤步數
+        self.mistakes_in_line = sorted(
+            ply for line_ptr, ply in data.mistakes if line_ptr == data.current_line_ptr
+        ) if data.ply_index else []
         self.review_queue = []
         self.next_round_mistakes = []
 
     def _enter_learn_mode(self) -> None:
         self.mode = "learn"
         self._setup_board_to_ply(self.current_move_index)
-        self.state_changed.emit("board_updated", self.board.copy())
-        self.info_updated.emit("開始學習新路線！")
+        self.state_changed.emit("board_updated", self._snapshot())
+        if self.current_move_index:
+            self.info_updated.emit(f"開始學習新路線！（從第 {self.current_move_index + 1} 步的分歧處開始）")
+        else:
+            self.info_updated.emit("開始學習新路線！")
         self._emit_progress()
         # 延遲後處理第一個位置
-        QTimer.singleShot(self.computer_move_delay, self._process_next_position)
+        self._later(self.computer_move_delay, self._process_next_position)
 
     def _emit_progress(self, *, step_override: Optional[int] = None) -> None:
         """對 GUI 發射目前位置進度。"""
         data = self.progress.data
         line_idx = data.current_line_ptr + 1  # +1 for human-readable
-        line_total = len(data.line_order)
+        line_total = self.progress.line_total()
         if self.mode == "learn":
             step_idx = self.current_move_index + 1  # +1 -> human-readable
         else:  # review
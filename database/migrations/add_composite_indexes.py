@@ -0,0 +1,16 @@
+"""
+資料庫遷移 v3：為 mistakes 表加入熱門查詢使用的複合索引
+"""
+from sqlalchemy import text
+
+INDEXES = (
+    ("ix_mistakes_user_fen", "mistakes (user_id, fen)"),
+    ("ix_mistakes_user_opening_fen", "mistakes (user_id, opening_id, fen)"),
+    ("ix_mistakes_user_missed_at", "mistakes (user_id, last_missed_at)"),
+)
+
+def upgrade(conn):
+    for name, definition in INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+    # 讓查詢規劃器取得新索引的統計資料
+    conn.execute(text("ANALYZE mistakes"))
@@ -0,0 +1,14 @@
+"""
+資料庫遷移 v12：openings.line_keys
+
+保存開局庫上次載入時各路線的識別碼。已掌握路線與 line_reviews 以 line ID（開局樹 DFS 順序）為 key，
+PGN 插入或刪除變化後 line ID 會位移；載入時比對識別碼即可把這些資料對應到新的 line ID。
+既有開局庫的值為 NULL，下次載入時記錄目前的識別碼。
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    columns = [row[1] for row in conn.execute(text("PRAGMA table_info(openings)")).fetchall()]
+    if "line_keys" not in columns:
+        conn.execute(text("ALTER TABLE openings ADD COLUMN line_keys BLOB"))
@@ -0,0 +1,10 @@
+"""
+資料庫遷移 v8：錯題複習佇列的分頁索引
+
+複習佇列依 (miss_count DESC, id DESC) 做 keyset 分頁；SQLite 索引隱含 rowid，
+(user_id, miss_count) 即可讓每一頁都是索引上的範圍掃描，不需排序整個錯題表。
+"""
+from sqlalchemy import text
+
+def upgrade(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_mistakes_user_miss_count ON mistakes (user_id, miss_count)"))
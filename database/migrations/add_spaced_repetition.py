@@ -0,0 +1,50 @@
+"""
+資料庫遷移 v10：間隔重複排程
+
+mistakes 加上 SM-2 排程欄位與 (user_id, due_on) 索引；既有錯題視為在最後答錯的本地日期到期（見 local_day），
+開始複習時全部都會出現一次。複習佇列改依到期日分頁，不再使用 v8 的 miss_count 索引。
+另建立 line_reviews 保存每條路線的排程；其 DDL 固定為 v10 當時的 schema，不取自目前的模型。
+"""
+from sqlalchemy import text
+
+from . import local_day
+
+_COLUMNS = (
+    ("ease", "REAL NOT NULL DEFAULT 2.5"),
+    ("interval_days", "INTEGER NOT NULL DEFAULT 0"),
+    ("repetitions", "INTEGER NOT NULL DEFAULT 0"),
+    ("due_on", "DATE"),
+)
+
+CREATE_LINE_REVIEWS = (
+    """
+    CREATE TABLE IF NOT EXISTS line_reviews (
+        user_id INTEGER NOT NULL,
+        opening_id INTEGER NOT NULL,
+        line_index INTEGER NOT NULL,
+        ease FLOAT NOT NULL,
+        interval_days INTEGER NOT NULL,
+        repetitions INTEGER NOT NULL,
+        due_on DATE NOT NULL,
+        PRIMARY KEY (user_id, opening_id, line_index),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(opening_id) REFERENCES openings (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_line_reviews_due ON line_reviews (user_id, opening_id, due_on)",
+)
+
+def upgrade(conn):
+    local_day.register(conn)
+    columns = [row[1] for row in conn.execute(text("PRAGMA table_info(mistakes)")).fetchall()]
+    for name, ddl in _COLUMNS:
+        if name not in columns:
+            conn.execute(text(f"ALTER TABLE mistakes ADD COLUMN {name} {ddl}"))
+    conn.execute(text("""
+        UPDATE mistakes SET due_on = local_day(last_missed_at)
+        WHERE due_on IS NULL
+    """))
+    conn.execute(text("DROP INDEX IF EXISTS ix_mistakes_user_miss_count"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_mistakes_user_due ON mistakes (user_id, due_on)"))
+    for ddl in CREATE_LINE_REVIEWS:
+        conn.execute(text(ddl))
@@ -0,0 +1,37 @@
+"""
+資料庫遷移 v5：建立 analysis_batches 與 batch_mistakes 表
+
+DDL 固定為 v5 當時的 schema，不取自目前的模型。
+"""
+from sqlalchemy import text
+
+DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS analysis_batches (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        started_at DATETIME NOT NULL,
+        time_range VARCHAR,
+        total_games INTEGER,
+        total_deviations INTEGER,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_analysis_batches_user_started ON analysis_batches (user_id, started_at)",
+    """
+    CREATE TABLE IF NOT EXISTS batch_mistakes (
+        batch_id INTEGER NOT NULL,
+        mistake_id INTEGER NOT NULL,
+        deviation_count INTEGER NOT NULL,
+        PRIMARY KEY (batch_id, mistake_id),
+        FOREIGN KEY(batch_id) REFERENCES analysis_batches (id),
+        FOREIGN KEY(mistake_id) REFERENCES mistakes (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_batch_mistakes_mistake ON batch_mistakes (mistake_id)",
+)
+
+def upgrade(conn):
+    for ddl in DDL:
+        conn.execute(text(ddl))
@@ -0,0 +1,37 @@
+"""
+資料庫遷移 v7：建立 daily_stats 每日統計彙總表
+
+既有錯題只保留最後一次的時間，回填時把 miss_count 全部計在 last_missed_at 的本地日期（見 local_day）；
+複習與完成路線的統計從此版本開始累計。
+DDL 固定為 v7 當時的 schema，不取自目前的模型。
+"""
+from sqlalchemy import text
+
+from . import local_day
+
+CREATE_DAILY_STATS = """
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        user_id INTEGER NOT NULL,
+        day DATE NOT NULL,
+        opening_id INTEGER NOT NULL,
+        mistakes_made INTEGER NOT NULL,
+        reviews_passed INTEGER NOT NULL,
+        reviews_failed INTEGER NOT NULL,
+        lines_completed INTEGER NOT NULL,
+        PRIMARY KEY (user_id, day, opening_id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )
+"""
+
+def upgrade(conn):
+    local_day.register(conn)
+    conn.execute(text(CREATE_DAILY_STATS))
+    conn.execute(text("""
+        INSERT OR IGNORE INTO daily_stats
+            (user_id, day, opening_id, mistakes_made, reviews_passed, reviews_failed, lines_completed)
+        SELECT user_id, local_day(last_missed_at), COALESCE(opening_id, 0),
+               SUM(COALESCE(miss_count, 1)), 0, 0, 0
+        FROM mistakes
+        WHERE user_id IS NOT NULL AND last_missed_at IS NOT NULL
+        GROUP BY user_id, local_day(last_missed_at), COALESCE(opening_id, 0)
+    """))
@@ -0,0 +1,55 @@
+"""
+資料庫遷移 v2：建立對手應著統計、已分析對局與引擎評估快取表
+
+DDL 固定為 v2 當時的 schema，不取自目前的模型。
+"""
+from sqlalchemy import text
+
+DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS opponent_replies (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        opening_id INTEGER NOT NULL,
+        position_key BIGINT NOT NULL,
+        epd VARCHAR NOT NULL,
+        reply_uci VARCHAR NOT NULL,
+        reply_san VARCHAR NOT NULL,
+        fullmove_number INTEGER,
+        in_book BOOLEAN NOT NULL,
+        count INTEGER NOT NULL,
+        last_seen_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(opening_id) REFERENCES openings (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_opponent_replies_rank ON opponent_replies (user_id, in_book, count)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_opponent_replies_key "
+    "ON opponent_replies (user_id, opening_id, position_key, reply_uci)",
+    """
+    CREATE TABLE IF NOT EXISTS analyzed_games (
+        user_id INTEGER NOT NULL,
+        game_id VARCHAR NOT NULL,
+        analyzed_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+        PRIMARY KEY (user_id, game_id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS engine_evaluations (
+        position_key BIGINT NOT NULL,
+        depth INTEGER NOT NULL,
+        move_uci VARCHAR NOT NULL,
+        epd VARCHAR NOT NULL,
+        score_cp INTEGER NOT NULL,
+        mate INTEGER,
+        evaluated_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+        PRIMARY KEY (position_key, depth, move_uci)
+    )
+    """,
+)
+
+def upgrade(conn):
+    for ddl in DDL:
+        conn.execute(text(ddl))
@@ -0,0 +1,42 @@
+"""
+資料庫遷移 v9：建立 training_progress 與 training_progress_mistakes 表
+
+練習進度改為每個 (用戶, 開局庫) 一列；舊的 data/user_data/progress.json
+只保存單一開局庫的進度，由 ProgressTracker 在該開局庫第一次載入時匯入（見 _import_legacy）。
+DDL 固定為 v9 當時的 schema，不取自目前的模型。
+"""
+from sqlalchemy import text
+
+DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS training_progress (
+        user_id INTEGER NOT NULL,
+        opening_id INTEGER NOT NULL,
+        line_order BLOB,
+        current_line_ptr INTEGER NOT NULL,
+        ply_index INTEGER NOT NULL,
+        schedule VARCHAR NOT NULL,
+        num_lines INTEGER NOT NULL,
+        current_line INTEGER NOT NULL,
+        PRIMARY KEY (user_id, opening_id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(opening_id) REFERENCES openings (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS training_progress_mistakes (
+        user_id INTEGER NOT NULL,
+        opening_id INTEGER NOT NULL,
+        line_ptr INTEGER NOT NULL,
+        ply INTEGER NOT NULL,
+        move VARCHAR NOT NULL,
+        PRIMARY KEY (user_id, opening_id, line_ptr, ply),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(opening_id) REFERENCES openings (id)
+    )
+    """,
+)
+
+def upgrade(conn):
+    for ddl in DDL:
+        conn.execute(text(ddl))
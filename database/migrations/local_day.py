@@ -0,0 +1,28 @@
+"""
+遷移回填日期時使用的 SQL 函式 local_day(timestamp)。
+
+資料庫中的時間一律是 UTC（datetime.utcnow() 或 CURRENT_TIMESTAMP），
+每日統計與到期日則是本地日期（程式以 date.today() 與 UTC 時間的 astimezone() 計算）。
+遷移改用與程式相同的 Python 轉換，不使用 SQLite 的 date(..., 'localtime')：
+兩者的時區規則不一定一致（例如 Windows 上的日光節約時間），同一筆資料可能落在不同日期。
+"""
+import datetime
+
+
+def local_day(value) -> str:
+    """UTC 時間的本地日期（ISO 格式）；沒有值或無法解析時為今天。"""
+    if value:
+        try:
+            moment = datetime.datetime.fromisoformat(str(value))
+        except ValueError:
+            moment = None
+        if moment is not None:
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=datetime.timezone.utc)
+            return moment.astimezone().date().isoformat()
+    return datetime.date.today().isoformat()
+
+
+def register(conn):
+    """在遷移使用的連線上註冊 local_day()。"""
+    conn.connection.create_function("local_day", 1, local_day)
@@ -0,0 +1,34 @@
+"""
+資料庫遷移 v6：openings.mastered_lines 由逗號分隔的文字改為位元集合 BLOB
+
+SQLite 不強制欄位型別，既有欄位宣告維持不變，只轉換每一列的值；
+之後寫入的 bytes 一律以 BLOB 儲存。
+位元編碼固定為 v6 當時的格式（第 i 條路線 = 第 i // 8 個 byte 的第 i % 8 個位元，低位在前），
+不取自目前的 core.mastery.LineBitset。
+"""
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+def encode_lines(lines) -> bytes:
+    bits = bytearray(max(lines) // 8 + 1)
+    for line in lines:
+        bits[line >> 3] |= 1 << (line & 7)
+    return bytes(bits)
+
+
+def upgrade(conn):
+    rows = conn.execute(text("SELECT id, mastered_lines FROM openings WHERE typeof(mastered_lines) = 'text'")).fetchall()
+    converted = 0
+    for opening_id, value in rows:
+        lines = sorted({int(part) for part in value.replace(" ", "").split(",") if part.isdigit()})
+        blob = None
+        if lines:
+            blob = encode_lines(lines)
+            converted += 1
+        conn.execute(text("UPDATE openings SET mastered_lines = :blob WHERE id = :id"), {'blob': blob, 'id': opening_id})
+    if converted:
+        logger.info(f"已將 {converted} 個開局庫的已掌握路線轉為位元集合。")
@@ -0,0 +1,61 @@
+"""
+資料庫遷移 v11：不屬於任何開局庫的錯題也只保留一筆
+
+唯一索引 (user_id, position_key, opening_id) 中 NULL 彼此不相等，opening_id 為 NULL 的錯題
+每次 UPSERT 都會新增一筆。此遷移合併這些重複錯題（miss_count 相加、保留最早的一筆與最近的答錯時間、
+到期日取最早），批次對應改指向保留的錯題，再以 COALESCE(opening_id, 0) 重建唯一索引。
+"""
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+UNIQUE_INDEX = (
+    "CREATE UNIQUE INDEX ux_mistakes_user_key_opening "
+    "ON mistakes (user_id, position_key, COALESCE(opening_id, 0))"
+)
+
+
+def upgrade(conn):
+    # 重複錯題 -> 同組中保留的錯題（id 最小者）
+    conn.execute(text("""
+        CREATE TEMP TABLE mistake_merge AS
+        SELECT m.id AS old_id, k.keep_id
+        FROM mistakes m
+        JOIN (SELECT user_id, position_key, MIN(id) AS keep_id FROM mistakes
+              WHERE opening_id IS NULL GROUP BY user_id, position_key HAVING count(*) > 1) k
+          ON m.user_id IS k.user_id AND m.position_key = k.position_key
+        WHERE m.opening_id IS NULL AND m.id != k.keep_id
+    """))
+    merged = conn.execute(text("SELECT count(*) FROM mistake_merge")).scalar()
+    if merged:
+        conn.execute(text("""
+            UPDATE mistakes SET
+                miss_count = COALESCE(miss_count, 1) + (
+                    SELECT SUM(COALESCE(o.miss_count, 1)) FROM mistakes o
+                    JOIN mistake_merge g ON g.old_id = o.id WHERE g.keep_id = mistakes.id),
+                last_missed_at = (
+                    SELECT MAX(o.last_missed_at) FROM mistakes o
+                    WHERE o.id = mistakes.id OR o.id IN (SELECT old_id FROM mistake_merge WHERE keep_id = mistakes.id)),
+                due_on = (
+                    SELECT MIN(o.due_on) FROM mistakes o
+                    WHERE o.id = mistakes.id OR o.id IN (SELECT old_id FROM mistake_merge WHERE keep_id = mistakes.id))
+            WHERE id IN (SELECT keep_id FROM mistake_merge)
+        """))
+        # WHERE 1 避免 INSERT ... SELECT 的 ON CONFLICT 被解析成 JOIN 條件
+        conn.execute(text("""
+            INSERT INTO batch_mistakes (batch_id, mistake_id, deviation_count)
+            SELECT b.batch_id, g.keep_id, SUM(b.deviation_count)
+            FROM batch_mistakes b JOIN mistake_merge g ON g.old_id = b.mistake_id
+            WHERE 1
+            GROUP BY b.batch_id, g.keep_id
+            ON CONFLICT (batch_id, mistake_id) DO UPDATE SET
+                deviation_count = deviation_count + excluded.deviation_count
+        """))
+        conn.execute(text("DELETE FROM batch_mistakes WHERE mistake_id IN (SELECT old_id FROM mistake_merge)"))
+        conn.execute(text("DELETE FROM mistakes WHERE id IN (SELECT old_id FROM mistake_merge)"))
+    conn.execute(text("DROP TABLE mistake_merge"))
+    conn.execute(text("DROP INDEX IF EXISTS ux_mistakes_user_key_opening"))
+    conn.execute(text(UNIQUE_INDEX))
+    logger.info(f"已合併 {merged} 筆不屬於任何開局庫的重複錯題。")
@@ -0,0 +1,87 @@
+"""
+資料庫遷移 v4：mistakes 改以正規化局面 key 儲存
+
+舊表以完整 FEN（含半回合與回合數）為鍵，同一局面在不同回合數會分成多筆。
+此遷移為每個 FEN 計算 Zobrist position_key 與 EPD，
+依 (user_id, position_key, opening_id) 合併重複錯題（miss_count 相加、保留最近一次的資料），
+並以整數唯一索引取代原本的字串索引。
+
+新表的 DDL 固定為 v4 當時的 schema，不取自目前的 Mistake 模型：之後的欄位變更由各自的遷移處理。
+"""
+import logging
+
+import chess
+from sqlalchemy import text
+
+from ...core.position_key import position_key, position_epd
+
+logger = logging.getLogger(__name__)
+
+OLD_INDEXES = (
+    "ix_mistakes_id",
+    "ix_mistakes_fen",
+    "ix_mistakes_user_fen",
+    "ix_mistakes_user_opening_fen",
+    "ix_mistakes_user_missed_at",
+)
+
+CREATE_MISTAKES = """
+    CREATE TABLE mistakes (
+        id INTEGER NOT NULL,
+        position_key BIGINT NOT NULL,
+        epd VARCHAR NOT NULL,
+        correct_move_uci VARCHAR NOT NULL,
+        user_id INTEGER,
+        opening_id INTEGER,
+        miss_count INTEGER,
+        last_missed_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(opening_id) REFERENCES openings (id)
+    )
+"""
+
+NEW_INDEXES = (
+    "CREATE UNIQUE INDEX ux_mistakes_user_key_opening ON mistakes (user_id, position_key, opening_id)",
+    "CREATE INDEX ix_mistakes_user_missed_at ON mistakes (user_id, last_missed_at)",
+)
+
+def upgrade(conn):
+    columns = [row[1] for row in conn.execute(text("PRAGMA table_info(mistakes)")).fetchall()]
+    if 'position_key' in columns:
+        return
+
+    conn.execute(text("ALTER TABLE mistakes RENAME TO mistakes_old"))
+    for name in OLD_INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    conn.execute(text(CREATE_MISTAKES))
+    for ddl in NEW_INDEXES:
+        conn.execute(text(ddl))
+
+    conn.execute(text("CREATE TEMP TABLE mistake_keys (fen TEXT PRIMARY KEY, position_key INTEGER, epd TEXT)"))
+    keys = []
+    for (fen,) in conn.execute(text("SELECT DISTINCT fen FROM mistakes_old")).fetchall():
+        try:
+            board = chess.Board(fen)
+        except ValueError:
+            logger.warning(f"略過無效的錯題 FEN: {fen}")
+            continue
+        keys.append({'fen': fen, 'position_key': position_key(board), 'epd': position_epd(board)})
+    if keys:
+        conn.execute(text("INSERT INTO mistake_keys (fen, position_key, epd) VALUES (:fen, :position_key, :epd)"), keys)
+
+    # SQLite 的 MAX() 聚合會讓同一 SELECT 中的其他裸欄位取自最大值那一列，
+    # 因此 epd 與 correct_move_uci 保留最近一次錯誤時的內容
+    conn.execute(text("""
+        INSERT INTO mistakes (position_key, epd, correct_move_uci, user_id, opening_id, miss_count, last_missed_at)
+        SELECT k.position_key, k.epd, o.correct_move_uci, o.user_id, o.opening_id,
+               SUM(COALESCE(o.miss_count, 1)), MAX(o.last_missed_at)
+        FROM mistakes_old o JOIN mistake_keys k ON k.fen = o.fen
+        GROUP BY o.user_id, k.position_key, o.opening_id
+    """))
+    before = conn.execute(text("SELECT count(*) FROM mistakes_old")).scalar()
+    after = conn.execute(text("SELECT count(*) FROM mistakes")).scalar()
+    conn.execute(text("DROP TABLE mistake_keys"))
+    conn.execute(text("DROP TABLE mistakes_old"))
+    conn.execute(text("ANALYZE mistakes"))
+    logger.info(f"錯題已改用正規化局面 key：{before} 筆合併為 {after} 筆。")
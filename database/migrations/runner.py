@@ -0,0 +1,83 @@
+"""
+版本化資料庫遷移。
+
+schema 版本存放在 SQLite 的 PRAGMA user_version：
+    * 版本已是最新：啟動時只讀取一次 pragma，不做任何其他檢查。
+    * 全新資料庫：直接以 create_all 建立最新 schema 並寫入最新版本。
+    * 舊資料庫：依序套用尚未執行的遷移，全部在同一個交易內完成。
+
+新增 schema 變更時，在 migrations/ 下新增模組並提供 upgrade(conn)，
+再把 (版本, 說明, upgrade) 加到 MIGRATIONS 尾端即可。
+"""
+import logging
+from sqlalchemy import text
+
+from ..database import Base, engine
+from . import (
+    add_side_column, create_stats_tables, add_composite_indexes, normalize_mistake_keys,
+    create_analysis_batches, mastered_lines_bitset, create_daily_stats,
+    add_review_queue_index, create_training_progress, add_spaced_repetition, merge_unscoped_mistakes,
+    add_line_keys,
+)
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = (
+    (1, "openings.side 欄位", add_side_column.upgrade),
+    (2, "對手應著統計與引擎評估表", create_stats_tables.upgrade),
+    (3, "mistakes 複合索引", add_composite_indexes.upgrade),
+    (4, "mistakes 改用正規化局面 key", normalize_mistake_keys.upgrade),
+    (5, "分析批次與批次錯題表", create_analysis_batches.upgrade),
+    (6, "已掌握路線改為位元集合", mastered_lines_bitset.upgrade),
+    (7, "每日統計彙總表", create_daily_stats.upgrade),
+    (8, "錯題複習佇列分頁索引", add_review_queue_index.upgrade),
+    (9, "各開局庫練習進度表", create_training_progress.upgrade),
+    (10, "間隔重複排程", add_spaced_repetition.upgrade),
+    (11, "合併不屬於開局庫的重複錯題", merge_unscoped_mistakes.upgrade),
+    (12, "開局庫路線識別碼", add_line_keys.upgrade),
+)
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(bind=engine) -> int:
+    with bind.connect() as conn:
+        return conn.execute(text("PRAGMA user_version")).scalar()
+
+def migrate_to_latest(bind=engine) -> int:
+    """把資料庫升級到最新 schema，回傳升級後的版本。"""
+    version = get_schema_version(bind)
+    if version == LATEST_VERSION:
+        return version
+    if version > LATEST_VERSION:
+        raise RuntimeError(f"資料庫 schema 版本 {version} 比程式支援的 {LATEST_VERSION} 新，請更新程式。")
+
+    from .. import models  # 確保模型被註冊
+    with bind.connect() as conn:
+        # pysqlite 預設不把 DDL 包進交易：改用 AUTOCOMMIT 並自行 BEGIN，
+        # 讓整批遷移與版本號一起提交或一起回復
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            with conn.begin():
+                conn.execute(text("BEGIN IMMEDIATE"))
+                has_tables = conn.execute(
+                    text("SELECT count(*) FROM sqlite_master WHERE type = 'table'")
+                ).scalar()
+                if not has_tables:
+                    logger.info("建立新資料庫 schema")
+                    Base.metadata.create_all(bind=conn)
+                else:
+                    for target, description, upgrade in MIGRATIONS:
+                        if target > version:
+                            logger.info(f"套用資料庫遷移 v{target}: {description}")
+                            upgrade(conn)
+                conn.execute(text(f"PRAGMA user_version = {LATEST_VERSION}"))
+        except Exception as e:
+            logger.error(f"資料庫遷移失敗，已回復到 v{version}: {e}")
+            raise
+        if has_tables:
+            # 遷移可能重建或刪除資料表，整理一次讓檔案實際縮小（只在升級時執行）
+            conn.execute(text("VACUUM"))
+    logger.info(f"資料庫 schema 已從 v{version} 升級到 v{LATEST_VERSION}")
+    return LATEST_VERSION
+
+if __name__ == "__main__":
+    migrate_to_latest()
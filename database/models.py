@@ -1,5 +1,7 @@
 # chess_opening_trainer/database/models.py
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
+import datetime
+
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, Date, DateTime, Text, Boolean, Float, Index, LargeBinary, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -27,16 +29,161 @@ class Opening(Base):
     user = relationship("User", back_populates="openings")
     mistakes = relationship("Mistake", back_populates="opening", cascade="all, delete-orphan")
     last_trained_line_index = Column(Integer, default=0)
-    mastered_lines = Column(Text, default="")
+    # 已掌握路線的位元集合（第 i 位 = 第 i 條路線，見 core.mastery.LineBitset）
+    mastered_lines = Column(LargeBinary, nullable=True)
+    # 上次載入時各路線的識別碼（見 core.repertoire_store.unpack_line_keys），開局樹重新編譯後用來對應 line ID
+    line_keys = Column(LargeBinary, nullable=True)
 
 class Mistake(Base):
     __tablename__ = "mistakes"
-    id = Column(Integer, primary_key=True, index=True)
-    fen = Column(String, nullable=False, index=True)
+    id = Column(Integer, primary_key=True)
+    # 正規化局面：Zobrist key 供查詢，EPD（不含回合數）供顯示與重建棋盤
+    position_key = Column(BigInteger, nullable=False)
+    epd = Column(String, nullable=False)
     correct_move_uci = Column(String, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"))
     opening_id = Column(Integer, ForeignKey("openings.id"), nullable=True)
     miss_count = Column(Integer, default=1)
     last_missed_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # 間隔重複（SM-2）排程：難易度係數、目前間隔（天）、連續答對次數與下次到期日
+    # server_default 讓舊版本遷移（例如 v4 重建錯題表後的 INSERT ... SELECT）不指定這些欄位時也能寫入
+    ease = Column(Float, nullable=False, default=2.5, server_default="2.5")
+    interval_days = Column(Integer, nullable=False, default=0, server_default="0")
+    repetitions = Column(Integer, nullable=False, default=0, server_default="0")
+    due_on = Column(Date, nullable=True, default=datetime.date.today)
     user = relationship("User", back_populates="mistakes")
-    opening = relationship("Opening", back_populates="mistakes")
\ No newline at end of file
+    opening = relationship("Opening", back_populates="mistakes")
+    batch_links = relationship("BatchMistake", back_populates="mistake", cascade="all, delete-orphan")
+
+    # 同一用戶、同一開局的同一局面只有一筆錯題（UPSERT 的衝突目標）；唯一索引中 NULL 彼此不相等，
+    # 因此以 COALESCE(opening_id, 0) 讓不屬於任何開局庫的錯題也只有一筆；
+    # 訓練時以 (user, key) 前綴查詢，另依 (user, last_missed_at) 取出某批次或今日的錯題，
+    # 複習佇列依 (user, due_on) 只讀取已到期的錯題
+    __table_args__ = (
+        Index("ux_mistakes_user_key_opening", "user_id", "position_key", text("COALESCE(opening_id, 0)"),
+              unique=True),
+        Index("ix_mistakes_user_missed_at", "user_id", "last_missed_at"),
+        Index("ix_mistakes_user_due", "user_id", "due_on"),
+    )
+
+class OpponentReply(Base):
+    """對手在開局庫局面下的應著統計，以 Zobrist position_key 彙總（換序會合併）。"""
+    __tablename__ = "opponent_replies"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    opening_id = Column(Integer, ForeignKey("openings.id"), nullable=False)
+    position_key = Column(BigInteger, nullable=False)
+    epd = Column(String, nullable=False)
+    reply_uci = Column(String, nullable=False)
+    reply_san = Column(String, nullable=False)
+    fullmove_number = Column(Integer, default=1)
+    in_book = Column(Boolean, nullable=False, default=False)
+    count = Column(Integer, nullable=False, default=0)
+    last_seen_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ux_opponent_replies_key", "user_id", "opening_id", "position_key", "reply_uci", unique=True),
+        Index("ix_opponent_replies_rank", "user_id", "in_book", "count"),
+    )
+
+class AnalyzedGame(Base):
+    """已計入應著統計的對局，確保同一盤棋重複分析時只計一次。"""
+    __tablename__ = "analyzed_games"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    game_id = Column(String, primary_key=True)
+    analyzed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class EngineEvaluation(Base):
+    """引擎評估快取：以正規化局面 key + 深度 + 候選走法為鍵，分數以走子方視角儲存。"""
+    __tablename__ = "engine_evaluations"
+    position_key = Column(BigInteger, primary_key=True)
+    depth = Column(Integer, primary_key=True)
+    move_uci = Column(String, primary_key=True)
+    epd = Column(String, nullable=False)
+    score_cp = Column(Integer, nullable=False)
+    mate = Column(Integer, nullable=True)
+    evaluated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AnalysisBatch(Base):
+    """一次 Lichess 表現分析；保留歷史，供「本次分析」與「今日」錯題查詢。"""
+    __tablename__ = "analysis_batches"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    time_range = Column(String, nullable=True)
+    total_games = Column(Integer, default=0)
+    total_deviations = Column(Integer, default=0)
+    mistake_links = relationship("BatchMistake", back_populates="batch", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_analysis_batches_user_started", "user_id", "started_at"),
+    )
+
+class BatchMistake(Base):
+    """分析批次與其找到的錯題的對應；deviation_count 為該錯題在此批次中出現的次數。"""
+    __tablename__ = "batch_mistakes"
+    batch_id = Column(Integer, ForeignKey("analysis_batches.id"), primary_key=True)
+    mistake_id = Column(Integer, ForeignKey("mistakes.id"), primary_key=True)
+    deviation_count = Column(Integer, nullable=False, default=1)
+    batch = relationship("AnalysisBatch", back_populates="mistake_links")
+    mistake = relationship("Mistake", back_populates="batch_links")
+
+    __table_args__ = (
+        Index("ix_batch_mistakes_mistake", "mistake_id"),
+    )
+
+class DailyStat(Base):
+    """
+    每日統計彙總：由各寫入路徑以 UPSERT 累加，統計畫面只讀這張表，不需彙總原始錯題。
+    opening_id 為 0 表示不屬於任何開局庫。
+    """
+    __tablename__ = "daily_stats"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    opening_id = Column(Integer, primary_key=True, default=0)
+    mistakes_made = Column(Integer, nullable=False, default=0)
+    reviews_passed = Column(Integer, nullable=False, default=0)
+    reviews_failed = Column(Integer, nullable=False, default=0)
+    lines_completed = Column(Integer, nullable=False, default=0)
+
+class TrainingProgress(Base):
+    """
+    每個 (用戶, 開局庫) 的練習進度；切換開局庫只需以主鍵讀取一列。
+    line_order 為打包的 u32 路線順序（little-endian），只在新一輪開始時寫入。
+    """
+    __tablename__ = "training_progress"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    opening_id = Column(Integer, ForeignKey("openings.id"), primary_key=True)
+    line_order = Column(LargeBinary, nullable=True)
+    current_line_ptr = Column(Integer, nullable=False, default=0)
+    ply_index = Column(Integer, nullable=False, default=0)
+    schedule = Column(String, nullable=False, default="shuffle")
+    num_lines = Column(Integer, nullable=False, default=0)
+    current_line = Column(Integer, nullable=False, default=0)
+
+class TrainingProgressMistake(Base):
+    """本輪練習中答錯的 (路線, ply)；主鍵即去重。"""
+    __tablename__ = "training_progress_mistakes"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    opening_id = Column(Integer, ForeignKey("openings.id"), primary_key=True)
+    line_ptr = Column(Integer, primary_key=True)
+    ply = Column(Integer, primary_key=True)
+    move = Column(String, nullable=False)
+
+class LineReview(Base):
+    """
+    開局庫每條路線（all_lines 的下標）的間隔重複排程；尚未練過的路線沒有資料列。
+    每輪練習依 (user, opening, due_on) 只讀取已到期的路線。
+    """
+    __tablename__ = "line_reviews"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    opening_id = Column(Integer, ForeignKey("openings.id"), primary_key=True)
+    line_index = Column(Integer, primary_key=True)
+    ease = Column(Float, nullable=False, default=2.5)
+    interval_days = Column(Integer, nullable=False, default=0)
+    repetitions = Column(Integer, nullable=False, default=0)
+    due_on = Column(Date, nullable=False)
+
+    __table_args__ = (
+        Index("ix_line_reviews_due", "user_id", "opening_id", "due_on"),
+    )
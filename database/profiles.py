@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+多帳號：每個帳號一個 SQLite 檔。
+
+帳號資料庫的引擎由 ProfileEnginePool 在第一次使用時建立（同時完成 schema 遷移），
+之後留在池中，切換帳號只需把 SessionLocal 重新綁定到對應的引擎。
+各帳號的資料表、索引與頁面快取互相獨立，不會因為其他帳號的資料量而變慢。
+"""
+import logging
+import os
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import List
+
+from ..config import (
+    ACTIVE_PROFILE_FILE, DB_PATH, DEFAULT_PROFILE, PROFILE_ENGINE_POOL_SIZE, PROFILES_DIR,
+)
+from .database import SessionLocal, create_sqlite_engine, engine as default_engine
+from .migrations.runner import migrate_to_latest
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIX = ".db"
+# 帳號名稱（以及匯入開局書時的開局名稱）直接作為檔名，只允許文字、數字、底線、連字號與空白
+PROFILE_NAME_RE = re.compile(r"^[\w\- ]{1,32}$")
+
+
+def validate_file_name(name: str, label: str) -> str:
+    """回傳去除前後空白、可直接作為檔名的名稱；不合法時拋出 ValueError。"""
+    name = (name or "").strip()
+    if not PROFILE_NAME_RE.match(name):
+        raise ValueError(f"{label}只能包含文字、數字、底線、連字號與空白，長度 1～32。")
+    return name
+
+
+def validate_profile_name(name: str) -> str:
+    """回傳去除前後空白的帳號名稱；不合法時拋出 ValueError。"""
+    return validate_file_name(name, "帳號名稱")
+
+
+def profile_db_path(name: str) -> Path:
+    if name == DEFAULT_PROFILE:
+        return DB_PATH
+    return PROFILES_DIR / f"{validate_profile_name(name)}{PROFILE_SUFFIX}"
+
+
+def list_profiles() -> List[str]:
+    """所有帳號名稱；預設帳號固定排在第一個。"""
+    names = sorted(path.stem for path in PROFILES_DIR.glob(f"*{PROFILE_SUFFIX}") if path.stem != DEFAULT_PROFILE)
+    return [DEFAULT_PROFILE] + names
+
+
+def load_active_profile() -> str:
+    """上次使用的帳號；記錄不存在或該帳號已刪除時回到預設帳號。"""
+    try:
+        name = ACTIVE_PROFILE_FILE.read_text(encoding="utf-8").strip()
+    except OSError:
+        return DEFAULT_PROFILE
+    return name if name in list_profiles() else DEFAULT_PROFILE
+
+
+def save_active_profile(name: str):
+    try:
+        ACTIVE_PROFILE_FILE.write_text(name, encoding="utf-8")
+    except OSError as e:
+        logger.warning(f"無法記錄目前帳號: {e}")
+
+
+class ProfileEnginePool:
+    """
+    以帳號名稱為 key 的 SQLite 引擎池（LRU）。
+    引擎在第一次取用時建立並遷移到最新 schema；超過 max_open 時關閉最久未使用的引擎。
+    預設帳號共用 database.engine，不會被關閉。
+    """
+
+    def __init__(self, max_open: int = PROFILE_ENGINE_POOL_SIZE):
+        self.max_open = max(1, max_open)
+        self._engines: "OrderedDict[str, object]" = OrderedDict()
+
+    def engine(self, name: str):
+        bound = self._engines.get(name)
+        if bound is not None:
+            self._engines.move_to_end(name)
+            return bound
+        if name == DEFAULT_PROFILE:
+            bound = default_engine
+        else:
+            bound = create_sqlite_engine(f"sqlite:///{profile_db_path(name).as_posix()}")
+        version = migrate_to_latest(bind=bound)
+        logger.info(f"已開啟帳號 '{name}' 的資料庫（schema v{version}）")
+        self._engines[name] = bound
+        while len(self._engines) > self.max_open:
+            oldest, _ = next(iter(self._engines.items()))
+            self.dispose(oldest)
+        return bound
+
+    def dispose(self, name: str):
+        """關閉帳號的引擎（連線池）；下次取用時重新建立。"""
+        bound = self._engines.pop(name, None)
+        if bound is not None and bound is not default_engine:
+            bound.dispose()
+
+    def close(self):
+        for name in list(self._engines):
+            self.dispose(name)
+
+
+profile_engines = ProfileEnginePool()
+
+
+def use_profile(name: str):
+    """把 SessionLocal 綁定到帳號的資料庫，之後建立的 Session 都讀寫該帳號的檔案。"""
+    bound = profile_engines.engine(name)
+    SessionLocal.configure(bind=bound)
+    return bound
+
+
+def create_profile(name: str) -> str:
+    """建立新帳號（建立資料庫檔並套用最新 schema），回傳正規化後的名稱。"""
+    name = validate_profile_name(name)
+    if name in list_profiles():
+        raise ValueError(f"帳號 '{name}' 已存在。")
+    profile_engines.engine(name)
+    logger.info(f"已建立帳號: {name}")
+    return name
+
+
+def delete_profile(name: str):
+    """刪除帳號及其資料庫檔；預設帳號不可刪除。"""
+    if name == DEFAULT_PROFILE:
+        raise ValueError("預設帳號不可刪除。")
+    path = profile_db_path(name)
+    profile_engines.dispose(name)
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(f"{path}{suffix}")
+        except FileNotFoundError:
+            pass
+    logger.info(f"已刪除帳號: {name}")
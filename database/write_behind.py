@@ -0,0 +1,434 @@
+# chess_opening_trainer/database/write_behind.py
+"""
+延後寫入（write-behind）的資料庫執行緒。
+
+GUI 執行緒只把「寫入意圖」放進佇列後立即返回，不碰資料庫；
+背景執行緒把一段時間內的意圖依所屬資料庫各建立一個 Session，合併成一個交易提交；
+每一組意圖（錯題、排程、各用戶的設定、進度……）各自在一個 SAVEPOINT 中寫入，
+一組失敗只捨棄該組，不影響同一批的其他寫入：
+
+    * 錯題：同一 (user, position_key, opening) 合併為一筆 UPSERT，miss_count 相加
+    * 設定：同一用戶只保留最後一次的值
+    * 進度：同一開局只保留最後練習的路線，已掌握路線併入位元集合
+    * 每日統計：同一 (user, day, opening) 的增量相加後一次 UPSERT 到 daily_stats；
+      錯題意圖會自動計入 mistakes_made。day 在意圖送出時決定，跨午夜才提交也記在事件當天
+    * 練習進度：同一 (user, opening) 的指標與 ply 只寫最後的值；新的一輪會清除本輪錯誤
+    * 間隔重複排程：同一錯題或同一路線只寫最後一次算出的排程
+
+每個意圖放入佇列時記下當時 session_factory 綁定的資料庫（目前帳號），
+切換帳號後仍在佇列中、或切換後才送出的舊帳號意圖都寫回原本的資料庫。
+
+需要讀到最新資料時呼叫 flush()，它會等到目前佇列中的意圖都已提交。
+save_user_settings 回傳 Future，flush() 之後可由它得知設定是否寫入成功。
+"""
+import datetime
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+import chess
+from sqlalchemy import text
+
+from ..config import WRITE_BEHIND_INTERVAL, WRITE_BEHIND_MAX_BATCH
+from ..core.mastery import LineBitset
+from ..core.daily_stats import apply_stat_rows, stat_row
+from ..core.mistakes import mistake_row, mistake_upsert_statement
+from ..core.progress_tracker import (
+    progress_mistake_statement, progress_state_statement, progress_upsert_statement,
+)
+from ..core.spaced_repetition import line_schedule_statement, mistake_schedule_statement
+from .database import SessionLocal
+from .models import Opening, TrainingProgressMistake, User
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MistakeIntent:
+    row: dict
+    day: datetime.date
+
+
+@dataclass(frozen=True)
+class SettingsIntent:
+    user_id: int
+    values: dict
+    result: Future
+
+
+@dataclass(frozen=True)
+class ProgressIntent:
+    opening_id: int
+    line_index: int
+    mastered: bool
+
+
+@dataclass(frozen=True)
+class StatIntent:
+    row: dict
+
+
+@dataclass(frozen=True)
+class TrainingStateIntent:
+    user_id: int
+    opening_id: int
+    values: dict
+    reset: bool
+
+
+@dataclass(frozen=True)
+class TrainingMistakeIntent:
+    row: dict
+
+
+@dataclass(frozen=True)
+class ScheduleIntent:
+    kind: str  # "mistake" | "line"
+    row: dict
+
+
+@dataclass(frozen=True)
+class _FlushIntent:
+    done: threading.Event
+
+
+_STOP = object()
+
+
+@dataclass(frozen=True)
+class WriterStats:
+    queue_depth: int
+    max_queue_depth: int
+    intents: int           # 已提交的寫入意圖數
+    batches: int           # 已提交的交易數
+    failed_batches: int
+    last_commit_ms: float
+    avg_commit_ms: float
+    max_commit_ms: float
+
+
+class WriteBehindWriter:
+    """背景資料庫寫入執行緒，見模組說明。"""
+
+    def __init__(self, session_factory=SessionLocal,
+                 interval: float = WRITE_BEHIND_INTERVAL, max_batch: int = WRITE_BEHIND_MAX_BATCH):
+        self._session_factory = session_factory
+        self.interval = interval
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._lock = threading.Lock()
+        self._max_depth = 0
+        self._intents = 0
+        self._batches = 0
+        self._failed = 0
+        self._last_ms = 0.0
+        self._total_ms = 0.0
+        self._max_ms = 0.0
+
+    def start(self):
+        self._thread.start()
+
+    # ---------- 寫入意圖（任何執行緒皆可呼叫） ---------- #
+    def _put(self, intent):
+        # 切換帳號會重新綁定 SessionLocal；記下此刻的資料庫，提交時寫回意圖所屬的帳號
+        self._queue.put((self._session_factory.kw.get("bind"), intent))
+        depth = self._queue.qsize()
+        if depth > self._max_depth:
+            self._max_depth = depth
+
+    def record_mistake(self, user_id: int, opening_id: Optional[int], board: chess.Board, correct_move_uci: str,
+                       day: Optional[datetime.date] = None):
+        """
+        記錄一次錯題；局面 key 在呼叫端計算，之後 board 可自由變動。
+        每日統計記在 day（預設為呼叫當天），不論意圖何時提交。
+        """
+        try:
+            row = mistake_row(user_id, opening_id, board, correct_move_uci, datetime.datetime.utcnow())
+        except ValueError as e:
+            logger.warning(f"略過無效的錯題: {e}")
+            return
+        self._put(MistakeIntent(row, day or datetime.date.today()))
+
+    def save_user_settings(self, user_id: int, values: dict) -> Future:
+        """寫入用戶設定；回傳的 Future 在提交後完成，失敗時帶有例外（例如 lichess 帳號重複）。"""
+        result = Future()
+        self._put(SettingsIntent(user_id, dict(values), result))
+        return result
+
+    def update_progress(self, opening_id: int, line_index: int, mastered: bool = False):
+        self._put(ProgressIntent(opening_id, line_index, mastered))
+
+    def save_training_progress(self, user_id: int, opening_id: int, values: dict, reset: bool = False):
+        """寫入 (user, opening) 的練習進度；reset=True 表示新的一輪，會清除該開局庫本輪的錯誤。"""
+        self._put(TrainingStateIntent(user_id, opening_id, dict(values), reset))
+
+    def record_training_mistake(self, user_id: int, opening_id: int, line_ptr: int, ply: int, move: str):
+        self._put(TrainingMistakeIntent({
+            'user_id': user_id, 'opening_id': opening_id, 'line_ptr': line_ptr, 'ply': ply, 'move': move,
+        }))
+
+    def schedule_mistake(self, row: dict):
+        """寫入錯題的間隔重複排程（core.spaced_repetition.mistake_schedule_row）。"""
+        self._put(ScheduleIntent("mistake", dict(row)))
+
+    def schedule_line(self, row: dict):
+        """寫入路線的間隔重複排程（core.spaced_repetition.line_schedule_row）。"""
+        self._put(ScheduleIntent("line", dict(row)))
+
+    def record_stat(self, user_id: int, opening_id: Optional[int], field: str, amount: int = 1,
+                    day: Optional[datetime.date] = None):
+        """累加 day（預設為呼叫當天）的某項統計（見 core.daily_stats.STAT_FIELDS）。"""
+        self._put(StatIntent(stat_row(user_id, opening_id, day, **{field: amount})))
+
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """等待目前佇列中的意圖全部提交；寫入執行緒未啟動時直接返回 False。"""
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(_FlushIntent(done))
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """提交剩餘的意圖並結束寫入執行緒。"""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"資料庫寫入執行緒未在 {timeout} 秒內結束，仍有 {self._queue.qsize()} 個意圖未寫入。")
+        stats = self.stats()
+        logger.info(
+            f"資料庫寫入執行緒已結束：{stats.intents} 個意圖、{stats.batches} 個交易，"
+            f"平均 commit {stats.avg_commit_ms:.2f} ms，最長 {stats.max_commit_ms:.2f} ms，"
+            f"最大佇列深度 {stats.max_queue_depth}。"
+        )
+
+    def stats(self) -> WriterStats:
+        with self._lock:
+            return WriterStats(
+                queue_depth=self._queue.qsize(),
+                max_queue_depth=self._max_depth,
+                intents=self._intents,
+                batches=self._batches,
+                failed_batches=self._failed,
+                last_commit_ms=self._last_ms,
+                avg_commit_ms=self._total_ms / self._batches if self._batches else 0.0,
+                max_commit_ms=self._max_ms,
+            )
+
+    # ---------- 寫入執行緒 ---------- #
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch, waiters, stop = [], [], False
+            deadline = time.monotonic() + self.interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                if isinstance(item, _FlushIntent):
+                    waiters.append(item.done)
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            # 依意圖所屬的資料庫分組，每個資料庫一個 Session 與交易
+            by_bind: Dict[object, List] = {}
+            for bind, intent in batch:
+                by_bind.setdefault(bind, []).append(intent)
+            for bind, intents in by_bind.items():
+                with self._session_factory(bind=bind) as session:
+                    self._commit(session, intents)
+            for done in waiters:
+                done.set()
+            if stop:
+                break
+
+    def _commit(self, session, batch: List):
+        counts: Counter = Counter()  # 各組的意圖數，寫入失敗時用於記錄捨棄了多少
+        mistakes: Dict[Tuple[int, int, Optional[int]], dict] = {}
+        mistake_stats: List[dict] = []
+        settings: Dict[int, dict] = {}
+        settings_results: Dict[int, List[Future]] = {}
+        progress: Dict[int, list] = {}  # opening_id -> [line_index, mastered_lines]
+        stats: List[dict] = []
+        # (user_id, opening_id) -> {'values', 'reset', 'mistakes'}
+        training: Dict[Tuple[int, int], dict] = {}
+        mistake_schedules: Dict[int, dict] = {}
+        line_schedules: Dict[Tuple[int, int, int], dict] = {}
+        for intent in batch:
+            if isinstance(intent, MistakeIntent):
+                row = intent.row
+                key = (row['user_id'], row['position_key'], row['opening_id'])
+                merged = mistakes.get(key)
+                if merged is None:
+                    mistakes[key] = dict(row)
+                else:
+                    merged['miss_count'] += row['miss_count']
+                    merged['correct_move_uci'] = row['correct_move_uci']
+                    merged['last_missed_at'] = row['last_missed_at']
+                # 錯題的每日統計與錯題在同一組寫入，錯題寫入失敗時不會多算
+                mistake_stats.append(stat_row(row['user_id'], row['opening_id'], intent.day,
+                                              mistakes_made=row['miss_count']))
+                counts['mistakes'] += 1
+            elif isinstance(intent, StatIntent):
+                stats.append(intent.row)
+                counts['stats'] += 1
+            elif isinstance(intent, TrainingStateIntent):
+                counts[('training', intent.user_id, intent.opening_id)] += 1
+                entry = training.setdefault((intent.user_id, intent.opening_id),
+                                            {'values': {}, 'reset': False, 'mistakes': {}})
+                if intent.reset:
+                    # 新的一輪：之前累積的欄位與錯誤都作廢
+                    entry['values'] = dict(intent.values)
+                    entry['reset'] = True
+                    entry['mistakes'] = {}
+                else:
+                    entry['values'].update(intent.values)
+            elif isinstance(intent, TrainingMistakeIntent):
+                row = intent.row
+                counts[('training', row['user_id'], row['opening_id'])] += 1
+                entry = training.setdefault((row['user_id'], row['opening_id']),
+                                            {'values': {}, 'reset': False, 'mistakes': {}})
+                entry['mistakes'].setdefault((row['line_ptr'], row['ply']), row)
+            elif isinstance(intent, ScheduleIntent):
+                row = intent.row
+                counts[intent.kind + '_schedules'] += 1
+                if intent.kind == "mistake":
+                    mistake_schedules[row['mistake_id']] = row
+                else:
+                    line_schedules[(row['user_id'], row['opening_id'], row['line_index'])] = row
+            elif isinstance(intent, SettingsIntent):
+                settings.setdefault(intent.user_id, {}).update(intent.values)
+                settings_results.setdefault(intent.user_id, []).append(intent.result)
+                counts[('settings', intent.user_id)] += 1
+            elif isinstance(intent, ProgressIntent):
+                counts[('progress', intent.opening_id)] += 1
+                entry = progress.setdefault(intent.opening_id, [intent.line_index, set()])
+                entry[0] = intent.line_index
+                if intent.mastered:
+                    entry[1].add(intent.line_index)
+
+        start = time.perf_counter()
+        dropped = 0
+        try:
+            # pysqlite 不會在 SAVEPOINT 前送出 BEGIN（同遷移執行器）：自行開始交易，
+            # 各組的 SAVEPOINT 才會巢狀在同一個交易中，整批仍只 commit 一次
+            session.execute(text("BEGIN IMMEDIATE"))
+
+            # (組別, 說明, 寫入函式)；組別對應 counts 的 key
+            groups: List[Tuple[object, str, Callable[[], None]]] = []
+            if mistakes:
+                groups.append(('mistakes', "錯題",
+                               partial(self._write_mistakes, session, list(mistakes.values()), mistake_stats)))
+            if mistake_schedules:
+                groups.append(('mistake_schedules', "錯題排程",
+                               partial(session.execute, mistake_schedule_statement(), list(mistake_schedules.values()))))
+            if line_schedules:
+                groups.append(('line_schedules', "路線排程",
+                               partial(session.execute, line_schedule_statement(), list(line_schedules.values()))))
+            for user_id, values in settings.items():
+                groups.append((('settings', user_id), f"用戶 {user_id} 的設定",
+                               partial(self._write_settings, session, user_id, values)))
+            for opening_id, (line_index, mastered) in progress.items():
+                groups.append((('progress', opening_id), f"開局庫 {opening_id} 的進度",
+                               partial(self._write_progress, session, opening_id, line_index, mastered)))
+            for (user_id, opening_id), entry in training.items():
+                groups.append((('training', user_id, opening_id), f"開局庫 {opening_id} 的練習進度",
+                               partial(self._write_training, session, user_id, opening_id, entry)))
+            if stats:
+                groups.append(('stats', "每日統計", partial(apply_stat_rows, session, stats)))
+
+            settings_errors: Dict[int, Optional[Exception]] = {}
+            for key, description, write in groups:
+                error = self._savepoint(session, description, write)
+                if error is not None:
+                    dropped += counts[key]
+                if isinstance(key, tuple) and key[0] == 'settings':
+                    settings_errors[key[1]] = error
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            with self._lock:
+                self._failed += 1
+            logger.error(f"背景寫入失敗，捨棄 {len(batch)} 個寫入意圖: {e}")
+            for results in settings_results.values():
+                for result in results:
+                    result.set_exception(e)
+            return
+        for user_id, results in settings_results.items():
+            for result in results:
+                if settings_errors[user_id] is None:
+                    result.set_result(None)
+                else:
+                    result.set_exception(settings_errors[user_id])
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._intents += len(batch) - dropped
+            self._batches += 1
+            if dropped:
+                self._failed += 1
+            self._last_ms = elapsed
+            self._total_ms += elapsed
+            self._max_ms = max(self._max_ms, elapsed)
+        logger.debug(
+            f"背景寫入 {len(batch)} 個意圖（{len(mistakes)} 筆錯題、{len(settings)} 筆設定、"
+            f"{len(progress)} 筆進度），commit {elapsed:.2f} ms，佇列剩餘 {self._queue.qsize()}。"
+        )
+
+    @staticmethod
+    def _savepoint(session, description: str, write: Callable[[], None]) -> Optional[Exception]:
+        """在 SAVEPOINT 中寫入一組意圖；失敗時只回復這一組並回傳例外。"""
+        try:
+            with session.begin_nested():
+                write()
+        except Exception as e:
+            logger.error(f"背景寫入{description}失敗，捨棄這部分的寫入意圖: {e}")
+            return e
+        return None
+
+    @staticmethod
+    def _write_mistakes(session, rows: List[dict], stat_rows: List[dict]):
+        session.execute(mistake_upsert_statement(), rows)
+        apply_stat_rows(session, stat_rows)
+
+    @staticmethod
+    def _write_settings(session, user_id: int, values: dict):
+        session.query(User).filter(User.id == user_id).update(values, synchronize_session=False)
+
+    @staticmethod
+    def _write_progress(session, opening_id: int, line_index: int, mastered: set):
+        opening = session.get(Opening, opening_id)
+        if opening is None:
+            return  # 開局庫已被刪除
+        opening.last_trained_line_index = line_index
+        if mastered:
+            data = opening.mastered_lines or b""
+            bits = LineBitset(max(len(data) * 8, max(mastered) + 1), data)
+            if any([bits.add(line) for line in mastered]):
+                opening.mastered_lines = bits.to_bytes()
+
+    @staticmethod
+    def _write_training(session, user_id: int, opening_id: int, entry: dict):
+        keys = {'user_id': user_id, 'opening_id': opening_id}
+        if entry['reset']:
+            session.query(TrainingProgressMistake).filter_by(**keys).delete(synchronize_session=False)
+            session.execute(progress_upsert_statement(), {**keys, **entry['values']})
+        elif entry['values']:
+            session.execute(progress_state_statement(), {**keys, **entry['values']})
+        if entry['mistakes']:
+            session.execute(progress_mistake_statement(), list(entry['mistakes'].values()))
@@ -0,0 +1,40 @@
+from typing import List
+
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtWidgets import QWidget, QLabel, QComboBox, QPushButton, QHBoxLayout, QSizePolicy
+
+
+class AccountPanel(QWidget):
+    """
+    常駐顯示目前帳號，並可切換或開啟帳號管理。
+    """
+    profile_selected = pyqtSignal(str)
+    manage_requested = pyqtSignal()
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+
+        label = QLabel("帳號:")
+        label.setStyleSheet("color:#DDD; font-size:13px;")
+
+        self.profile_combo = QComboBox()
+        self.profile_combo.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        self.manage_button = QPushButton("管理帳號...")
+
+        lay = QHBoxLayout(self)
+        lay.setContentsMargins(0, 2, 0, 2)
+        lay.setSpacing(6)
+        lay.addWidget(label)
+        lay.addWidget(self.profile_combo, 1)
+        lay.addWidget(self.manage_button)
+
+        self.profile_combo.activated[str].connect(self.profile_selected)
+        self.manage_button.clicked.connect(self.manage_requested)
+
+    # ---------- 公開 slot ---------- #
+    def set_profiles(self, names: List[str], active: str):
+        self.profile_combo.blockSignals(True)
+        self.profile_combo.clear()
+        self.profile_combo.addItems(names)
+        self.profile_combo.setCurrentText(active)
+        self.profile_combo.blockSignals(False)
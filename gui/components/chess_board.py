@@ -5,6 +5,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtCore import Qt
 from typing import Optional, Dict, Tuple, List
 from ...config import RESOURCES_DIR
+from ...core.board_snapshot import BoardSnapshot, STARTING_BOARD_SNAPSHOT
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,7 +26,9 @@ class ChessBoardWidget(QtWidgets.QGraphicsView):
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.board = chess.Board()
+        # 只保存唯讀快照；需要合法走法時才組回 chess.Board
+        self.board: BoardSnapshot = STARTING_BOARD_SNAPSHOT
+        self._legal_board: Optional[chess.Board] = None
         self.square_size = 75.0 # 保持為 float 以進行精確計算
         self.flipped = False
         self.allow_user_input = False
@@ -60,10 +63,26 @@ class ChessBoardWidget(QtWidgets.QGraphicsView):
                     images[key] = pixmap.scaled(scaled_size, scaled_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
         return images
 
-    def set_board(self, board: chess.Board):
+    def set_board(self, board):
+        """board: BoardSnapshot；傳入 chess.Board 時轉成快照。"""
+        if isinstance(board, chess.Board):
+            board = BoardSnapshot.from_board(board)
         self.board = board
+        self._legal_board = None
         self.draw_board()
 
+    def _highlight_last_move(self):
+        last_move = self.board.last_move
+        if last_move is not None:
+            self.highlights[last_move.from_square] = self.COLORS["last_move"]
+            self.highlights[last_move.to_square] = self.COLORS["last_move"]
+
+    def _is_legal(self, move: chess.Move) -> bool:
+        # 只在玩家落子時組回棋盤，且同一局面只組一次
+        if self._legal_board is None:
+            self._legal_board = self.board.board()
+        return self._legal_board.is_legal(move)
+
     def set_flipped(self, flipped: bool):
         if self.flipped != flipped:
             self.flipped = flipped
@@ -81,10 +100,7 @@ class ChessBoardWidget(QtWidgets.QGraphicsView):
 
     def highlight_move(self, move: chess.Move, from_color: QtGui.QColor, to_color: QtGui.QColor):
         self.highlights.clear() # 先清除舊的高亮
-        if self.board.move_stack: # 如果有上一步，也高亮上一步
-             last_move = self.board.peek()
-             self.highlights[last_move.from_square] = self.COLORS["last_move"]
-             self.highlights[last_move.to_square] = self.COLORS["last_move"]
+        self._highlight_last_move() # 如果有上一步，也高亮上一步
         self.highlights[move.from_square] = from_color
         self.highlights[move.to_square] = to_color
         self.draw_board()
@@ -152,10 +168,7 @@ class ChessBoardWidget(QtWidgets.QGraphicsView):
             if piece and piece.color == self.board.turn:
                 self.selected_square = clicked_square
                 self.clear_highlights()
-                if self.board.move_stack:
-                    last_move = self.board.peek()
-                    self.highlights[last_move.from_square] = self.COLORS["last_move"]
-                    self.highlights[last_move.to_square] = self.COLORS["last_move"]
+                self._highlight_last_move()
                 self.highlights[clicked_square] = self.COLORS["selected"]
                 self.draw_board()
         else:
@@ -165,7 +178,7 @@ class ChessBoardWidget(QtWidgets.QGraphicsView):
             if self.board.piece_type_at(from_sq) == chess.PAWN and chess.square_rank(to_sq) in [0, 7]:
                 move.promotion = chess.QUEEN
 
-            if move in self.board.legal_moves:
+            if self._is_legal(move):
                 self.moveMade.emit(move)
             
             self.selected_square = None
@@ -0,0 +1,48 @@
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtWidgets import QWidget, QLabel, QHBoxLayout, QVBoxLayout, QPushButton, QSizePolicy
+
+from ...core.daily_stats import StatTotals
+
+
+def _format_totals(title: str, totals: StatTotals) -> str:
+    rate = f"{totals.pass_rate * 100:.0f}%" if totals.pass_rate is not None else "-"
+    return (f"{title}：錯誤 {totals.mistakes_made}　複習 {totals.reviews}（通過率 {rate}）"
+            f"　完成路線 {totals.lines_completed}")
+
+
+class StatisticsPanel(QWidget):
+    """
+    顯示 [今日] 與 [最近 7 天] 的統計摘要，資料來自 daily_stats 彙總表。
+    """
+    details_requested = pyqtSignal()
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+
+        self.today_label = QLabel()
+        self.week_label = QLabel()
+        for lbl in (self.today_label, self.week_label):
+            lbl.setStyleSheet("color:#DDD; font-size:13px;")
+            lbl.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Fixed)
+
+        self.details_button = QPushButton("詳細統計")
+        self.details_button.clicked.connect(self.details_requested)
+
+        labels = QVBoxLayout()
+        labels.setSpacing(2)
+        labels.addWidget(self.today_label)
+        labels.addWidget(self.week_label)
+
+        lay = QHBoxLayout(self)
+        lay.setContentsMargins(0, 2, 0, 2)
+        lay.setSpacing(6)
+        lay.addLayout(labels)
+        lay.addStretch()
+        lay.addWidget(self.details_button)
+
+        self.update_totals(StatTotals(), StatTotals())
+
+    # ---------- 公開 slot ---------- #
+    def update_totals(self, today: StatTotals, week: StatTotals):
+        self.today_label.setText(_format_totals("今日", today))
+        self.week_label.setText(_format_totals("最近 7 天", week))
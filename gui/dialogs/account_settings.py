@@ -0,0 +1,90 @@
+# chess_opening_trainer/gui/dialogs/account_settings.py
+from typing import List
+
+from PyQt5 import QtWidgets, QtCore
+
+
+class AccountSettingsDialog(QtWidgets.QDialog):
+    """
+    帳號管理：列出所有帳號，可新增、刪除或切換。
+    實際的建立／刪除由主視窗處理，完成後再呼叫 set_profiles 更新清單。
+    """
+    create_requested = QtCore.pyqtSignal(str)
+    delete_requested = QtCore.pyqtSignal(str)
+    switch_requested = QtCore.pyqtSignal(str)
+
+    def __init__(self, names: List[str], active: str, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("帳號管理")
+        self.layout = QtWidgets.QVBoxLayout(self)
+
+        self.layout.addWidget(QtWidgets.QLabel("每個帳號的開局庫、錯題與統計都存放在各自的資料庫檔。"))
+        self.list_widget = QtWidgets.QListWidget()
+        self.layout.addWidget(self.list_widget, 1)
+
+        # 新增帳號
+        self.name_layout = QtWidgets.QHBoxLayout()
+        self.name_input = QtWidgets.QLineEdit()
+        self.name_input.setPlaceholderText("新帳號名稱")
+        self.add_button = QtWidgets.QPushButton("新增")
+        self.name_layout.addWidget(self.name_input)
+        self.name_layout.addWidget(self.add_button)
+        self.layout.addLayout(self.name_layout)
+
+        self.action_layout = QtWidgets.QHBoxLayout()
+        self.switch_button = QtWidgets.QPushButton("切換到選定帳號")
+        self.delete_button = QtWidgets.QPushButton("刪除選定帳號")
+        self.action_layout.addWidget(self.switch_button)
+        self.action_layout.addWidget(self.delete_button)
+        self.layout.addLayout(self.action_layout)
+
+        self.button_box = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Close)
+        self.layout.addWidget(self.button_box)
+
+        self.add_button.clicked.connect(self._on_add)
+        self.name_input.returnPressed.connect(self._on_add)
+        self.switch_button.clicked.connect(self._on_switch)
+        self.delete_button.clicked.connect(self._on_delete)
+        self.list_widget.itemDoubleClicked.connect(lambda _: self._on_switch())
+        self.button_box.rejected.connect(self.reject)
+
+        self.set_profiles(names, active)
+
+    def set_profiles(self, names: List[str], active: str):
+        self.active = active
+        self.list_widget.clear()
+        for name in names:
+            item = QtWidgets.QListWidgetItem(f"{name}（目前）" if name == active else name)
+            item.setData(QtCore.Qt.UserRole, name)
+            self.list_widget.addItem(item)
+            if name == active:
+                self.list_widget.setCurrentItem(item)
+
+    def _selected(self):
+        item = self.list_widget.currentItem()
+        return item.data(QtCore.Qt.UserRole) if item else None
+
+    def _on_add(self):
+        name = self.name_input.text().strip()
+        if name:
+            self.create_requested.emit(name)
+            self.name_input.clear()
+
+    def _on_switch(self):
+        name = self._selected()
+        if name and name != self.active:
+            self.switch_requested.emit(name)
+
+    def _on_delete(self):
+        name = self._selected()
+        if not name:
+            return
+        if name == self.active:
+            QtWidgets.QMessageBox.warning(self, "錯誤", "無法刪除目前使用中的帳號，請先切換到其他帳號。")
+            return
+        reply = QtWidgets.QMessageBox.question(
+            self, "確認刪除", f"確定要刪除帳號 '{name}' 及其所有資料嗎？此操作無法復原。",
+            QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No, QtWidgets.QMessageBox.No
+        )
+        if reply == QtWidgets.QMessageBox.Yes:
+            self.delete_requested.emit(name)
@@ -0,0 +1,111 @@
+# chess_opening_trainer/gui/dialogs/statistics_view.py
+import datetime
+from typing import Callable, List, Optional
+
+from PyQt5 import QtCore, QtWidgets
+
+from ...core import daily_stats
+from ...core.daily_stats import StatTotals
+
+# (顯示名稱, 天數)；None 表示全部
+RANGES = (("最近7天", 7), ("最近30天", 30), ("最近一年", 365), ("全部", None))
+DAILY_COLUMNS = ("日期", "錯誤", "複習通過", "複習失敗", "通過率", "完成路線")
+OPENING_COLUMNS = ("開局庫", "錯誤", "複習", "通過率", "完成路線", "掌握度")
+
+
+def _rate(totals: StatTotals) -> str:
+    return f"{totals.pass_rate * 100:.0f}%" if totals.pass_rate is not None else "-"
+
+
+class StatisticsView(QtWidgets.QDialog):
+    """
+    詳細統計視窗：依期間與開局庫顯示每日統計，以及各開局庫的期間合計與掌握度。
+    所有數字都是對 daily_stats 彙總表的範圍查詢，不掃描錯題或分析紀錄。
+    """
+    def __init__(self, session_factory: Callable, user_id: int, openings: List, parent=None):
+        super().__init__(parent)
+        self.session_factory = session_factory
+        self.user_id = user_id
+        self.openings = openings
+        self.setWindowTitle("詳細統計")
+        self.resize(640, 520)
+        self.layout = QtWidgets.QVBoxLayout(self)
+
+        filters = QtWidgets.QHBoxLayout()
+        self.range_combo = QtWidgets.QComboBox()
+        for label, days in RANGES:
+            self.range_combo.addItem(label, days)
+        self.opening_combo = QtWidgets.QComboBox()
+        self.opening_combo.addItem("全部開局庫", None)
+        for opening in openings:
+            self.opening_combo.addItem(f"{opening.name}（{'白' if opening.side else '黑'}）", opening.db_model.id)
+        filters.addWidget(QtWidgets.QLabel("期間:"))
+        filters.addWidget(self.range_combo)
+        filters.addWidget(QtWidgets.QLabel("開局庫:"))
+        filters.addWidget(self.opening_combo, 1)
+        self.layout.addLayout(filters)
+
+        self.summary_label = QtWidgets.QLabel()
+        self.layout.addWidget(self.summary_label)
+
+        self.daily_table = self._make_table(DAILY_COLUMNS)
+        self.layout.addWidget(self.daily_table, 2)
+        self.layout.addWidget(QtWidgets.QLabel("各開局庫"))
+        self.opening_table = self._make_table(OPENING_COLUMNS)
+        self.layout.addWidget(self.opening_table, 1)
+
+        self.button_box = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Close)
+        self.button_box.rejected.connect(self.reject)
+        self.layout.addWidget(self.button_box)
+
+        self.range_combo.currentIndexChanged.connect(self.refresh)
+        self.opening_combo.currentIndexChanged.connect(self.refresh)
+        self.refresh()
+
+    def _make_table(self, columns) -> QtWidgets.QTableWidget:
+        table = QtWidgets.QTableWidget(0, len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+        return table
+
+    def _since(self) -> Optional[datetime.date]:
+        days = self.range_combo.currentData()
+        return datetime.date.today() - datetime.timedelta(days=days - 1) if days else None
+
+    def refresh(self):
+        since = self._since()
+        opening_id = self.opening_combo.currentData()
+        session = self.session_factory()
+        try:
+            days = daily_stats.daily_totals(session, self.user_id, since, opening_id)
+            per_opening = daily_stats.opening_totals(session, self.user_id, since)
+        finally:
+            session.close()
+
+        total = StatTotals(*(sum(getattr(t, name) for _, t in days) for name in daily_stats.STAT_FIELDS))
+        self.summary_label.setText(
+            f"合計：錯誤 {total.mistakes_made}，複習 {total.reviews}（通過率 {_rate(total)}），"
+            f"完成路線 {total.lines_completed}")
+
+        self._fill(self.daily_table, [
+            (day.isoformat(), t.mistakes_made, t.reviews_passed, t.reviews_failed, _rate(t), t.lines_completed)
+            for day, t in days
+        ])
+        rows = []
+        for opening in self.openings:
+            t = per_opening.get(opening.db_model.id, StatTotals())
+            mastery = opening.mastery
+            rows.append((opening.name, t.mistakes_made, t.reviews, _rate(t), t.lines_completed,
+                         f"{mastery.percent():.1f}%" if mastery is not None else "-"))
+        self._fill(self.opening_table, rows)
+
+    def _fill(self, table: QtWidgets.QTableWidget, rows):
+        table.setRowCount(len(rows))
+        for r, values in enumerate(rows):
+            for c, value in enumerate(values):
+                item = QtWidgets.QTableWidgetItem(str(value))
+                if c:
+                    item.setTextAlignment(QtCore.Qt.AlignCenter)
+                table.setItem(r, c, item)
@@ -1,22 +1,41 @@
 # D:/gui/main_window.py (最終功能正常版)
 
 import logging
-from datetime import date, datetime
+import os
+from functools import partial
+from datetime import date, datetime, timedelta
 from PyQt5 import QtCore, QtGui, QtWidgets
 import chess
 import chess.pgn
 
-from ..config import BASE_DIR
+from ..config import (
+    BASE_DIR, DATA_DIR, DEFAULT_PROFILE, ENGINE_PATH, LEGACY_PROGRESS_FILE, PROFILE_SWITCH_FLUSH_ATTEMPTS,
+)
+from ..core.board_snapshot import BoardSnapshot, STARTING_BOARD_SNAPSHOT
 from ..core.opening_manager import OpeningManager
 from ..core.training_session import TrainingSession
+from ..core.progress_tracker import ProgressTracker
 from ..core.review_session import ReviewSession
+from ..core.drill_session import DrillSession
 from ..core.game_analyzer import GameAnalyzer
 from ..core.daily_performance_analyzer import DailyPerformanceAnalyzer
+from ..core.opponent_replies import OpponentReplyStats
+from ..core import daily_stats
 from ..database.database import SessionLocal
-from ..database.models import User, Mistake
+from ..database.write_behind import WriteBehindWriter
+from ..database.profiles import (
+    create_profile, delete_profile, list_profiles, profile_engines, save_active_profile, use_profile,
+    validate_file_name,
+)
 from ..services.lichess_api import LichessAPI
+from ..services.engine_pool import DeviationEvaluationThread, EngineEvaluationPool
+from ..services.user_profile import UserProfileService
+from ..services.polyglot_book import export_opening, export_openings, import_book_as_pgn
 from .components.chess_board import ChessBoardWidget
+from .components.account_panel import AccountPanel
 from .dialogs.opening_import_dialog import OpeningImportDialog
+from .dialogs.statistics_view import StatisticsView
+from .dialogs.account_settings import AccountSettingsDialog
 from .tabs.training_tab import TrainingTab
 from .tabs.management_tab import ManagementTab
 from .tabs.settings_tab import SettingsTab
@@ -26,72 +45,148 @@ from .tabs.review_tab import ReviewTab
 logger = logging.getLogger(__name__)
 
 class ChessMainWindow(QtWidgets.QMainWindow):
-    def __init__(self):
+    # 設定寫入完成（由背景寫入執行緒發出，經事件迴圈回到 GUI 執行緒）
+    settings_write_finished = QtCore.pyqtSignal(object)
+
+    def __init__(self, profile_name: str = DEFAULT_PROFILE):
         super().__init__()
         self.setWindowTitle("西洋棋開局訓練器")
         self.setWindowIcon(QtGui.QIcon(str(BASE_DIR / "resources" / "icons" / "app_icon.png")))
         self.resize(1366, 768)
         
         try:
-            # 初始化資料庫連接
-            self.db_session = SessionLocal()
-            
-            # 獲取用戶資料
-            self.current_user = self._get_or_create_user()
+            # 訓練中的寫入交給背景執行緒，不阻塞 GUI；寫入執行緒跨帳號共用
+            self.writer = WriteBehindWriter()
+            self.writer.start()
             
-            # 保存用戶名，避免後續直接訪問 self.current_user 屬性
-            self.username = self.current_user.username
-            self.user_id = self.current_user.id
-            
-            # 確保 current_user 有效
-            if not self.user_id:
-                raise ValueError("無法獲取有效的用戶資料")
-                
-            # 初始化其他管理器
-            self.opening_manager = OpeningManager(user_id=self.user_id)
-            self.game_analyzer = None
-            self.training_session = None
-            self.review_session = None
-            self.daily_analyzer = None
-            self.performance_review_session = None  # 新增：本次分析錯題複習session
+            # SessionLocal 已由 main 綁定到目前帳號的資料庫
+            self.profile_name = profile_name
+            self._open_profile()
             
             # 設置 UI
             self._setup_central_widget()
             self._connect_signals()
             self.load_stylesheet()
-            self.update_all_lists()
-            
-            # 載入設定
-            user_settings = {
-                'username': self.username,
-                'lichess_username': self.current_user.lichess_username,
-                'training_delay_ms': self.current_user.training_delay_ms,
-                'error_display_delay_ms': getattr(self.current_user, 'error_display_delay_ms', 1000)
-            }
-            self.settings_tab.load_settings(user_settings)
+            self._load_profile_views()
         except Exception as e:
             logger.error(f"初始化主視窗時發生錯誤: {e}")
             QtWidgets.QMessageBox.critical(self, "錯誤", f"初始化應用程式失敗: {str(e)}")
 
-    def _get_or_create_user(self):
-        user = self.db_session.query(User).first()
-        if not user:
-            user = User(username="default_user", lichess_username="", training_delay_ms=500)
-            self.db_session.add(user)
-            self.db_session.commit()
-            self.db_session.refresh(user)
-        return user
-    
+    def _open_profile(self):
+        """為目前帳號建立資料庫會話、用戶資料快照與開局庫管理器。"""
+        self.db_session = SessionLocal()
+        # 用戶資料只載入一次，之後由記憶體中的快照提供
+        self.profiles = UserProfileService(writer=self.writer, default_username=self.profile_name)
+        self.user_id = self.profiles.profile.id
+        self.opening_manager = OpeningManager(user_id=self.user_id, writer=self.writer)
+        # 舊版進度檔早於多帳號，只屬於預設帳號
+        legacy_path = LEGACY_PROGRESS_FILE if self.profile_name == DEFAULT_PROFILE else None
+        self.progress = ProgressTracker(self.user_id, writer=self.writer, legacy_path=legacy_path)
+        self.game_analyzer = None
+        self.training_session = None
+        self.drill_session = None
+        self.review_session = None
+        self.daily_analyzer = None
+        self.performance_review_session = None  # 新增：本次分析錯題複習session
+        self.engine_pool = None  # 偏差評估用的本機引擎池（首次使用時建立）
+        self.evaluation_thread = None  # 背景評估偏差的執行緒
+        self.last_analysis_mistakes = []
+
+    def _close_profile(self):
+        """釋放綁定在目前帳號資料庫上的所有資源。"""
+        self._stop_training()
+        self._stop_drill()
+        self.review_session = None
+        self.performance_review_session = None
+        if self.daily_analyzer:
+            self.daily_analyzer.close()
+        self._wait_for_evaluation()
+        if self.engine_pool:
+            self.engine_pool.close()
+        self.opening_manager.close()
+        self.db_session.close()
+
+    def _load_profile_views(self):
+        """把目前帳號的資料載入各頁面。"""
+        self.update_all_lists()
+        self.settings_tab.load_settings(self.profiles.profile.settings())
+        self.account_panel.set_profiles(list_profiles(), self.profile_name)
+        self.chessboard.set_board(STARTING_BOARD_SNAPSHOT)
+        self.chessboard.clear_highlights()
+        self.performance_tab.set_analysis_results({})
+        self.performance_tab.results_text.clear()
+        self.performance_tab.show_review_panel(False)
+        if self.tab_widget.currentWidget() == self.review_tab:
+            self.refresh_statistics()
+
+    def switch_profile(self, name: str):
+        """
+        切換帳號：寫完目前帳號尚未提交的資料、停止所有練習，再把 SessionLocal 綁到新帳號的資料庫。
+        背景寫入的意圖會寫回送出時的帳號；等待逾時時取消切換，避免新帳號讀到尚未寫完的舊資料，
+        或刪除帳號時仍有意圖在佇列中。
+        已開啟過的帳號引擎留在池中，切換時不需重新連線或檢查 schema。
+        """
+        if name == self.profile_name:
+            return
+        if not any(self.writer.flush() for _ in range(PROFILE_SWITCH_FLUSH_ATTEMPTS)):
+            logger.error(f"背景寫入未完成，取消切換到帳號 '{name}'。")
+            QtWidgets.QMessageBox.warning(self, "無法切換帳號", "目前帳號仍有資料正在寫入資料庫，請稍後再試。")
+            self.account_panel.set_profiles(list_profiles(), self.profile_name)
+            return
+        self._close_profile()
+        try:
+            use_profile(name)
+            self.profile_name = name
+            save_active_profile(name)
+            logger.info(f"已切換到帳號: {name}")
+        except Exception as e:
+            logger.error(f"切換帳號 '{name}' 時發生錯誤: {e}")
+            QtWidgets.QMessageBox.critical(self, "錯誤", f"無法開啟帳號 '{name}': {e}")
+            use_profile(self.profile_name)
+        self._open_profile()
+        self._load_profile_views()
+
+    def show_account_settings(self):
+        dialog = AccountSettingsDialog(list_profiles(), self.profile_name, self)
+
+        def on_create(name):
+            try:
+                create_profile(name)
+            except Exception as e:
+                QtWidgets.QMessageBox.warning(dialog, "錯誤", str(e))
+                return
+            dialog.set_profiles(list_profiles(), self.profile_name)
+            self.account_panel.set_profiles(list_profiles(), self.profile_name)
+
+        def on_delete(name):
+            try:
+                delete_profile(name)
+            except Exception as e:
+                logger.error(f"刪除帳號 '{name}' 時發生錯誤: {e}")
+                QtWidgets.QMessageBox.critical(dialog, "錯誤", f"刪除帳號失敗: {e}")
+            dialog.set_profiles(list_profiles(), self.profile_name)
+            self.account_panel.set_profiles(list_profiles(), self.profile_name)
+
+        def on_switch(name):
+            self.switch_profile(name)
+            dialog.set_profiles(list_profiles(), self.profile_name)
+
+        dialog.create_requested.connect(on_create)
+        dialog.delete_requested.connect(on_delete)
+        dialog.switch_requested.connect(on_switch)
+        dialog.exec_()
+
+    def _sync_writes(self):
+        """等待背景寫入完成，並讓本 Session 重新讀取最新資料。"""
+        self.writer.flush()
+        self.db_session.expire_all()
+
     def analyze_daily_performance(self):
         time_range = self.performance_tab.time_combo.currentText()
         try:
-            # 重新從資料庫查詢 user 資料，避免 DetachedInstanceError
-            user = self.db_session.query(User).filter_by(username=self.username).first()
-            if not user:
-                QtWidgets.QMessageBox.critical(self, "錯誤", "無法找到用戶資料，請重新啟動應用。")
-                return
-                
-            lichess_username = user.lichess_username
+            self._sync_writes()
+            profile = self.profiles.profile
+            lichess_username = profile.lichess_username
             if not lichess_username:
                 QtWidgets.QMessageBox.warning(self, "錯誤", "請先在'設定'中填寫 Lichess 用戶名。")
                 return
@@ -99,31 +194,21 @@ class ChessMainWindow(QtWidgets.QMainWindow):
             self.performance_tab.set_status(f"正在從 Lichess 獲取{time_range}對局並分析...")
             QtWidgets.QApplication.processEvents()
             
-            # 使用重新查詢的 user.id 而非 self.current_user.id
-            self.daily_analyzer = DailyPerformanceAnalyzer(lichess_username, user.id, self.db_session, self.opening_manager)
+            self.daily_analyzer = DailyPerformanceAnalyzer(lichess_username, profile.id, self.db_session, self.opening_manager)
             
             # 直接呼叫核心分析主流程
             all_results = self.daily_analyzer.analyze_performance(
                 time_range=time_range
             )
             
-            # 獲取本次分析批次的所有錯題
-            batch_time = self.daily_analyzer.analysis_batch_time
-            if batch_time:
-                self.last_analysis_mistakes = self.db_session.query(Mistake).filter(
-                    Mistake.last_missed_at == batch_time,
-                    Mistake.user_id == user.id
-                ).all()
-                
-                # 更新結果中的錯題數量
-                all_results['mistakes'] = self.last_analysis_mistakes
-            else:
-                self.last_analysis_mistakes = all_results.get("mistakes", [])
+            # 本次分析批次的錯題（analyzer 已透過 batch_mistakes 取出）
+            self.last_analysis_mistakes = all_results.get("mistakes", [])
                 
             # 記錄實際錯題數量
             logger.info(f"分析完成，找到 {len(self.last_analysis_mistakes)} 個錯題")
             
             self.performance_tab.set_analysis_results(all_results)
+            self._evaluate_deviations(all_results)
         except Exception as e:
             logger.error(f"分析{time_range}表現時發生錯誤: {e}")
             self.performance_tab.set_status(f"分析失敗: {str(e)}")
@@ -134,26 +219,60 @@ class ChessMainWindow(QtWidgets.QMainWindow):
                 except Exception as e:
                     logger.error(f"關閉 daily_analyzer 時發生錯誤: {e}")
 
+    def _evaluate_deviations(self, results: dict):
+        """在背景執行緒以本機 UCI 引擎評估偏差損失，完成後更新分析結果；未設定引擎時略過。"""
+        deviation_details = results.get('deviation_details', [])
+        if not ENGINE_PATH or not deviation_details:
+            return
+        try:
+            if self.engine_pool is None:
+                self.engine_pool = EngineEvaluationPool(ENGINE_PATH)
+            self.evaluation_thread = DeviationEvaluationThread(self.engine_pool, deviation_details, self)
+            self.evaluation_thread.evaluated.connect(partial(self._on_deviations_evaluated, results))
+            self.evaluation_thread.finished.connect(self._on_evaluation_finished)
+            # 評估完成前不開始下一次分析，避免兩個執行緒同時使用引擎池
+            self.performance_tab.analyze_button.setEnabled(False)
+            self.performance_tab.analyze_button.setText(f"正在以引擎評估 {len(deviation_details)} 處偏差...")
+            self.evaluation_thread.start()
+        except Exception as e:
+            logger.error(f"引擎評估偏差時發生錯誤: {e}")
+            self._on_evaluation_finished()
+
+    def _on_deviations_evaluated(self, results: dict, deviation_details: list):
+        # 寫回原本的偏差（deviation_by_opening 也引用同一批 dict），在 GUI 執行緒中進行
+        for original, evaluated in zip(results['deviation_details'], deviation_details):
+            original.update(evaluated)
+        self.performance_tab.set_analysis_results(results)
+
+    def _on_evaluation_finished(self):
+        if self.evaluation_thread is not None:
+            self.evaluation_thread.deleteLater()
+            self.evaluation_thread = None
+        self.performance_tab.analyze_button.setEnabled(True)
+        self.performance_tab.analyze_button.setText("分析實戰表現")
+
+    def _wait_for_evaluation(self):
+        """等待背景引擎評估結束（關閉引擎池或切換帳號前）。"""
+        if self.evaluation_thread is not None:
+            self.evaluation_thread.evaluated.disconnect()
+            self.evaluation_thread.wait()
+            self._on_evaluation_finished()
+
     def start_today_review(self):
         """開始複習今日錯題"""
         try:
-            # 重新從資料庫查詢 user 資料，避免 DetachedInstanceError
-            user = self.db_session.query(User).filter_by(username=self.username).first()
-            if not user:
-                QtWidgets.QMessageBox.critical(self, "錯誤", "無法找到用戶資料，請重新啟動應用。")
-                return
-                
+            self._sync_writes()
+            profile = self.profiles.profile
             # 優先用本次分析的錯題
             if hasattr(self, 'last_analysis_mistakes') and self.last_analysis_mistakes:
                 today_mistakes = self.last_analysis_mistakes
             else:
                 if not hasattr(self, 'daily_analyzer') or not self.daily_analyzer:
-                    lichess_username = user.lichess_username
+                    lichess_username = profile.lichess_username
                     if not lichess_username:
                         QtWidgets.QMessageBox.warning(self, "錯誤", "請先設置 Lichess 用戶名。")
                         return
-                    # 使用重新查詢的 user.id
-                    self.daily_analyzer = DailyPerformanceAnalyzer(lichess_username, user.id, self.db_session, self.opening_manager)
+                    self.daily_analyzer = DailyPerformanceAnalyzer(lichess_username, profile.id, self.db_session, self.opening_manager)
                 today_mistakes = self.daily_analyzer.get_today_mistakes()
                 
             if not today_mistakes:
@@ -169,32 +288,25 @@ class ChessMainWindow(QtWidgets.QMainWindow):
 
     def start_review_session(self, mistakes=None):
         """開始複習會話"""
-        self.training_session = None
+        self._stop_training()
         self.tab_widget.setCurrentWidget(self.review_tab)
         
-        # 重新從資料庫查詢 user 物件，避免 DetachedInstanceError
         try:
-            # 直接獲取 user_id，避免使用 self.current_user
-            user = self.db_session.query(User).filter_by(username=self.username).first()
-            if not user:
-                QtWidgets.QMessageBox.critical(self, "錯誤", "無法找到用戶資料，請重新啟動應用。")
-                return
-                
+            self._sync_writes()
+            profile = self.profiles.profile
             # 過濾掉 opening_id 找不到的錯題
             valid_opening_ids = set(op.db_model.id for op in self.opening_manager.openings)
-            filtered_mistakes = None
             if mistakes:
                 filtered_mistakes = [m for m in mistakes if getattr(m, 'opening_id', None) in valid_opening_ids]
+                if not filtered_mistakes:
+                    QtWidgets.QMessageBox.information(self, "提示", "沒有可複習的錯題，請確認開局庫未被刪除。")
+                    return
+                self.review_session = ReviewSession(profile.id, custom_mistakes=filtered_mistakes,
+                                                    san_lookup=self._repertoire_san, writer=self.writer)
             else:
-                # 使用所有錯題，直接使用 user.id
-                all_mistakes = self.db_session.query(Mistake).filter_by(user_id=user.id).order_by(Mistake.miss_count.desc()).all()
-                filtered_mistakes = [m for m in all_mistakes if getattr(m, 'opening_id', None) in valid_opening_ids]
-            if not filtered_mistakes:
-                QtWidgets.QMessageBox.information(self, "提示", "沒有可複習的錯題，請確認開局庫未被刪除。")
-                return
-                
-            # 直接使用 user.id
-            self.review_session = ReviewSession(user.id, custom_mistakes=filtered_mistakes)
+                # 使用今天到期的錯題：由 ReviewSession 以 SQL 過濾開局庫與到期日並分頁讀取
+                self.review_session = ReviewSession(profile.id, opening_ids=valid_opening_ids,
+                                                    san_lookup=self._repertoire_san, writer=self.writer)
             self.review_session.state_changed.connect(self.on_review_state_changed)
             self.review_session.review_finished.connect(self.on_review_finished)
             self.review_session.feedback_provided.connect(self.on_review_feedback)
@@ -214,6 +326,11 @@ class ChessMainWindow(QtWidgets.QMainWindow):
         self.setCentralWidget(splitter)
         self.chessboard = ChessBoardWidget()
         splitter.addWidget(self.chessboard)
+        side_panel = QtWidgets.QWidget()
+        side_layout = QtWidgets.QVBoxLayout(side_panel)
+        side_layout.setContentsMargins(0, 0, 0, 0)
+        self.account_panel = AccountPanel()
+        side_layout.addWidget(self.account_panel)
         self.tab_widget = QtWidgets.QTabWidget()
         self.tab_widget.setMinimumWidth(380)
         self.training_tab = TrainingTab()
@@ -226,22 +343,29 @@ class ChessMainWindow(QtWidgets.QMainWindow):
         self.tab_widget.addTab(self.review_tab, "錯題複習")
         self.tab_widget.addTab(self.management_tab, "開局庫管理")
         self.tab_widget.addTab(self.settings_tab, "設定")
-        splitter.addWidget(self.tab_widget)
+        side_layout.addWidget(self.tab_widget, 1)
+        splitter.addWidget(side_panel)
         splitter.setSizes([int(self.width() * 0.65), int(self.width() * 0.35)])
 
     def _connect_signals(self):
         self.chessboard.moveMade.connect(self.on_user_move)
         self.training_tab.start_training_requested.connect(self.start_new_line)
+        self.training_tab.start_drill_requested.connect(self.start_drill)
         self.training_tab.hint_button.clicked.connect(self.show_hint)
         self.management_tab.add_opening_requested.connect(self.add_new_opening)
         self.management_tab.remove_opening_requested.connect(self.remove_opening)
+        self.management_tab.export_book_requested.connect(self.export_polyglot_book)
         self.settings_tab.settings_saved.connect(self.save_user_settings)
+        self.settings_write_finished.connect(self._on_settings_written)
         self.performance_tab.analyze_requested.connect(self.analyze_daily_performance)
         self.performance_tab.start_review_requested.connect(self.start_today_review)
         self.review_tab.start_review_requested.connect(self.start_review_session)
+        self.review_tab.statistics_panel.details_requested.connect(self.show_statistics)
         self.performance_tab.review_button.clicked.disconnect()
         self.performance_tab.review_button.clicked.connect(self.start_performance_review)
         self.tab_widget.currentChanged.connect(self.on_tab_changed)
+        self.account_panel.profile_selected.connect(self.switch_profile)
+        self.account_panel.manage_requested.connect(self.show_account_settings)
 
     def update_all_lists(self):
         names = self.opening_manager.get_all_opening_names()
@@ -250,13 +374,42 @@ class ChessMainWindow(QtWidgets.QMainWindow):
         self.management_tab.update_opening_list(self.opening_manager.openings)
         
     def add_new_opening(self, name: str, file_path: str, color):
-        if name and file_path:
-            if self.opening_manager.add_opening(name, file_path, color):
-                QtWidgets.QMessageBox.information(self, "成功", f"開局 '{name}' 已匯入。")
-                self.update_all_lists()
-            else:
-                QtWidgets.QMessageBox.critical(self, "錯誤", f"無法匯入 PGN: {file_path}")
-                
+        if not (name and file_path):
+            return
+        imported_path = None
+        if file_path.lower().endswith(".bin"):
+            # Polyglot 開局書先轉成 PGN，存放在 data/openings 下；開局名稱會成為檔名
+            try:
+                name = validate_file_name(name, "開局名稱")
+            except ValueError as e:
+                QtWidgets.QMessageBox.warning(self, "錯誤", str(e))
+                return
+            if self.opening_manager.get_opening_by_name_and_side(name, color):
+                QtWidgets.QMessageBox.critical(self, "錯誤", f"已存在同名且同色的開局庫: {name}")
+                return
+            pgn_path = DATA_DIR / "openings" / f"{name}_{'white' if color else 'black'}.pgn"
+            if pgn_path.exists():
+                # 不覆蓋既有檔案（可能是其他開局庫使用中的 PGN）
+                QtWidgets.QMessageBox.critical(self, "錯誤", f"檔案已存在，請換一個開局名稱: {pgn_path}")
+                return
+            try:
+                import_book_as_pgn(file_path, str(pgn_path))
+            except Exception as e:
+                logger.error(f"匯入 Polyglot 開局書失敗: {e}")
+                QtWidgets.QMessageBox.critical(self, "錯誤", f"無法讀取開局書: {file_path}")
+                return
+            file_path = imported_path = str(pgn_path)
+        if self.opening_manager.add_opening(name, file_path, color):
+            QtWidgets.QMessageBox.information(self, "成功", f"開局 '{name}' 已匯入。")
+            self.update_all_lists()
+        else:
+            if imported_path is not None:
+                try:
+                    os.remove(imported_path)
+                except OSError as e:
+                    logger.warning(f"無法刪除未使用的 PGN {imported_path}: {e}")
+            QtWidgets.QMessageBox.critical(self, "錯誤", f"無法匯入 PGN: {file_path}")
+
     def _parse_name_and_side(self, display_name):
         import re
         m = re.match(r"(.+?)（([白黑])）", display_name)
@@ -268,8 +421,16 @@ class ChessMainWindow(QtWidgets.QMainWindow):
 
     def remove_opening(self, display_name: str):
         name, side = self._parse_name_and_side(display_name)
-        if side is not None and self.opening_manager.get_opening_by_name_and_side(name, side):
+        opening = self.opening_manager.get_opening_by_name_and_side(name, side) if side is not None else None
+        if opening:
+            # 停止仍在使用此開局庫的練習，避免刪除後又寫入它的進度
+            if self.training_session and self.training_session.opening is opening:
+                self._stop_training()
+            if self.drill_session and self.drill_session.opening is opening:
+                self._stop_drill()
+            opening_id = opening.db_model.id
             if self.opening_manager.remove_opening(name, side):
+                self.progress.forget_opening(opening_id)
                 QtWidgets.QMessageBox.information(self, "成功", f"開局 '{display_name}' 已被移除。")
                 self.update_all_lists()
             else:
@@ -277,41 +438,78 @@ class ChessMainWindow(QtWidgets.QMainWindow):
         else:
             QtWidgets.QMessageBox.critical(self, "錯誤", f"找不到對應的開局庫。")
             
-    def save_user_settings(self, settings: dict):
+    def export_polyglot_book(self, display_name: str, path: str, all_same_side: bool):
+        name, side = self._parse_name_and_side(display_name)
+        opening = self.opening_manager.get_opening_by_name_and_side(name, side)
+        if not opening:
+            QtWidgets.QMessageBox.critical(self, "錯誤", "找不到對應的開局庫。")
+            return
         try:
-            # 重新從資料庫查詢 user 資料，避免 DetachedInstanceError
-            user = self.db_session.query(User).filter_by(username=self.username).first()
-            if not user:
-                QtWidgets.QMessageBox.critical(self, "錯誤", "無法找到用戶資料，請重新啟動應用。")
-                return
-                
-            user.lichess_username = settings["lichess_username"]
-            user.training_delay_ms = settings["training_delay_ms"]
-            user.error_display_delay_ms = settings["error_display_delay_ms"]
-            self.db_session.commit()
-            
-            # 更新 self.current_user 引用和本地變數
-            self.current_user = user
-            self.username = user.username
-            self.user_id = user.id
-            
-            QtWidgets.QMessageBox.information(self, "成功", "設定已儲存。")
+            if all_same_side:
+                count = export_openings(self.opening_manager.get_openings_by_side(opening.side), path)
+            else:
+                count = export_opening(opening, path)
+            QtWidgets.QMessageBox.information(self, "成功", f"已匯出 {count} 個開局書條目至 {path}")
         except Exception as e:
-            self.db_session.rollback()
-            QtWidgets.QMessageBox.critical(self, "錯誤", f"儲存設定失敗: {e}")
-            
+            logger.error(f"匯出 Polyglot 開局書時發生錯誤: {e}")
+            QtWidgets.QMessageBox.critical(self, "錯誤", f"匯出失敗: {e}")
+
+    def save_user_settings(self, settings: dict):
+        """設定交給背景寫入，不在 GUI 執行緒等待；提交後由 _on_settings_written 回報結果。"""
+        self.profiles.save_settings(settings).add_done_callback(self.settings_write_finished.emit)
+
+    def _on_settings_written(self, saved):
+        error = saved.exception()
+        if error is not None:
+            logger.error(f"儲存設定失敗: {error}")
+            QtWidgets.QMessageBox.critical(self, "錯誤", f"儲存設定失敗: {error}")
+            return
+        QtWidgets.QMessageBox.information(self, "成功", "設定已儲存。")
+
     def on_tab_changed(self, index):
         current_tab = self.tab_widget.widget(index)
         is_interactive_tab = (current_tab == self.training_tab or current_tab == self.review_tab)
         self.chessboard.allow_user_input = is_interactive_tab
-        if current_tab != self.training_tab: self.training_session = None
+        if current_tab != self.training_tab:
+            self._stop_training()
+            self._stop_drill()
         if current_tab != self.review_tab: self.review_session = None
         if current_tab == self.review_tab:
             self.review_tab.status_label.setText("點擊按鈕開始複習您之前犯錯的局面。")
+            self.refresh_statistics()
+
+    def refresh_statistics(self):
+        """以 daily_stats 彙總表更新錯題複習頁的今日 / 7 天統計。"""
+        try:
+            self._sync_writes()
+            today = date.today()
+            self.review_tab.statistics_panel.update_totals(
+                daily_stats.totals(self.db_session, self.user_id, today),
+                daily_stats.totals(self.db_session, self.user_id, today - timedelta(days=6)),
+            )
+        except Exception as e:
+            logger.error(f"讀取統計資料時發生錯誤: {e}")
+
+    def show_statistics(self):
+        self._sync_writes()
+        StatisticsView(SessionLocal, self.user_id, self.opening_manager.openings, self).exec_()
+
+    def _repertoire_san(self, item, move: chess.Move):
+        """從錯題所屬開局庫的 SAN 表取得正確走法記譜。"""
+        opening = next((op for op in self.opening_manager.openings if op.db_model.id == item.opening_id), None)
+        return opening.move_san(item.position_key, move) if opening else None
+
+    def _record_review(self, session, is_correct: bool):
+        """把一次複習結果累加到當前錯題所屬開局庫的每日統計。"""
+        mistake = session.current if session else None
+        field = "reviews_passed" if is_correct else "reviews_failed"
+        self.writer.record_stat(self.user_id, getattr(mistake, "opening_id", None), field)
             
     def on_user_move(self, move: chess.Move):
         current_tab = self.tab_widget.currentWidget()
-        if self.training_session and current_tab == self.training_tab:
+        if self.drill_session and current_tab == self.training_tab:
+            self.drill_session.handle_user_move(move)
+        elif self.training_session and current_tab == self.training_tab:
             self.training_session.handle_user_move(move)
         elif self.review_session and current_tab == self.review_tab:
             self.review_session.handle_user_move(move)
@@ -320,12 +518,7 @@ class ChessMainWindow(QtWidgets.QMainWindow):
             
     def start_new_line(self, display_name):
         try:
-            # 重新從資料庫查詢 user 資料，避免 DetachedInstanceError
-            user = self.db_session.query(User).filter_by(username=self.username).first()
-            if not user:
-                QtWidgets.QMessageBox.critical(self, "錯誤", "無法找到用戶資料，請重新啟動應用。")
-                return
-                
+            profile = self.profiles.profile
             name, side = self._parse_name_and_side(display_name)
             opening = self.opening_manager.get_opening_by_name_and_side(name, side)
             if not opening: 
@@ -333,13 +526,26 @@ class ChessMainWindow(QtWidgets.QMainWindow):
                 return
                 
             self.review_session = None
-            computer_move_delay = user.training_delay_ms
-            error_display_delay = getattr(user, 'error_display_delay_ms', 1000)
+            self._stop_drill()
+            computer_move_delay = profile.training_delay_ms
+            error_display_delay = profile.error_display_delay_ms
             player_color = opening.side if opening.side is not None else chess.WHITE
-            self.training_session = TrainingSession(opening, player_color, computer_move_delay, error_display_delay)
+            schedule = self.training_tab.schedule_combo.currentData()
+            line_weights = None
+            if schedule == "weighted":
+                # 依實戰中對手應著的頻率為每條路線加權
+                reply_counts = OpponentReplyStats(self.db_session, profile.id).reply_counts(opening.db_model.id)
+                line_weights = opening.line_weights(reply_counts)
+            self._stop_training()
+            self.training_session = TrainingSession(
+                opening, player_color, computer_move_delay, error_display_delay,
+                line_weights=line_weights, progress=self.progress,
+                schedule=schedule,
+            )
             self.training_session.state_changed.connect(self.on_board_update)
             self.training_session.info_updated.connect(self.training_tab.info_label.setText)
             self.training_session.mistake_made.connect(self.on_mistake_made)
+            self.training_session.line_completed.connect(self.on_line_completed)
             self.training_session.progress_changed.connect(self.training_tab.update_progress)
             self.chessboard.set_flipped(player_color == chess.BLACK)
             self.chessboard.allow_user_input = True
@@ -349,49 +555,94 @@ class ChessMainWindow(QtWidgets.QMainWindow):
             logger.error(f"開始新訓練時發生錯誤: {e}")
             QtWidgets.QMessageBox.critical(self, "錯誤", f"開始訓練失敗: {str(e)}")
         
-    def on_board_update(self, event_type: str, board: chess.Board):
+    def start_drill(self, display_name):
+        try:
+            profile = self.profiles.profile
+            name, side = self._parse_name_and_side(display_name)
+            opening = self.opening_manager.get_opening_by_name_and_side(name, side)
+            if not opening:
+                QtWidgets.QMessageBox.warning(self, "錯誤", "找不到對應的開局庫。")
+                return
+
+            self.review_session = None
+            self._stop_training()
+            self._stop_drill()
+            player_color = opening.side if opening.side is not None else chess.WHITE
+            self.drill_session = DrillSession(opening, player_color, self.user_id, writer=self.writer,
+                                              error_display_delay=profile.error_display_delay_ms)
+            self.drill_session.state_changed.connect(self.on_drill_state_changed)
+            self.drill_session.feedback_provided.connect(self.on_drill_feedback)
+            self.drill_session.stats_changed.connect(self.training_tab.update_drill_stats)
+            self.drill_session.drill_finished.connect(self.on_drill_finished)
+            self.chessboard.set_flipped(player_color == chess.BLACK)
+            self.training_tab.info_label.setText("快速練習：請走出開局庫中的下一步。")
+            self.drill_session.start()
+        except Exception as e:
+            logger.error(f"開始快速練習時發生錯誤: {e}")
+            QtWidgets.QMessageBox.critical(self, "錯誤", f"開始快速練習失敗: {str(e)}")
+
+    def _stop_training(self):
+        if self.training_session:
+            self.training_session.stop()
+            self.training_session = None
+
+    def _stop_drill(self):
+        if self.drill_session:
+            self.drill_session.stop()
+            self.drill_session = None
+
+    def on_drill_state_changed(self, board: BoardSnapshot):
+        self.chessboard.set_board(board)
+        self.chessboard.clear_highlights()
+        if board.last_move is not None:
+            self.chessboard.highlight_move(board.last_move, self.chessboard.COLORS["last_move"], self.chessboard.COLORS["last_move"])
+        self.chessboard.allow_user_input = True
+
+    def on_drill_feedback(self, is_correct: bool, correct_moves_san: str):
+        if is_correct or not self.drill_session:
+            return
+        self.chessboard.allow_user_input = False
+        for move in self.drill_session.current.moves:
+            self.chessboard.highlight_move(move, self.chessboard.COLORS["hint_from"], self.chessboard.COLORS["hint_to"])
+        self.training_tab.info_label.setText(f"正確走法: {correct_moves_san}")
+
+    def on_drill_finished(self):
+        self.training_tab.info_label.setText("這個開局庫沒有可練習的局面。")
+        self._stop_drill()
+
+    def on_board_update(self, event_type: str, board: BoardSnapshot):
         if event_type == "board_updated":
             self.chessboard.set_board(board)
             self.chessboard.clear_highlights()
-            if board.move_stack:
-                last_move = board.peek()
+            last_move = board.last_move
+            if last_move is not None:
                 self.chessboard.highlight_move(last_move, self.chessboard.COLORS["last_move"], self.chessboard.COLORS["last_move"])
                 
     def on_mistake_made(self, user_move: chess.Move, expected_move: chess.Move):
         board = self.training_session.board
-        fen = board.fen()
         self.chessboard.clear_highlights()
         self.chessboard.highlight_move(user_move, self.chessboard.COLORS["deviation_from"], self.chessboard.COLORS["deviation_to"])
         self.chessboard.highlight_move(expected_move, self.chessboard.COLORS["hint_from"], self.chessboard.COLORS["hint_to"])
         
-        try:
-            # 直接獲取 user_id，避免使用 self.current_user
-            user = self.db_session.query(User).filter_by(username=self.username).first()
-            if not user:
-                logger.error("無法找到用戶資料，錯誤將不會被記錄。")
-                return
-                
-            existing_mistake = self.db_session.query(Mistake).filter_by(fen=fen, user_id=user.id).first()
-            if existing_mistake:
-                existing_mistake.miss_count += 1
-            else:
-                new_mistake = Mistake(
-                    fen=fen, 
-                    correct_move_uci=expected_move.uci(), 
-                    user_id=user.id, 
-                    opening_id=self.training_session.opening.db_model.id
-                )
-                self.db_session.add(new_mistake)
-            self.db_session.commit()
-        except Exception as e:
-            logger.error(f"記錄錯誤時發生問題: {e}")
-            self.db_session.rollback()
+        # 只放入背景寫入佇列，不在 GUI 執行緒查詢或提交
+        self.writer.record_mistake(
+            self.user_id, self.training_session.opening.db_model.id, board, expected_move.uci()
+        )
+
+    def on_line_completed(self, line_index: int):
+        if self.training_session:
+            opening = self.training_session.opening
+            mastery = opening.mastery
+            if mastery is not None and mastery.mark(line_index):
+                logger.info(f"{opening.name} 已掌握 {mastery.mastered_count()}/{mastery.line_count()} 條路線（{mastery.percent():.1f}%）")
+            self.writer.update_progress(opening.db_model.id, line_index, mastered=True)
+            self.writer.record_stat(self.user_id, opening.db_model.id, "lines_completed")
         
     def show_hint(self):
         if self.training_session and self.tab_widget.currentWidget() == self.training_tab:
             hint_move = self.training_session.get_hint()
             if hint_move:
-                self.training_tab.info_label.setText(f"提示: {hint_move.uci()}")
+                self.training_tab.info_label.setText(f"提示: {self.training_session.get_hint_san()}")
                 self.chessboard.highlight_move(hint_move, self.chessboard.COLORS["hint_from"], self.chessboard.COLORS["hint_to"])
 
     def on_review_state_changed(self, board, remaining, total):
@@ -404,6 +655,7 @@ class ChessMainWindow(QtWidgets.QMainWindow):
         
     def on_review_feedback(self, is_correct, correct_move_san):
         self.chessboard.allow_user_input = False
+        self._record_review(self.review_session, is_correct)
         self.review_tab.show_feedback(is_correct, correct_move_san)
         if not is_correct:
             try:
@@ -415,7 +667,7 @@ class ChessMainWindow(QtWidgets.QMainWindow):
                 logger.warning(f"無法解析 SAN 記譜法 '{correct_move_san}': {e}")
                 try:
                     # 從錯題記錄中獲取 UCI 格式的移動
-                    current_mistake = self.review_session.mistakes_queue[0] if self.review_session.mistakes_queue else None
+                    current_mistake = self.review_session.current
                     if current_mistake:
                         correct_move = chess.Move.from_uci(current_mistake.correct_move_uci)
                         self.chessboard.highlight_move(correct_move, self.chessboard.COLORS["hint_from"], self.chessboard.COLORS["hint_to"])
@@ -428,10 +680,15 @@ class ChessMainWindow(QtWidgets.QMainWindow):
                 self.review_tab.info_label.setText(f"正確移動: {correct_move_san}")
             
     def on_review_finished(self, status: str):
-        message = "恭喜！所有錯題都已複習完畢。" if status == "completed" else "太棒了！資料庫中沒有錯題記錄。"
+        messages = {
+            "completed": "恭喜！本次的錯題都已複習完畢。",
+            "nothing_due": "今天沒有到期的錯題，明天再來吧。",
+        }
+        message = messages.get(status, "太棒了！資料庫中沒有錯題記錄。")
         self.review_tab.status_label.setText(message)
         self.review_tab.info_label.setText("")
         self.review_session = None
+        self.refresh_statistics()
         
     def start_performance_review(self):
         if not hasattr(self, 'last_analysis_mistakes') or not self.last_analysis_mistakes:
@@ -439,18 +696,14 @@ class ChessMainWindow(QtWidgets.QMainWindow):
             return
         
         try:
-            # 重新從資料庫查詢 user 資料，避免 DetachedInstanceError
-            user = self.db_session.query(User).filter_by(username=self.username).first()
-            if not user:
-                QtWidgets.QMessageBox.critical(self, "錯誤", "無法找到用戶資料，請重新啟動應用。")
-                return
-            
+            profile = self.profiles.profile
             # 直接使用所有錯題，不再按開局過濾
             # 記錄實際錯題數量
             logger.info(f"開始複習，錯題數量: {len(self.last_analysis_mistakes)}")
             
             # 確保所有錯題都能被複習
-            self.performance_review_session = ReviewSession(user.id, custom_mistakes=self.last_analysis_mistakes)
+            self.performance_review_session = ReviewSession(profile.id, custom_mistakes=self.last_analysis_mistakes,
+                                                            san_lookup=self._repertoire_san, writer=self.writer)
             self.performance_review_session.state_changed.connect(self.on_performance_review_state_changed)
             self.performance_review_session.review_finished.connect(self.on_performance_review_finished)
             self.performance_review_session.feedback_provided.connect(self.on_performance_review_feedback)
@@ -460,7 +713,7 @@ class ChessMainWindow(QtWidgets.QMainWindow):
             self.performance_review_session.start()
             
             # 記錄日誌
-            logger.info(f"複習會話已啟動，錯題數量: {len(self.performance_review_session.mistakes_queue)}")
+            logger.info(f"複習會話已啟動，錯題數量: {self.performance_review_session.total_count}")
         except Exception as e:
             logger.error(f"啟動表現複習時發生錯誤: {e}")
             QtWidgets.QMessageBox.critical(self, "錯誤", f"啟動複習失敗: {str(e)}")
@@ -481,6 +734,7 @@ class ChessMainWindow(QtWidgets.QMainWindow):
 
     def on_performance_review_feedback(self, is_correct, correct_move_san):
         self.chessboard.allow_user_input = False
+        self._record_review(self.performance_review_session, is_correct)
         if not is_correct:
             try:
                 correct_move = self.performance_review_session.board.parse_san(correct_move_san)
@@ -503,7 +757,7 @@ class ChessMainWindow(QtWidgets.QMainWindow):
         self.performance_review_session = None
 
     def closeEvent(self, event: QtGui.QCloseEvent):
-        if self.daily_analyzer:
-            self.daily_analyzer.close()
-        self.db_session.close()
+        self.writer.close()
+        self._close_profile()
+        profile_engines.close()
         super().closeEvent(event)
\ No newline at end of file
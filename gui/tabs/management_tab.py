@@ -4,6 +4,7 @@ import chess
 class ManagementTab(QtWidgets.QWidget):
     add_opening_requested = QtCore.pyqtSignal(str, str, object)  # name, file_path, color
     remove_opening_requested = QtCore.pyqtSignal(str)
+    export_book_requested = QtCore.pyqtSignal(str, str, bool)  # display_name, file_path, all_same_side
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -19,12 +20,15 @@ class ManagementTab(QtWidgets.QWidget):
         button_layout.setSpacing(10)
         self.add_button = QtWidgets.QPushButton("新增開局庫...")
         self.remove_button = QtWidgets.QPushButton("移除選定項")
+        self.export_button = QtWidgets.QPushButton("匯出 Polyglot...")
         button_layout.addWidget(self.add_button)
         button_layout.addWidget(self.remove_button)
+        button_layout.addWidget(self.export_button)
         self.layout.addLayout(button_layout)
 
         self.add_button.clicked.connect(self._show_add_dialog)
         self.remove_button.clicked.connect(self._on_remove_opening)
+        self.export_button.clicked.connect(self._on_export_book)
 
     def _show_add_dialog(self):
         dialog = QtWidgets.QDialog(self)
@@ -39,12 +43,12 @@ class ManagementTab(QtWidgets.QWidget):
         side_combo.setCurrentIndex(0)  # 預設選白方
         layout.addRow("執棋方:", side_combo)
 
-        file_button = QtWidgets.QPushButton("選擇 PGN 文件...")
+        file_button = QtWidgets.QPushButton("選擇 PGN / Polyglot 文件...")
         file_path = [""]  # 使用列表存儲路徑以便在內部函數中修改
 
         def choose_file():
             path, _ = QtWidgets.QFileDialog.getOpenFileName(
-                dialog, "選擇 PGN 文件", "", "PGN 文件 (*.pgn)"
+                dialog, "選擇開局文件", "", "開局文件 (*.pgn *.bin);;PGN 文件 (*.pgn);;Polyglot 開局書 (*.bin)"
             )
             if path:
                 file_path[0] = path
@@ -88,6 +92,25 @@ class ManagementTab(QtWidgets.QWidget):
             if reply == QtWidgets.QMessageBox.Yes:
                 self.remove_opening_requested.emit(display_name)
 
+    def _on_export_book(self):
+        selected_item = self.list_widget.currentItem()
+        if not selected_item:
+            QtWidgets.QMessageBox.warning(self, "錯誤", "請先選擇要匯出的開局庫")
+            return
+        display_name = selected_item.text()
+        scope, ok = QtWidgets.QInputDialog.getItem(
+            self, "匯出範圍", "匯出內容:", ["僅選定開局庫", "同色所有開局庫"], 0, False
+        )
+        if not ok:
+            return
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "匯出 Polyglot 開局書", "", "Polyglot 開局書 (*.bin)"
+        )
+        if path:
+            if not path.lower().endswith(".bin"):
+                path += ".bin"
+            self.export_book_requested.emit(display_name, path, scope == "同色所有開局庫")
+
     def update_opening_list(self, openings):
         self.list_widget.clear()
         # openings 應為 List[Opening]，顯示名稱+顏色
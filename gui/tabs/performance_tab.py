@@ -106,8 +106,8 @@ class PerformanceTab(QtWidgets.QWidget):
         
         # 偏差詳情表格
         self.deviations_table = QtWidgets.QTableWidget()
-        self.deviations_table.setColumnCount(5)
-        self.deviations_table.setHorizontalHeaderLabels(["對局", "開局", "回合", "您的走法", "正確走法"])
+        self.deviations_table.setColumnCount(6)
+        self.deviations_table.setHorizontalHeaderLabels(["對局", "開局", "回合", "您的走法", "正確走法", "評估損失"])
         self.deviations_table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
         self.deviations_table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.deviations_table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
@@ -123,6 +123,23 @@ class PerformanceTab(QtWidgets.QWidget):
         
         self.layout.addWidget(deviations_group)
 
+        # 常見未覆蓋應著（對手脫譜統計）
+        uncovered_group = QtWidgets.QGroupBox("常見未覆蓋應著")
+        uncovered_layout = QtWidgets.QVBoxLayout(uncovered_group)
+        uncovered_layout.setContentsMargins(
+            SIDE_MARGIN, TOP_MARGIN, SIDE_MARGIN, 12)
+
+        self.uncovered_table = QtWidgets.QTableWidget()
+        self.uncovered_table.setColumnCount(5)
+        self.uncovered_table.setHorizontalHeaderLabels(["開局", "回合", "對手應著", "次數", "佔比"])
+        self.uncovered_table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+        self.uncovered_table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.uncovered_table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.uncovered_table.setAlternatingRowColors(True)
+        uncovered_layout.addWidget(self.uncovered_table)
+
+        self.layout.addWidget(uncovered_group)
+
         # --- 本次分析錯題複習區塊 ---
         self.review_group = QtWidgets.QGroupBox("本次分析錯題複習")
         self.review_group.setVisible(False)
@@ -189,6 +206,7 @@ class PerformanceTab(QtWidgets.QWidget):
             
         # 顯示所有偏差
         self.populate_deviations_table(self.deviation_details)
+        self.populate_uncovered_table(results.get("uncovered_replies", []))
         
         # 根據結果設置按鈕樣式
         if mistakes_count > 0:
@@ -225,8 +243,8 @@ class PerformanceTab(QtWidgets.QWidget):
             move_text = f"{move_number}. {position}"
             
             # 走法信息
-            user_move = deviation.get('user_move', '')
-            correct_moves = deviation.get('correct_moves', [])
+            user_move = deviation.get('user_move_san') or deviation.get('user_move', '')
+            correct_moves = deviation.get('correct_moves_san') or deviation.get('correct_moves', [])
             correct_text = ", ".join(correct_moves) if correct_moves else "無"
             
             # 設置表格單元格
@@ -235,6 +253,7 @@ class PerformanceTab(QtWidgets.QWidget):
             self.deviations_table.setItem(i, 2, QtWidgets.QTableWidgetItem(str(move_number)))
             self.deviations_table.setItem(i, 3, QtWidgets.QTableWidgetItem(user_move))
             self.deviations_table.setItem(i, 4, QtWidgets.QTableWidgetItem(correct_text))
+            self.deviations_table.setItem(i, 5, QtWidgets.QTableWidgetItem(self._format_loss(deviation)))
             
             # 存儲詳細信息的索引
             self.deviations_table.setItem(i, 0, QtWidgets.QTableWidgetItem(game_text))
@@ -242,6 +261,47 @@ class PerformanceTab(QtWidgets.QWidget):
             
         self.deviations_table.resizeColumnsToContents()
         
+    def populate_uncovered_table(self, replies):
+        """填充未覆蓋應著表格（已依次數排序）"""
+        self.uncovered_table.setRowCount(0)
+
+        for i, reply in enumerate(replies):
+            self.uncovered_table.insertRow(i)
+
+            side = "白方" if reply.get('opening_side', 0) == chess.WHITE else "黑方"
+            opening_text = f"{reply.get('opening_name', '未知開局')}（{side}）"
+            move_number = reply.get('move_number', 0)
+            # 以 SAN 顯示並標示走子方，例如 "5... Nf6"
+            epd_fields = reply.get('epd', '').split(' ')
+            dots = "." if len(epd_fields) > 1 and epd_fields[1] == 'w' else "..."
+            reply_text = f"{move_number}{dots} {reply.get('reply_san', reply.get('reply_uci', ''))}"
+            share_text = f"{reply.get('share', 0.0):.0%}"
+
+            self.uncovered_table.setItem(i, 0, QtWidgets.QTableWidgetItem(opening_text))
+            self.uncovered_table.setItem(i, 1, QtWidgets.QTableWidgetItem(str(move_number)))
+            self.uncovered_table.setItem(i, 2, QtWidgets.QTableWidgetItem(reply_text))
+            self.uncovered_table.setItem(i, 3, QtWidgets.QTableWidgetItem(str(reply.get('count', 0))))
+            self.uncovered_table.setItem(i, 4, QtWidgets.QTableWidgetItem(share_text))
+            self.uncovered_table.item(i, 0).setToolTip(reply.get('epd', ''))
+
+        self.uncovered_table.resizeColumnsToContents()
+
+    @staticmethod
+    def _format_eval(cp: int) -> str:
+        """centipawn → 兵值文字；將殺分數顯示為 #。"""
+        if abs(cp) >= 90000:
+            return "#" if cp > 0 else "-#"
+        return f"{cp / 100:+.2f}"
+
+    @staticmethod
+    def _format_loss(deviation: dict) -> str:
+        loss = deviation.get('eval_loss')
+        if loss is None:
+            return "—"
+        if loss >= 90000:
+            return "錯失將殺"
+        return f"{loss / 100:.2f}"
+
     def filter_deviations_by_opening(self):
         """根據選擇的開局過濾偏差"""
         selected_opening = self.opening_combo.currentText()
@@ -280,8 +340,8 @@ class PerformanceTab(QtWidgets.QWidget):
         side = "白方" if deviation.get('opening_side', 0) == chess.WHITE else "黑方"
         
         fen = deviation.get('fen', '')
-        user_move = deviation.get('user_move', '')
-        correct_moves = deviation.get('correct_moves', [])
+        user_move = deviation.get('user_move_san') or deviation.get('user_move', '')
+        correct_moves = deviation.get('correct_moves_san') or deviation.get('correct_moves', [])
         correct_text = ", ".join(correct_moves) if correct_moves else "無"
         
         detail_text = f"對局: {event} ({date})\n"
@@ -291,6 +351,10 @@ class PerformanceTab(QtWidgets.QWidget):
         detail_text += f"您的走法: {user_move}\n"
         detail_text += f"正確走法: {correct_text}\n"
         
+        if 'eval_loss' in deviation:
+            detail_text += (f"引擎評估: 您的走法 {self._format_eval(deviation['user_eval'])}，"
+                            f"開局庫走法 {self._format_eval(deviation['best_eval'])}，"
+                            f"損失 {self._format_loss(deviation)}\n")
         if url:
             detail_text += f"對局連結: {url}\n"
             
@@ -1,6 +1,8 @@
 # chess_opening_trainer/gui/tabs/review_tab.py
 from PyQt5 import QtWidgets, QtCore
 
+from ..components.statistics_panel import StatisticsPanel
+
 class ReviewTab(QtWidgets.QWidget):
     start_review_requested = QtCore.pyqtSignal()
     
@@ -23,6 +25,9 @@ class ReviewTab(QtWidgets.QWidget):
         self.info_label.setWordWrap(True)
         self.info_label.setMinimumHeight(80)
         
+        self.statistics_panel = StatisticsPanel()
+
+        self.layout.addWidget(self.statistics_panel)
         self.layout.addWidget(self.start_button)
         self.layout.addWidget(self.status_label)
         self.layout.addWidget(self.info_label)
@@ -10,6 +10,7 @@ SIDE_MARGIN = 12         # 左右內邊距
 class TrainingTab(QtWidgets.QWidget):
     # Signals
     start_training_requested = QtCore.pyqtSignal(str)
+    start_drill_requested = QtCore.pyqtSignal(str)
     hint_requested = QtCore.pyqtSignal()
 
     def __init__(self, parent=None):
@@ -41,10 +42,30 @@ class TrainingTab(QtWidgets.QWidget):
         training_layout.setSpacing(8)
 
         self.start_training_button = QtWidgets.QPushButton("開始 / 下一條路線")
+        self.drill_button = QtWidgets.QPushButton("快速練習（連續局面）")
+        self.drill_button.setToolTip("連續出題：今天到期的錯題優先，其餘從開局樹中隨機抽出輪到您走棋的局面。")
         self.hint_button = QtWidgets.QPushButton("提示")
         self.hint_button.setEnabled(False)
-
+        # 路線排程（itemData 為 ProgressTracker 的 schedule）
+        self.schedule_combo = QtWidgets.QComboBox()
+        # 只有 tree 模式依深度優先順序合併換序局面（drill_plan 的區間以該順序計算），其餘模式每條路線完整練習
+        no_merge = "\n每條路線都從第一步完整練習，換序到達的相同局面不會合併。"
+        for text, schedule, tip in (
+            ("只練今天到期的路線（間隔重複）", "spaced",
+             "依每條路線的練習結果安排下次複習日期，每輪另加入少量新路線。" + no_merge),
+            ("依開局樹順序（只練分歧後的步數）", "tree",
+             "依開局樹深度優先的順序練習，每條路線從與上一條路線分歧的那一步開始。\n"
+             "換序到達已練過的局面只練一次；只有這個模式會合併換序局面。"),
+            ("依實戰對手頻率安排路線", "weighted",
+             "常見的對手應著會更常被抽到；需先在 '實戰表現' 分析過對局。" + no_merge),
+            ("隨機順序", "shuffle", "每輪把所有路線隨機排列。" + no_merge),
+        ):
+            self.schedule_combo.addItem(text, schedule)
+            self.schedule_combo.setItemData(self.schedule_combo.count() - 1, tip, QtCore.Qt.ToolTipRole)
+
+        training_layout.addWidget(self.schedule_combo)
         training_layout.addWidget(self.start_training_button)
+        training_layout.addWidget(self.drill_button)
         training_layout.addWidget(self.hint_button)
         self.layout.addWidget(training_group)
 
@@ -77,6 +98,7 @@ class TrainingTab(QtWidgets.QWidget):
 
         # ---------- Signals ----------
         self.start_training_button.clicked.connect(self._on_start_training)
+        self.drill_button.clicked.connect(self._on_start_drill)
         self.hint_button.clicked.connect(lambda: self.hint_requested.emit())
 
     # ----- Slots & helpers ----- #
@@ -86,16 +108,31 @@ class TrainingTab(QtWidgets.QWidget):
             self.start_training_requested.emit(opening_name) # 固定使用白方
             self.hint_button.setEnabled(True)
 
+    def _on_start_drill(self):
+        opening_name = self.opening_combo.currentText()
+        if opening_name:
+            self.start_drill_requested.emit(opening_name)
+            self.hint_button.setEnabled(False)
+
     def update_opening_list(self, names):
         self.opening_combo.clear()
         if names:
             self.opening_combo.addItems(names)
             self.start_training_button.setEnabled(True)
+            self.drill_button.setEnabled(True)
         else:
             self.start_training_button.setEnabled(False)
+            self.drill_button.setEnabled(False)
             self.hint_button.setEnabled(False)
             self.info_label.setText("請先到 '開局庫管理' 分頁匯入一個 PGN。")
 
     @QtCore.pyqtSlot(int, int, int, int)
     def update_progress(self, line_idx, line_total, step_idx, step_total):
         self.progress_panel.update_progress(line_idx, line_total, step_idx, step_total)
+
+    @QtCore.pyqtSlot(int, int, float, float)
+    def update_drill_stats(self, answered, correct, per_minute, think_ms):
+        self.info_label.setText(
+            f"快速練習：{correct}/{answered} 正確\n"
+            f"每分鐘 {per_minute:.1f} 個局面，平均思考 {think_ms / 1000:.1f} 秒"
+        )
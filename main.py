@@ -8,8 +8,8 @@ from PyQt5 import QtWidgets
 
 # 使用絕對導入，從專案根目錄開始
 from chess_opening_trainer.config import LOG_LEVEL, LOG_FORMAT
-from chess_opening_trainer.database.database import init_db
-from chess_opening_trainer.database.migrations.add_side_column import migrate
+from chess_opening_trainer.database.migrations.runner import get_schema_version
+from chess_opening_trainer.database.profiles import load_active_profile, use_profile
 from chess_opening_trainer.gui.main_window import ChessMainWindow
 
 def setup_logging():
@@ -22,24 +22,19 @@ def main():
     # 1. 初始化日誌
     setup_logging()
     
-    # 2. 初始化資料庫 (如果不存在，則建立)
-    logging.info("正在初始化資料庫...")
-    init_db()
-    logging.info("資料庫初始化完成。")
-    
-    # 3. 執行資料庫遷移
-    logging.info("正在執行資料庫遷移...")
-    migrate()
-    logging.info("資料庫遷移完成。")
+    # 2. 開啟上次使用的帳號資料庫並遷移（schema 已是最新時只讀取 PRAGMA user_version）
+    profile_name = load_active_profile()
+    schema_version = get_schema_version(use_profile(profile_name))
+    logging.info(f"帳號 '{profile_name}' 資料庫 schema 版本: v{schema_version}")
 
-    # 4. 啟動 Qt 應用程式
+    # 3. 啟動 Qt 應用程式
     app = QtWidgets.QApplication(sys.argv)
     
-    # 5. 創建並顯示主視窗
-    window = ChessMainWindow()
+    # 4. 創建並顯示主視窗
+    window = ChessMainWindow(profile_name)
     window.show()
     
-    # 6. 進入事件循環
+    # 5. 進入事件循環
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
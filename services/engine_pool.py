@@ -0,0 +1,204 @@
+# chess_opening_trainer/services/engine_pool.py
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import chess
+import chess.engine
+from PyQt5.QtCore import QThread, pyqtSignal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..config import ENGINE_DEPTH, ENGINE_POOL_SIZE
+from ..core.position_key import position_key, position_epd
+from ..database.database import SessionLocal
+from ..database.models import EngineEvaluation
+
+logger = logging.getLogger(__name__)
+
+MATE_SCORE = 100000
+
+# (position_key, depth, move_uci)
+EvalKey = Tuple[int, int, str]
+
+
+class EngineEvaluationPool:
+    """
+    以多個本機 UCI 引擎行程平行評估偏差局面。
+
+    * 引擎行程依需要啟動，最多 ENGINE_POOL_SIZE（預設為 CPU 核心數）個，
+      每個行程設為單執行緒，平行度由行程數決定。
+    * 每個候選走法以 root_moves 限定搜尋，分數以走子方視角儲存。
+    * 結果快取於 engine_evaluations 表，鍵為 (position_key, depth, move_uci)，
+      同一局面在不同對局或回合數下只評估一次。
+    * 每次 evaluate_deviations 自行建立 Session，可在 GUI 以外的執行緒呼叫（見 DeviationEvaluationThread）。
+    """
+
+    def __init__(self, engine_path: str, session_factory=SessionLocal,
+                 size: Optional[int] = None, depth: int = ENGINE_DEPTH):
+        self.engine_path = engine_path
+        self._session_factory = session_factory
+        self.size = max(1, size or ENGINE_POOL_SIZE)
+        self.depth = depth
+        self._idle: "queue.Queue[chess.engine.SimpleEngine]" = queue.Queue()
+        self._engines: List[chess.engine.SimpleEngine] = []
+        self._available = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # ---------- 引擎行程 ---------- #
+    def _acquire(self) -> chess.engine.SimpleEngine:
+        with self._available:
+            while self._idle.empty() and len(self._engines) >= self.size:
+                self._available.wait()
+            if not self._idle.empty():
+                return self._idle.get_nowait()
+            engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
+            if "Threads" in engine.options:
+                engine.configure({"Threads": 1})
+            self._engines.append(engine)
+            logger.info(f"已啟動引擎行程 {len(self._engines)}/{self.size}: {self.engine_path}")
+            return engine
+
+    def _release(self, engine: chess.engine.SimpleEngine):
+        with self._available:
+            self._idle.put(engine)
+            self._available.notify()
+
+    def _discard(self, engine: chess.engine.SimpleEngine):
+        """移除已終止的引擎行程，空出的名額可由下一個工作重新啟動。"""
+        with self._available:
+            if engine in self._engines:
+                self._engines.remove(engine)
+            self._available.notify()
+        try:
+            engine.close()
+        except Exception as e:
+            logger.warning(f"關閉已終止的引擎行程時發生錯誤: {e}")
+
+    def _evaluate_move(self, fen: str, move_uci: str) -> Tuple[int, Optional[int]]:
+        """在工作執行緒中評估 fen 局面下走 move_uci 的分數（走子方視角）。"""
+        board = chess.Board(fen)
+        move = chess.Move.from_uci(move_uci)
+        engine = self._acquire()
+        try:
+            info = engine.analyse(board, chess.engine.Limit(depth=self.depth), root_moves=[move])
+        except chess.engine.EngineTerminatedError:
+            logger.warning(f"引擎行程已終止，移出引擎池: {self.engine_path}")
+            self._discard(engine)
+            raise
+        except Exception:
+            self._release(engine)
+            raise
+        self._release(engine)
+        score = info["score"].pov(board.turn)
+        return score.score(mate_score=MATE_SCORE), score.mate()
+
+    # ---------- 快取 ---------- #
+    def _load_cached(self, session: Session, keys: List[EvalKey]) -> Dict[EvalKey, Tuple[int, Optional[int]]]:
+        if not keys:
+            return {}
+        rows = session.query(EngineEvaluation).filter(
+            EngineEvaluation.position_key.in_({k[0] for k in keys}),
+            EngineEvaluation.depth == self.depth,
+        ).all()
+        return {(r.position_key, r.depth, r.move_uci): (r.score_cp, r.mate) for r in rows}
+
+    def _store(self, session: Session, results: Dict[EvalKey, Tuple[int, Optional[int]]], epds: Dict[int, str]):
+        if not results:
+            return
+        rows = [
+            {'position_key': pkey, 'depth': depth, 'move_uci': move_uci,
+             'epd': epds[pkey], 'score_cp': cp, 'mate': mate}
+            for (pkey, depth, move_uci), (cp, mate) in results.items()
+        ]
+        try:
+            session.execute(
+                sqlite_insert(EngineEvaluation.__table__).on_conflict_do_nothing(), rows
+            )
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"寫入引擎評估快取時發生錯誤: {e}")
+
+    # ---------- 主要流程 ---------- #
+    def evaluate_deviations(self, deviation_details: List[Dict]) -> int:
+        """
+        為每筆偏差補上 'user_eval'、'best_eval'、'eval_loss'（皆為 centipawn，用戶視角）。
+        回傳實際交給引擎評估的走法數（快取命中不計）。
+        """
+        tasks: Dict[EvalKey, str] = {}  # key -> fen
+        epds: Dict[int, str] = {}
+        per_detail = []
+        for detail in deviation_details:
+            board = chess.Board(detail['fen'])
+            pkey = position_key(board)
+            epds[pkey] = position_epd(board)
+            moves = [detail['user_move']] + list(detail.get('correct_moves', []))
+            keys = [(pkey, self.depth, uci) for uci in moves]
+            for key in keys:
+                tasks.setdefault(key, detail['fen'])
+            per_detail.append(keys)
+
+        with self._session_factory() as session:
+            results = self._load_cached(session, list(tasks))
+        missing = [key for key in tasks if key not in results]
+        if missing:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="engine")
+            futures = {key: self._executor.submit(self._evaluate_move, tasks[key], key[2]) for key in missing}
+            fresh = {}
+            for key, future in futures.items():
+                try:
+                    fresh[key] = future.result()
+                except Exception as e:
+                    logger.error(f"引擎評估失敗 {key[2]} @ {epds[key[0]]}: {e}")
+            with self._session_factory() as session:
+                self._store(session, fresh, epds)
+            results.update(fresh)
+
+        for detail, keys in zip(deviation_details, per_detail):
+            user_result = results.get(keys[0])
+            best = [results[k] for k in keys[1:] if k in results]
+            if user_result is None or not best:
+                continue
+            best_cp = max(cp for cp, _ in best)
+            detail['user_eval'] = user_result[0]
+            detail['best_eval'] = best_cp
+            detail['eval_loss'] = max(0, best_cp - user_result[0])
+        logger.info(f"引擎評估完成：{len(tasks)} 個走法，快取命中 {len(tasks) - len(missing)} 個。")
+        return len(missing)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for engine in self._engines:
+            try:
+                engine.quit()
+            except Exception as e:
+                logger.warning(f"關閉引擎行程時發生錯誤: {e}")
+        self._engines = []
+        self._idle = queue.Queue()
+
+
+class DeviationEvaluationThread(QThread):
+    """
+    在背景執行緒以 EngineEvaluationPool 評估偏差，GUI 不會在分析期間停止回應。
+    評估的是偏差的複本；完成後以 evaluated 訊號送回補上評估欄位的偏差串列。
+    """
+
+    evaluated = pyqtSignal(list)
+
+    def __init__(self, pool: EngineEvaluationPool, deviation_details: List[Dict], parent=None):
+        super().__init__(parent)
+        self.pool = pool
+        self.details = [dict(detail) for detail in deviation_details]
+
+    def run(self):
+        try:
+            self.pool.evaluate_deviations(self.details)
+        except Exception as e:
+            logger.error(f"引擎評估偏差時發生錯誤: {e}")
+        self.evaluated.emit(self.details)
@@ -0,0 +1,160 @@
+# chess_opening_trainer/services/polyglot_book.py
+import logging
+import os
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+from ..config import BOOK_IMPORT_MAX_NODES
+from ..core.opening_manager import Opening
+
+logger = logging.getLogger(__name__)
+
+# Polyglot 條目：key(u64) move(u16) weight(u16) learn(u32)，大端序共 16 bytes
+ENTRY_STRUCT = struct.Struct(">QHHI")
+MAX_WEIGHT = 0xFFFF
+
+
+def encode_move(board: chess.Board, move: chess.Move) -> int:
+    """依 Polyglot 規格編碼走法；王車易位以「王走到車的格子」表示。"""
+    to_square = move.to_square
+    if board.is_castling(move):
+        rook_file = 7 if chess.square_file(move.to_square) > chess.square_file(move.from_square) else 0
+        to_square = chess.square(rook_file, chess.square_rank(move.from_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return (chess.square_file(to_square)
+            | chess.square_rank(to_square) << 3
+            | chess.square_file(move.from_square) << 6
+            | chess.square_rank(move.from_square) << 9
+            | promotion << 12)
+
+
+def _collect_entries(opening: Opening, entries: Dict[Tuple[int, int], int]):
+    """走訪開局樹，把每個 (局面, 走法) 出現次數累加到 entries。換序局面自然合併。"""
+    if not opening.root_node:
+        return
+    board = opening.root_node.board()
+
+    def recurse(node: chess.pgn.GameNode):
+        if not node.variations:
+            return
+        key = chess.polyglot.zobrist_hash(board)
+        for variation in node.variations:
+            raw = encode_move(board, variation.move)
+            entries[(key, raw)] = entries.get((key, raw), 0) + 1
+            board.push(variation.move)
+            recurse(variation)
+            board.pop()
+    recurse(opening.root_node)
+
+
+def export_openings(openings: Iterable[Opening], path: str) -> int:
+    """
+    把一個或多個開局庫匯出為 Polyglot .bin 開局書，回傳條目數。
+    條目依 key 排序（同 key 內權重由高到低），權重為該走法在開局樹中出現的次數。
+    """
+    entries: Dict[Tuple[int, int], int] = {}
+    for opening in openings:
+        _collect_entries(opening, entries)
+    ordered = sorted(entries.items(), key=lambda item: (item[0][0], -item[1]))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        for (key, raw), weight in ordered:
+            f.write(ENTRY_STRUCT.pack(key, raw, min(weight, MAX_WEIGHT), 0))
+    os.replace(tmp_path, path)
+    logger.info(f"已匯出 Polyglot 開局書 {path}，共 {len(ordered)} 個條目。")
+    return len(ordered)
+
+
+def export_opening(opening: Opening, path: str) -> int:
+    return export_openings([opening], path)
+
+
+class PolyglotBook:
+    """
+    唯讀的 Polyglot 開局書。
+    以 mmap 開啟檔案並對排序好的條目做二分搜尋，不把整本書載入成 Python 物件，
+    開啟成本與檔案大小無關，適合對局分析這類只需查詢的用途。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reader = chess.polyglot.open_reader(path)
+
+    def __enter__(self) -> "PolyglotBook":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._reader)
+
+    def __contains__(self, board: chess.Board) -> bool:
+        return self._reader.get(board) is not None
+
+    def weighted_moves(self, board: chess.Board) -> List[Tuple[chess.Move, int]]:
+        """此局面在開局書中的所有走法與權重（權重由高到低）。"""
+        return [(entry.move, entry.weight) for entry in self._reader.find_all(board)]
+
+    def moves(self, board: chess.Board) -> List[chess.Move]:
+        """此局面在開局書中的所有走法。"""
+        return [entry.move for entry in self._reader.find_all(board)]
+
+    def close(self):
+        self._reader.close()
+
+
+def book_to_game(path: str, board: Optional[chess.Board] = None,
+                 max_nodes: int = BOOK_IMPORT_MAX_NODES) -> chess.pgn.Game:
+    """
+    把 Polyglot 開局書還原為 PGN 變化樹（匯入用）。
+    換序到達的局面在每條路線都展開，PGN 路線不會在換序處中斷；
+    同一路線上重複出現的局面（循環）不再展開。節點數超過 max_nodes 時停止展開並記錄警告。
+    """
+    board = board.copy() if board else chess.Board()
+    game = chess.pgn.Game()
+    if board.fen() != chess.STARTING_FEN:
+        game.setup(board)
+    nodes = 0
+    with PolyglotBook(path) as book:
+        # (節點, 局面, 路線上已出現的局面 key)
+        stack = [(game, board, frozenset())]
+        while stack:
+            node, node_board, path_keys = stack.pop()
+            key = chess.polyglot.zobrist_hash(node_board)
+            if key in path_keys:
+                continue
+            path_keys = path_keys | {key}
+            for move in book.moves(node_board):
+                if nodes >= max_nodes:
+                    logger.warning(f"開局書 {path} 展開超過 {max_nodes} 個走法，其餘路線已截斷。")
+                    return game
+                child = node.add_variation(move)
+                nodes += 1
+                child_board = node_board.copy(stack=False)
+                child_board.push(move)
+                stack.append((child, child_board, path_keys))
+    return game
+
+
+def import_book_as_pgn(book_path: str, pgn_path: str) -> int:
+    """把 Polyglot 開局書轉成 PGN 檔，回傳寫入的走法節點數。"""
+    game = book_to_game(book_path)
+    game.headers["Event"] = os.path.splitext(os.path.basename(book_path))[0]
+    with open(pgn_path, "w", encoding="utf-8") as f:
+        print(game, file=f, end="\n\n")
+    count = sum(1 for _ in _iter_nodes(game)) - 1
+    logger.info(f"已將開局書 {book_path} 轉為 PGN {pgn_path}，共 {count} 個走法。")
+    return count
+
+
+def _iter_nodes(node: chess.pgn.GameNode):
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(current.variations)
@@ -0,0 +1,106 @@
+# chess_opening_trainer/services/user_profile.py
+import dataclasses
+import logging
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Optional
+
+from ..database.database import SessionLocal
+from ..database.models import User
+
+logger = logging.getLogger(__name__)
+
+# 可由設定頁修改的欄位
+SETTINGS_FIELDS = ("lichess_username", "training_delay_ms", "error_display_delay_ms")
+
+
+@dataclass(frozen=True)
+class UserProfile:
+    """用戶資料的唯讀快照，與任何 Session 無關，不會有 DetachedInstanceError。"""
+    id: int
+    username: str
+    lichess_username: str
+    training_delay_ms: int
+    error_display_delay_ms: int
+
+    def settings(self) -> dict:
+        return {"username": self.username, **{name: getattr(self, name) for name in SETTINGS_FIELDS}}
+
+
+class UserProfileService:
+    """
+    啟動時載入一次用戶資料，之後所有讀取都由記憶體中的快照提供。
+    快照只在 save_settings 成功寫入後更換；寫入交給背景寫入執行緒（未提供時直接提交）。
+    每個帳號資料庫只有一位用戶，以用戶名稱（= 帳號名稱）經唯一索引讀取。
+    """
+
+    def __init__(self, session_factory=SessionLocal, writer=None, default_username: str = "default_user"):
+        self._session_factory = session_factory
+        self._writer = writer
+        self._default_username = default_username
+        self._profile: Optional[UserProfile] = None
+
+    @property
+    def profile(self) -> UserProfile:
+        if self._profile is None:
+            self._profile = self._load()
+        return self._profile
+
+    def _load(self) -> UserProfile:
+        session = self._session_factory()
+        try:
+            user = session.query(User).filter(User.username == self._default_username).one_or_none()
+            if not user:
+                # 多帳號之前建立的資料庫，唯一的用戶名稱與帳號名稱不同（例如 default_user）
+                user = session.query(User).order_by(User.id).first()
+            if not user:
+                user = User(username=self._default_username, lichess_username="", training_delay_ms=500)
+                session.add(user)
+                session.commit()
+                logger.info("已建立預設用戶。")
+            return UserProfile(
+                id=user.id,
+                username=user.username,
+                lichess_username=user.lichess_username or "",
+                training_delay_ms=user.training_delay_ms if user.training_delay_ms is not None else 500,
+                error_display_delay_ms=user.error_display_delay_ms if user.error_display_delay_ms is not None else 1000,
+            )
+        finally:
+            session.close()
+
+    def save_settings(self, settings: dict) -> Future:
+        """
+        更新設定，回傳在寫入提交後完成的 Future，結果為新快照；快照在寫入成功後才換上。
+        寫入失敗時 Future 帶有例外（例如 lichess 帳號與其他用戶重複），快照維持不變。
+        不會等待背景寫入，呼叫端只在需要結果時才等待或掛上 callback。
+        """
+        values = {name: settings[name] for name in SETTINGS_FIELDS if name in settings}
+        profile = dataclasses.replace(self.profile, **values)
+        saved = Future()
+
+        def finish(error: Optional[BaseException]):
+            if error is not None:
+                saved.set_exception(error)
+                return
+            self._profile = profile
+            saved.set_result(profile)
+
+        if self._writer is not None:
+            self._writer.save_user_settings(profile.id, values).add_done_callback(
+                lambda result: finish(result.exception()))
+            return saved
+        session = self._session_factory()
+        try:
+            session.query(User).filter(User.id == profile.id).update(values, synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            finish(e)
+            return saved
+        finally:
+            session.close()
+        finish(None)
+        return saved
+
+    def invalidate(self):
+        """捨棄快照，下次讀取時重新從資料庫載入。"""
+        self._profile = None
@@ -0,0 +1,79 @@
+# chess_opening_trainer/tests/conftest.py
+import io
+import sys
+
+import chess.pgn
+import pytest
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QTimer
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ..core.opening_manager import Opening
+from ..core.repertoire_store import compile_store
+from ..database.database import Base
+from ..database import models  # noqa: F401  註冊模型
+from ..database.models import Opening as OpeningModel
+
+
+@pytest.fixture
+def memory_session_factory():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def pgn_lines():
+    """PGN 樹（文字或 GameNode）以 Opening._extract_all_lines 展開的所有路線，每條為 UCI 串列。"""
+    def lines(pgn) -> list:
+        opening = Opening.__new__(Opening)
+        opening.root_node = chess.pgn.read_game(io.StringIO(pgn)) if isinstance(pgn, str) else pgn
+        opening._extract_all_lines()
+        return [[move.uci() for move in line] for line in opening.all_lines]
+    return lines
+
+
+@pytest.fixture
+def compile_pgn(tmp_path):
+    """把 PGN 文字編譯成 .rep 檔，回傳檔案路徑。"""
+    def compile_(pgn_text: str, name: str = "repertoire") -> str:
+        path = tmp_path / f"{name}.rep"
+        compile_store(chess.pgn.read_game(io.StringIO(pgn_text)), str(path))
+        return str(path)
+    return compile_
+
+
+@pytest.fixture
+def make_opening(compile_pgn):
+    """由 PGN 文字建立以 .rep 載入的 Opening（未寫入資料庫）。"""
+    openings = []
+
+    def make(pgn_text: str, side: chess.Color = chess.WHITE, opening_id: int = 1) -> Opening:
+        path = compile_pgn(pgn_text, name=f"opening{opening_id}")
+        opening = Opening(OpeningModel(id=opening_id, name=f"opening{opening_id}", pgn_path=path,
+                                       user_id=1, side=int(side)))
+        openings.append(opening)
+        return opening
+    yield make
+    for opening in openings:
+        opening.close()
+
+
+@pytest.fixture
+def qt_app():
+    return QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+
+
+@pytest.fixture
+def run_event_loop(qt_app, monkeypatch):
+    """執行事件迴圈 ms 毫秒，回傳期間槽函式拋出的例外（PyQt 預設遇到未處理例外會中止行程）。"""
+    errors = []
+    monkeypatch.setattr(sys, "excepthook", lambda *exc_info: errors.append(exc_info[1]))
+
+    def run(ms: int = 50) -> list:
+        loop = QEventLoop()
+        QTimer.singleShot(ms, loop.quit)
+        loop.exec_()
+        return errors
+    return run
@@ -0,0 +1,43 @@
+# chess_opening_trainer/tests/stub_engine.py
+"""
+測試用的腳本化 UCI 引擎：python stub_engine.py <分數 JSON> <紀錄檔>
+
+分數 JSON 為 {走法 UCI: 走子方視角的 centipawn}，未列出的走法為 0；值為 "exit" 時模擬引擎當掉。
+每次搜尋會把「行程 ID 走法」附加到紀錄檔，供測試確認平行度與快取命中。
+"""
+import json
+import os
+import sys
+import time
+
+
+def main():
+    scores = json.loads(sys.argv[1])
+    log_path = sys.argv[2]
+    for line in sys.stdin:
+        tokens = line.split()
+        if not tokens:
+            continue
+        command = tokens[0]
+        if command == "uci":
+            print("id name StubEngine")
+            print("option name Threads type spin default 1 min 1 max 64")
+            print("uciok")
+        elif command == "isready":
+            print("readyok")
+        elif command == "go":
+            move = tokens[tokens.index("searchmoves") + 1]
+            with open(log_path, "a", encoding="utf-8") as log:
+                log.write(f"{os.getpid()} {move}\n")
+            if scores.get(move) == "exit":
+                sys.exit(1)
+            time.sleep(0.2)  # 讓其他工作執行緒有機會啟動自己的引擎行程
+            print(f"info depth 1 score cp {scores.get(move, 0)} pv {move}")
+            print(f"bestmove {move}")
+        elif command == "quit":
+            break
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# chess_opening_trainer/tests/test_daily_performance_analyzer.py
+import datetime
+import io
+import time
+
+import chess
+import chess.pgn
+from sqlalchemy import text
+
+from ..core.daily_performance_analyzer import DailyPerformanceAnalyzer
+
+
+class _Openings:
+    def __init__(self, openings):
+        self.openings = openings
+
+    def get_openings_by_side(self, side):
+        return [op for op in self.openings if op.side == side]
+
+
+def _game(moves: str, utc_date: str, site: str) -> chess.pgn.Game:
+    return chess.pgn.read_game(io.StringIO(
+        f'[Site "{site}"]\n[White "alice"]\n[Black "bob"]\n'
+        f'[UTCDate "{utc_date}"]\n[UTCTime "12:00:00"]\n\n{moves} *'
+    ))
+
+
+def _local_day(utc_date: str) -> datetime.date:
+    played = datetime.datetime.strptime(f"{utc_date} 12:00:00", "%Y.%m.%d %H:%M:%S")
+    return played.replace(tzinfo=datetime.timezone.utc).astimezone().date()
+
+
+def test_deviations_are_counted_on_the_day_the_game_was_played(memory_session_factory, make_opening):
+    opening = make_opening("1. e4 e5 2. Nf3 Nc6 3. Bb5 *", side=chess.WHITE)
+    session = memory_session_factory()
+    try:
+        analyzer = DailyPerformanceAnalyzer("alice", 1, session, _Openings([opening]))
+        analyzer.analysis_batch_time = datetime.datetime.utcnow()
+        for moves, utc_date, site in [
+            ("1. d4 d5", "2024.03.01", "g1"),
+            ("1. e4 e5 2. Bc4", "2024.03.01", "g2"),
+            ("1. e4 e5 2. Nf3 Nc6 3. Bc4", "2024.03.04", "g3"),
+        ]:
+            assert analyzer.analyze_performance_for_game(_game(moves, utc_date, site))['deviation_count'] == 1
+        analyzer._write_batch("最近7天", 3, 3)
+
+        rows = session.execute(text(
+            "SELECT day, mistakes_made FROM daily_stats ORDER BY day"
+        )).fetchall()
+        assert [tuple(row) for row in rows] == [
+            (str(_local_day("2024.03.01")), 2),
+            (str(_local_day("2024.03.04")), 1),
+        ]
+        assert session.execute(text("SELECT sum(miss_count) FROM mistakes")).scalar() == 3
+    finally:
+        session.close()
+
+
+def test_game_day_falls_back_to_date_header():
+    assert DailyPerformanceAnalyzer._game_day({"Date": "2024.02.29"}) == datetime.date(2024, 2, 29)
+    assert DailyPerformanceAnalyzer._game_day({"Date": "????.??.??"}) == datetime.date.today()
+
+
+def test_today_mistakes_start_at_local_midnight(memory_session_factory, monkeypatch):
+    monkeypatch.setenv("TZ", "Asia/Taipei")
+    time.tzset()
+    try:
+        local_midnight = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        utc_midnight = local_midnight.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        session = memory_session_factory()
+        try:
+            # 本地今天 00:30 與昨天 23:30 各一次分析（以 UTC 保存）
+            for batch_id, started_at in ((1, utc_midnight + datetime.timedelta(minutes=30)),
+                                         (2, utc_midnight - datetime.timedelta(minutes=30))):
+                session.execute(text(
+                    "INSERT INTO analysis_batches (id, user_id, started_at) VALUES (:id, 1, :at)"
+                ), {"id": batch_id, "at": started_at})
+                session.execute(text(
+                    "INSERT INTO mistakes (id, position_key, epd, correct_move_uci, user_id) "
+                    "VALUES (:id, :id, 'epd', 'e2e4', 1)"
+                ), {"id": batch_id})
+                session.execute(text(
+                    "INSERT INTO batch_mistakes (batch_id, mistake_id, deviation_count) VALUES (:id, :id, 1)"
+                ), {"id": batch_id})
+            session.commit()
+            analyzer = DailyPerformanceAnalyzer("alice", 1, session, _Openings([]))
+            assert [mistake.id for mistake in analyzer.get_today_mistakes()] == [1]
+        finally:
+            session.close()
+    finally:
+        monkeypatch.undo()
+        time.tzset()
@@ -0,0 +1,40 @@
+# chess_opening_trainer/tests/test_drill_session.py
+import chess
+
+from ..core.drill_session import DrillSession
+
+REPERTOIRE = "1. e4 e5 2. Nf3 (2. Bc4 Nf6 3. d3) 2... Nc6 3. Bb5 *"
+
+
+def _session(opening, session_factory):
+    return DrillSession(opening, chess.WHITE, user_id=1, error_display_delay=0, queue_size=4,
+                        session_factory=session_factory)
+
+
+def test_stop_cancels_pending_timers(make_opening, memory_session_factory, run_event_loop):
+    opening = make_opening(REPERTOIRE)
+    session = _session(opening, memory_session_factory)
+    shown = []
+    session.state_changed.connect(shown.append)
+    session.start()
+    assert len(shown) == 1
+    session.handle_user_move(chess.Move.from_uci("a2a3"))  # 答錯，排程延遲後切換局面
+
+    session.stop()
+    opening.close()  # 移除開局庫、切換帳號或關閉視窗時會接著釋放開局樹
+    assert run_event_loop() == []
+    assert len(shown) == 1
+
+    session.handle_user_move(chess.Move.from_uci("e2e4"))
+    assert session.answered == 1
+
+
+def test_wrong_answer_advances_after_delay(make_opening, memory_session_factory, run_event_loop):
+    session = _session(make_opening(REPERTOIRE), memory_session_factory)
+    shown = []
+    session.state_changed.connect(shown.append)
+    session.start()
+    session.handle_user_move(chess.Move.from_uci("a2a3"))
+    assert run_event_loop() == []
+    assert len(shown) == 2
+    session.stop()
@@ -0,0 +1,117 @@
+# chess_opening_trainer/tests/test_engine_pool.py
+import json
+import os
+import sys
+
+import chess
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from ..database.database import Base, create_sqlite_engine
+from ..database import models  # noqa: F401  註冊模型
+from ..database.models import EngineEvaluation
+from ..services.engine_pool import DeviationEvaluationThread, EngineEvaluationPool
+
+STUB_ENGINE = os.path.join(os.path.dirname(__file__), "stub_engine.py")
+
+# 1. e4 之後輪到黑方
+FEN_AFTER_E4 = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+# 1. d4 之後輪到黑方
+FEN_AFTER_D4 = "rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq - 0 1"
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # 檔案資料庫：評估執行緒與測試執行緒各自連線時看到同一份資料
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'evals.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def _make_pool(tmp_path, session_factory, scores, size=2):
+    log_path = tmp_path / "searches.log"
+    log_path.touch()
+    command = [sys.executable, STUB_ENGINE, json.dumps(scores), str(log_path)]
+    return EngineEvaluationPool(command, session_factory, size=size, depth=8), log_path
+
+
+def _searches(log_path):
+    return [line.split() for line in log_path.read_text(encoding="utf-8").splitlines()]
+
+
+def _deviations():
+    return [
+        {'fen': FEN_AFTER_E4, 'user_move': "c7c5", 'correct_moves': ["e7e5", "c7c6"]},
+        {'fen': FEN_AFTER_D4, 'user_move': "d7d5", 'correct_moves': ["g8f6"]},
+    ]
+
+
+def test_evaluates_deviations_in_parallel(tmp_path, session_factory):
+    pool, log_path = _make_pool(tmp_path, session_factory, {"e7e5": 30, "c7c6": 10, "c7c5": -20, "g8f6": 15, "d7d5": 25})
+    details = _deviations()
+    try:
+        assert pool.evaluate_deviations(details) == 5
+    finally:
+        pool.close()
+
+    assert (details[0]['user_eval'], details[0]['best_eval'], details[0]['eval_loss']) == (-20, 30, 50)
+    # 用戶走法比開局庫更好時損失記為 0
+    assert details[1]['eval_loss'] == 0
+    searches = _searches(log_path)
+    assert sorted(move for _, move in searches) == ["c7c5", "c7c6", "d7d5", "e7e5", "g8f6"]
+    assert len({pid for pid, _ in searches}) == 2
+    with session_factory() as session:
+        assert session.query(EngineEvaluation).count() == 5
+
+
+def test_cached_evaluations_skip_engine(tmp_path, session_factory):
+    scores = {"e7e5": 30, "c7c6": 10, "c7c5": -20, "g8f6": 15, "d7d5": 25}
+    pool, log_path = _make_pool(tmp_path, session_factory, scores)
+    try:
+        pool.evaluate_deviations(_deviations())
+        searched = len(_searches(log_path))
+
+        # 同一局面換一個偏差走法：只有新走法需要引擎
+        details = _deviations() + [{'fen': FEN_AFTER_E4, 'user_move': "g8f6", 'correct_moves': ["e7e5"]}]
+        assert pool.evaluate_deviations(details) == 1
+    finally:
+        pool.close()
+
+    assert [move for _, move in _searches(log_path)[searched:]] == ["g8f6"]
+    assert details[0]['eval_loss'] == 50
+    assert details[2]['eval_loss'] == 15
+
+
+def test_terminated_engine_is_dropped(tmp_path, session_factory):
+    pool, log_path = _make_pool(tmp_path, session_factory, {"c7c5": "exit", "e7e5": 30}, size=1)
+    try:
+        crashed = [{'fen': FEN_AFTER_E4, 'user_move': "c7c5", 'correct_moves': ["e7e5"]}]
+        assert pool.evaluate_deviations(crashed) == 2
+        assert 'eval_loss' not in crashed[0]
+        assert len(pool._engines) <= 1
+
+        # 當掉的行程不會回到閒置佇列，之後的評估由新啟動的行程完成
+        details = [{'fen': FEN_AFTER_D4, 'user_move': "d7d5", 'correct_moves': ["g8f6"]}]
+        assert pool.evaluate_deviations(details) == 2
+        assert details[0]['eval_loss'] == 0
+    finally:
+        pool.close()
+
+
+def test_evaluation_thread_delivers_results_by_signal(tmp_path, session_factory, run_event_loop):
+    pool, _ = _make_pool(tmp_path, session_factory, {"e7e5": 30, "c7c6": 10, "c7c5": -20})
+    details = _deviations()[:1]
+    received = []
+    thread = DeviationEvaluationThread(pool, details)
+    thread.evaluated.connect(received.append)
+    try:
+        thread.start()
+        assert thread.wait(10000)
+        run_event_loop(0)
+    finally:
+        pool.close()
+
+    assert received and received[0][0]['eval_loss'] == 50
+    # 評估的是複本，原本的偏差只在 GUI 執行緒收到訊號後更新
+    assert 'eval_loss' not in details[0]
@@ -0,0 +1,61 @@
+# chess_opening_trainer/tests/test_mastery.py
+import chess
+import pytest
+
+from ..core.mastery import MasteryIndex
+from ..core.repertoire_store import RepertoireStore
+
+# 路線 0：1. d4 Nf6 2. c4 e6 3. Nc3 Bb4
+# 路線 1：1. c4 Nf6 2. d4 e6 3. Nc3 Bb4（第 2 步後換序到路線 0）
+# 路線 2：1. c4 Nf6 2. Nf3 g6
+# 黑方在路線 1 的走法都出現在路線 0 或 2；白方的 2. d4（1. c4 Nf6 之後）只出現在路線 1
+TRANSPOSING = "1. d4 (1. c4 Nf6 2. d4 (2. Nf3 g6) 2... e6 3. Nc3 Bb4) 1... Nf6 2. c4 e6 3. Nc3 Bb4 *"
+
+
+@pytest.fixture
+def store(compile_pgn):
+    store = RepertoireStore(compile_pgn(TRANSPOSING))
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize("order", [(0, 2), (2, 0)])
+def test_mark_credits_transposed_line_for_side(store, order):
+    mastery = MasteryIndex(store, side=chess.BLACK)
+    assert mastery.mark(order[0])
+    assert not mastery.is_mastered(1)
+    assert mastery.mark(order[1])
+    assert mastery.is_mastered(1)
+    assert mastery.mastered_count() == 3
+    assert mastery.percent() == 100.0
+    # 換序得到的掌握度也計入路線 1 的祖先
+    c4 = store.children(0)[1]
+    assert list(store.leaf_range(c4)) == [1, 2]
+    assert mastery.mastered_count(c4) == 2
+
+
+def test_mark_does_not_credit_when_side_moves_differ(store):
+    mastery = MasteryIndex(store, side=chess.WHITE)
+    mastery.mark(0)
+    mastery.mark(2)
+    assert not mastery.is_mastered(1)
+    assert mastery.mastered_count() == 2
+
+
+def test_mark_without_side_does_not_credit(store):
+    mastery = MasteryIndex(store)
+    mastery.mark(0)
+    mastery.mark(2)
+    assert not mastery.is_mastered(1)
+
+
+@pytest.mark.parametrize("side, credited", [(chess.BLACK, True), (chess.WHITE, False)])
+def test_loading_blob_credits_transposed_line_for_side(store, side, credited):
+    saved = MasteryIndex(store)
+    saved.mark(0)
+    saved.mark(2)
+    blob = saved.to_blob()
+
+    mastery = MasteryIndex.from_blob(store, blob, side)
+    assert mastery.is_mastered(1) is credited
+    assert mastery.mastered_count() == (3 if credited else 2)
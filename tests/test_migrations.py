@@ -0,0 +1,167 @@
+# chess_opening_trainer/tests/test_migrations.py
+import datetime
+import os
+import shutil
+import time
+
+import pytest
+from sqlalchemy import inspect, text
+
+from ..core.mastery import LineBitset
+from ..database.database import create_sqlite_engine
+from ..database.migrations.runner import LATEST_VERSION, MIGRATIONS, get_schema_version, migrate_to_latest
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "trainer_data.db")
+
+
+def _schema(engine):
+    """{資料表: (欄位名稱集合, 索引名稱集合)}，不含 SQLite 內部表。索引取自 sqlite_master（含運算式索引）。"""
+    inspector = inspect(engine)
+    with engine.connect() as conn:
+        indexes = conn.execute(text(
+            "SELECT tbl_name, name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        )).fetchall()
+    return {
+        table: ({c["name"] for c in inspector.get_columns(table)},
+                {name for tbl_name, name in indexes if tbl_name == table})
+        for table in inspector.get_table_names() if not table.startswith("sqlite_")
+    }
+
+
+@pytest.fixture
+def shipped_db(tmp_path):
+    path = tmp_path / "trainer_data.db"
+    shutil.copyfile(SHIPPED_DB, path)
+    engine = create_sqlite_engine(f"sqlite:///{path}")
+    yield engine
+    engine.dispose()
+
+
+def test_shipped_database_is_v0(shipped_db):
+    assert get_schema_version(shipped_db) == 0
+
+
+def test_upgrade_v0_to_latest_matches_fresh_schema(shipped_db, tmp_path):
+    with shipped_db.connect() as conn:
+        mistakes_before = conn.execute(text("SELECT count(*) FROM mistakes")).scalar()
+
+    assert migrate_to_latest(shipped_db) == LATEST_VERSION
+    assert get_schema_version(shipped_db) == LATEST_VERSION
+
+    fresh = create_sqlite_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    try:
+        migrate_to_latest(fresh)
+        assert _schema(shipped_db) == _schema(fresh)
+    finally:
+        fresh.dispose()
+
+    with shipped_db.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT ease, interval_days, repetitions, due_on FROM mistakes"
+        )).fetchall()
+    # v4 依局面合併重複錯題，筆數只會減少；排程欄位都有預設值且已到期
+    assert 0 < len(rows) <= mistakes_before
+    assert all(ease == 2.5 and interval == 0 and reps == 0 and due_on is not None
+               for ease, interval, reps, due_on in rows)
+
+
+def test_v4_creates_v4_mistakes_schema(shipped_db):
+    """v4 重建錯題表時使用固定的 DDL，不受之後 Mistake 模型的欄位影響。"""
+    with shipped_db.begin() as conn:
+        for target, _, upgrade in MIGRATIONS:
+            if target <= 4:
+                upgrade(conn)
+    columns, indexes = _schema(shipped_db)["mistakes"]
+    assert columns == {"id", "position_key", "epd", "correct_move_uci", "user_id", "opening_id",
+                       "miss_count", "last_missed_at"}
+    assert indexes == {"ux_mistakes_user_key_opening", "ix_mistakes_user_missed_at"}
+
+
+def test_v6_converts_mastered_lines_text_to_bitset(shipped_db):
+    with shipped_db.begin() as conn:
+        for target, _, upgrade in MIGRATIONS:
+            if target <= 5:
+                upgrade(conn)
+        conn.execute(text("DELETE FROM openings"))
+        conn.execute(text(
+            "INSERT INTO openings (id, name, pgn_path, mastered_lines) VALUES "
+            "(1, 'a', 'a.pgn', '0, 3,9,3'), (2, 'b', 'b.pgn', '')"
+        ))
+        for target, _, upgrade in MIGRATIONS:
+            if target == 6:
+                upgrade(conn)
+        rows = dict(conn.execute(text("SELECT id, mastered_lines FROM openings")).fetchall())
+    # 第 i 條路線 = 第 i // 8 個 byte 的第 i % 8 個位元
+    assert rows == {1: bytes([0b00001001, 0b00000010]), 2: None}
+    assert list(LineBitset.from_bytes(rows[1])) == [0, 3, 9]
+
+
+@pytest.fixture
+def taipei_time(monkeypatch):
+    """本地時區設為 UTC+8，UTC 晚上的時間在本地已是隔天。"""
+    monkeypatch.setenv("TZ", "Asia/Taipei")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_v7_and_v10_use_the_python_local_date(shipped_db, taipei_time):
+    with shipped_db.begin() as conn:
+        for target, _, upgrade in MIGRATIONS:
+            if target <= 6:
+                upgrade(conn)
+        conn.execute(text("DELETE FROM mistakes"))
+        conn.execute(text("""
+            INSERT INTO mistakes (id, position_key, epd, correct_move_uci, user_id, opening_id, miss_count, last_missed_at)
+            VALUES (1, 1, 'epd', 'e2e4', 1, NULL, 2, '2024-03-01 20:00:00.000000'),
+                   (2, 2, 'epd', 'd2d4', 1, NULL, 1, '2024-03-01 10:00:00')
+        """))
+        for target, _, upgrade in MIGRATIONS:
+            if 7 <= target <= 10:
+                upgrade(conn)
+        stats = conn.execute(text("SELECT day, mistakes_made FROM daily_stats ORDER BY day")).fetchall()
+        due = conn.execute(text("SELECT id, due_on FROM mistakes ORDER BY id")).fetchall()
+    expected = datetime.datetime(2024, 3, 1, 20, tzinfo=datetime.timezone.utc).astimezone().date()
+    assert expected == datetime.date(2024, 3, 2)
+    assert [tuple(row) for row in stats] == [("2024-03-01", 1), ("2024-03-02", 2)]
+    assert [tuple(row) for row in due] == [(1, "2024-03-02"), (2, "2024-03-01")]
+
+
+def test_v11_merges_mistakes_without_opening(shipped_db):
+    with shipped_db.begin() as conn:
+        for target, _, upgrade in MIGRATIONS:
+            if target <= 10:
+                upgrade(conn)
+        conn.execute(text("DELETE FROM batch_mistakes"))
+        conn.execute(text("DELETE FROM mistakes"))
+        # v10 的唯一索引允許同一局面有多筆 opening_id 為 NULL 的錯題
+        conn.execute(text("""
+            INSERT INTO mistakes (id, position_key, epd, correct_move_uci, user_id, opening_id, miss_count,
+                                  last_missed_at, due_on)
+            VALUES (1, 42, 'epd', 'e2e4', 1, NULL, 1, '2024-01-01 00:00:00', '2024-01-05'),
+                   (2, 42, 'epd', 'e2e4', 1, NULL, 2, '2024-01-03 00:00:00', '2024-01-02'),
+                   (3, 42, 'epd', 'e2e4', 1, NULL, 1, '2024-01-02 00:00:00', '2024-01-04'),
+                   (4, 42, 'epd', 'e2e4', 1, 7, 1, '2024-01-01 00:00:00', '2024-01-01')
+        """))
+        conn.execute(text("INSERT INTO analysis_batches (id, user_id, started_at) VALUES (9, 1, '2024-01-03 00:00:00')"))
+        conn.execute(text("INSERT INTO batch_mistakes (batch_id, mistake_id, deviation_count) VALUES (9, 1, 1), (9, 2, 2)"))
+        MIGRATIONS[10][2](conn)
+
+    with shipped_db.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT id, opening_id, miss_count, last_missed_at, due_on FROM mistakes ORDER BY id"
+        )).fetchall()
+        links = conn.execute(text("SELECT batch_id, mistake_id, deviation_count FROM batch_mistakes")).fetchall()
+    assert [tuple(row) for row in rows] == [(1, None, 4, '2024-01-03 00:00:00', '2024-01-02'),
+                                            (4, 7, 1, '2024-01-01 00:00:00', '2024-01-01')]
+    assert [tuple(link) for link in links] == [(9, 1, 3)]
+
+
+def test_migrate_is_noop_at_latest(shipped_db):
+    migrate_to_latest(shipped_db)
+    with shipped_db.connect() as conn:
+        tables = conn.execute(text("SELECT count(*) FROM sqlite_master")).scalar()
+    assert migrate_to_latest(shipped_db) == LATEST_VERSION
+    with shipped_db.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM sqlite_master")).scalar() == tables
@@ -0,0 +1,22 @@
+# chess_opening_trainer/tests/test_mistakes.py
+import chess
+from sqlalchemy import text
+
+from ..core.mistakes import mistake_upsert
+
+
+def _rows(session_factory):
+    with session_factory() as session:
+        return session.execute(text(
+            "SELECT opening_id, miss_count FROM mistakes ORDER BY opening_id"
+        )).fetchall()
+
+
+def test_upsert_merges_mistakes_without_opening(memory_session_factory):
+    board = chess.Board()
+    board.push_san("e4")
+    with memory_session_factory() as session:
+        for opening_id in (None, None, None, 3, 3):
+            session.execute(mistake_upsert(1, opening_id, board, "e7e5"))
+        session.commit()
+    assert [tuple(row) for row in _rows(memory_session_factory)] == [(None, 3), (3, 2)]
@@ -0,0 +1,75 @@
+# chess_opening_trainer/tests/test_opening_manager.py
+import datetime
+
+import pytest
+from sqlalchemy import text
+
+from ..core import opening_manager
+from ..core.mastery import LineBitset
+from ..core.opening_manager import OpeningManager
+
+TODAY = datetime.date(2024, 3, 10)
+
+
+@pytest.fixture
+def manager_factory(memory_session_factory, tmp_path, monkeypatch):
+    monkeypatch.setattr(opening_manager, "SessionLocal", memory_session_factory)
+    monkeypatch.setattr(opening_manager, "COMPILED_OPENINGS_DIR", tmp_path)
+    managers = []
+
+    def make() -> OpeningManager:
+        manager = OpeningManager(user_id=1)
+        managers.append(manager)
+        return manager
+    yield make
+    for manager in managers:
+        manager.close()
+
+
+def _rows(session_factory, sql):
+    with session_factory() as session:
+        return [tuple(row) for row in session.execute(text(sql)).fetchall()]
+
+
+def test_line_data_follows_lines_after_pgn_edit(manager_factory, memory_session_factory, tmp_path):
+    pgn_path = tmp_path / "repertoire.pgn"
+    # 路線 0：1. e4 e5 2. Nf3；路線 1：1. e4 c5 2. Nf3
+    pgn_path.write_text("1. e4 e5 (1... c5 2. Nf3) 2. Nf3 *", encoding="utf-8")
+    with memory_session_factory() as session:
+        session.execute(text("INSERT INTO users (id, username) VALUES (1, 'default')"))
+        session.execute(text(
+            "INSERT INTO openings (id, name, pgn_path, user_id, side) VALUES (1, 'e4', :path, 1, 1)"
+        ), {"path": str(pgn_path)})
+        session.commit()
+    manager = manager_factory()
+    assert len(manager.openings[0].all_lines) == 2
+    manager.close()
+
+    with memory_session_factory() as session:
+        session.execute(text("UPDATE openings SET mastered_lines = :bits, last_trained_line_index = 1"),
+                        {"bits": bytes([0b10])})
+        session.execute(text(
+            "INSERT INTO line_reviews (user_id, opening_id, line_index, ease, interval_days, repetitions, due_on)"
+            " VALUES (1, 1, 0, 2.5, 1, 1, :day), (1, 1, 1, 2.6, 6, 2, :day)"
+        ), {"day": TODAY})
+        session.execute(text(
+            "INSERT INTO training_progress (user_id, opening_id, current_line_ptr, ply_index, schedule,"
+            " num_lines, current_line) VALUES (1, 1, 1, 2, 'tree', 2, 0)"
+        ))
+        session.commit()
+
+    # 刪除 1... e5、在 1... c5 前插入兩條變化：原本的路線 1 變成路線 2
+    pgn_path.write_text("1. e4 e6 (1... d5 2. exd5) (1... c5 2. Nf3) 2. d4 *", encoding="utf-8")
+    manager = manager_factory()
+    opening = manager.openings[0]
+    assert [move.uci() for move in opening.all_lines[2]] == ["e2e4", "c7c5", "g1f3"]
+    assert list(opening.mastery.bitset) == [2]
+    assert _rows(memory_session_factory, "SELECT last_trained_line_index FROM openings") == [(2,)]
+    assert _rows(memory_session_factory, "SELECT line_index, ease, interval_days FROM line_reviews") == [(2, 2.6, 6)]
+    assert _rows(memory_session_factory, "SELECT count(*) FROM training_progress") == [(0,)]
+    manager.close()
+
+    # 開局樹沒有變動時不再對應
+    manager = manager_factory()
+    assert list(LineBitset.from_bytes(manager.openings[0].db_model.mastered_lines)) == [2]
+    assert _rows(memory_session_factory, "SELECT line_index FROM line_reviews") == [(2,)]
@@ -0,0 +1,36 @@
+# chess_opening_trainer/tests/test_polyglot_book.py
+import chess.pgn
+
+from ..services.polyglot_book import book_to_game, export_opening, import_book_as_pgn
+
+# 1. d4 Nf6 2. c4 與 1. c4 Nf6 2. d4 換序到達同一局面，之後的應著分別只寫在其中一條路線
+TRANSPOSING = "1. d4 (1. c4 Nf6 2. d4 e6 3. Nc3) 1... Nf6 2. c4 (2. Nf3 d5) 2... g6 *"
+
+
+def _count_nodes(node: chess.pgn.GameNode) -> int:
+    return sum(1 + _count_nodes(child) for child in node.variations)
+
+
+def test_book_round_trip_keeps_transposed_continuations(make_opening, pgn_lines, tmp_path):
+    book = str(tmp_path / "book.bin")
+    assert export_opening(make_opening(TRANSPOSING), book) == 11
+    pgn_path = str(tmp_path / "book.pgn")
+    import_book_as_pgn(book, pgn_path)
+    with open(pgn_path, encoding="utf-8") as f:
+        lines = pgn_lines(chess.pgn.read_game(f))
+
+    # 換序後的局面在兩條路線都展開，兩邊的應著合併
+    assert sorted(lines) == sorted([
+        ["d2d4", "g8f6", "c2c4", "g7g6"],
+        ["d2d4", "g8f6", "c2c4", "e7e6", "b1c3"],
+        ["d2d4", "g8f6", "g1f3", "d7d5"],
+        ["c2c4", "g8f6", "d2d4", "g7g6"],
+        ["c2c4", "g8f6", "d2d4", "e7e6", "b1c3"],
+    ])
+
+
+def test_book_to_game_stops_at_node_limit(make_opening, tmp_path):
+    book = str(tmp_path / "book.bin")
+    export_opening(make_opening(TRANSPOSING), book)
+    assert _count_nodes(book_to_game(book)) == 14
+    assert _count_nodes(book_to_game(book, max_nodes=5)) == 5
@@ -0,0 +1,95 @@
+# chess_opening_trainer/tests/test_progress_tracker.py
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ..core.progress_tracker import ProgressTracker
+from ..database.database import Base
+from ..database import models  # noqa: F401  註冊模型
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_training_mistakes_survive_reload(session_factory):
+    tracker = ProgressTracker(1, session_factory=session_factory)
+    tracker.ensure_opening(7, 5, schedule="tree")
+    tracker.advance_ply()
+    tracker.record_mistake(0, 1, "e7e5")
+    tracker.record_mistake(0, 1, "e7e5")  # 重複的錯誤只記一次
+    tracker.advance_ply()
+
+    reloaded = ProgressTracker(1, session_factory=session_factory)
+    reloaded.ensure_opening(7, 5, schedule="tree")
+    assert reloaded.data.ply_index == 2
+    assert reloaded.data.mistakes == {(0, 1): "e7e5"}
+
+
+def test_new_round_clears_training_mistakes(session_factory):
+    tracker = ProgressTracker(1, session_factory=session_factory)
+    tracker.ensure_opening(7, 5, schedule="tree")
+    tracker.record_mistake(0, 0, "e2e4")
+    tracker.init_opening(7, 5, schedule="tree")
+
+    reloaded = ProgressTracker(1, session_factory=session_factory)
+    reloaded.ensure_opening(7, 5, schedule="tree")
+    assert reloaded.data.mistakes == {}
+
+
+def test_forget_opening_drops_cached_progress(session_factory):
+    tracker = ProgressTracker(1, session_factory=session_factory)
+    tracker.ensure_opening(7, 5, schedule="weighted", line_weights=[1.0] * 5)
+    tracker.next_line_index()
+    tracker.forget_opening(7)
+    assert tracker.data is None
+    assert 7 not in tracker._loaded and 7 not in tracker._next_draws
+
+
+def _write_legacy(tmp_path, opening_id="7"):
+    path = tmp_path / "progress.json"
+    path.write_text(json.dumps({
+        "generation": 2, "opening_id": opening_id, "line_order": [3, 0, 4, 1, 2],
+        "current_line_ptr": 1, "ply_index": 0, "mistakes": [{"line_ptr": 0, "ply": 2, "move": "g1f3"}],
+        "schedule": "shuffle", "num_lines": 5, "current_line": 0,
+    }), encoding="utf-8")
+    # 舊世代的日誌紀錄不重播
+    (tmp_path / "progress.journal").write_text("\n".join(json.dumps(record) for record in [
+        {"g": 1, "op": "line"},
+        {"g": 2, "op": "ply"},
+        {"g": 2, "op": "mistake", "line_ptr": 1, "ply": 1, "move": "e7e5"},
+        {"g": 2, "op": "ply"},
+    ]) + "\n", encoding="utf-8")
+    return path
+
+
+def test_legacy_progress_is_imported_once(session_factory, tmp_path):
+    path = _write_legacy(tmp_path)
+    tracker = ProgressTracker(1, session_factory=session_factory, legacy_path=path)
+    tracker.ensure_opening(7, 5)
+    assert list(tracker.data.line_order) == [3, 0, 4, 1, 2]
+    assert (tracker.data.current_line_ptr, tracker.data.ply_index) == (1, 2)
+    assert tracker.data.mistakes == {(0, 2): "g1f3", (1, 1): "e7e5"}
+    assert not path.exists() and not (tmp_path / "progress.journal").exists()
+    assert (tmp_path / "progress.json.imported").exists()
+    assert (tmp_path / "progress.journal.imported").exists()
+
+    reloaded = ProgressTracker(1, session_factory=session_factory, legacy_path=path)
+    reloaded.ensure_opening(7, 5)
+    assert list(reloaded.data.line_order) == [3, 0, 4, 1, 2]
+    assert reloaded.data.ply_index == 2
+    assert reloaded.data.mistakes == {(0, 2): "g1f3", (1, 1): "e7e5"}
+
+
+def test_legacy_progress_of_other_opening_is_kept(session_factory, tmp_path):
+    path = _write_legacy(tmp_path, opening_id="8")
+    tracker = ProgressTracker(1, session_factory=session_factory, legacy_path=path)
+    tracker.ensure_opening(7, 5, schedule="tree")
+    assert tracker.data.current_line_ptr == 0 and tracker.data.mistakes == {}
+    assert path.exists()
@@ -0,0 +1,124 @@
+# chess_opening_trainer/tests/test_repertoire_store.py
+import os
+import struct
+
+import chess
+
+from ..core import opening_manager
+from ..core.opening_manager import Opening
+from ..core.position_key import position_key
+from ..core.repertoire_store import (FORMAT_VERSION, HEADER_STRUCT, NO_DRILL, RepertoireStore,
+                                     is_up_to_date, read_header)
+from ..database.models import Opening as OpeningModel
+
+# 含多層變化；1. d4 Nf6 2. c4 e6 與 1. c4 Nf6 2. d4 e6 換序到達同一局面
+REPERTOIRE = ("1. d4 (1. c4 Nf6 2. d4 e6 3. Nc3 (3. Nf3 b6)) 1... Nf6 2. c4 e6 (2... g6 3. Nc3 Bg7) "
+              "3. Nf3 (3. g3 d5) 3... b6 *")
+
+# 黑方在第 1、5 ply 分支，白方在第 2 ply 分支；路線 2 在 3... Nc6 後換序到路線 0
+# 0: 1. e4 e5 2. Nf3 Nc6 3. Nc3 Nf6 4. Bb5
+# 1: 1. e4 e5 2. Nf3 Nc6 3. Nc3 Bc5
+# 2: 1. e4 e5 2. Nc3 Nf6 3. Nf3 Nc6 4. Bb5
+# 3: 1. e4 c5 2. Nf3
+DRILL_TREE = "1. e4 e5 (1... c5 2. Nf3) 2. Nf3 (2. Nc3 Nf6 3. Nf3 Nc6 4. Bb5) 2... Nc6 3. Nc3 Nf6 (3... Bc5) 4. Bb5 *"
+
+
+def _uci(line) -> list:
+    return [move.uci() for move in line]
+
+
+def test_compiled_lines_match_pgn_lines(compile_pgn, pgn_lines):
+    expected = pgn_lines(REPERTOIRE)
+    store = RepertoireStore(compile_pgn(REPERTOIRE))
+    try:
+        assert store.leaf_count == len(expected) == 5
+        assert [_uci(line) for line in store.lines] == expected
+        # 任意順序存取（快取的上一條路線不影響結果）
+        for line_id in reversed(range(len(expected))):
+            assert _uci(store.lines[line_id]) == expected[line_id]
+        assert _uci(store.lines[-1]) == expected[-1]
+        assert [store.line_sans(line_id)[:2] for line_id in (0, 4)] == [["d4", "Nf6"], ["c4", "Nf6"]]
+    finally:
+        store.close()
+
+
+def test_find_returns_every_transposed_node(compile_pgn):
+    store = RepertoireStore(compile_pgn(REPERTOIRE))
+    try:
+        board = chess.Board()
+        for san in ("d4", "Nf6", "c4", "e6"):
+            board.push_san(san)
+        nodes = store.find(position_key(board))
+        assert len(nodes) == 2
+        assert sorted(_uci(store.path_moves(idx)) for idx in nodes) == [
+            ["c2c4", "g8f6", "d2d4", "e7e6"],
+            ["d2d4", "g8f6", "c2c4", "e7e6"],
+        ]
+        assert all(store.board_at(idx).fen() == board.fen() for idx in nodes)
+        assert store.find(position_key(chess.Board("8/8/8/8/8/8/8/K6k w - - 0 1"))) == []
+    finally:
+        store.close()
+
+
+def test_leaf_range_covers_exactly_the_lines_through_node(compile_pgn):
+    store = RepertoireStore(compile_pgn(REPERTOIRE))
+    try:
+        assert store.leaf_range(0) == range(store.leaf_count)
+        paths = [store.path_nodes(store.leaf(line_id)) for line_id in range(store.leaf_count)]
+        for idx in range(1, store.node_count):
+            through = [line_id for line_id, path in enumerate(paths) if idx in path]
+            assert list(store.leaf_range(idx)) == through
+    finally:
+        store.close()
+
+
+def test_format_version_mismatch_forces_recompile(tmp_path, monkeypatch):
+    monkeypatch.setattr(opening_manager, "COMPILED_OPENINGS_DIR", tmp_path)
+    pgn_path = tmp_path / "repertoire.pgn"
+    pgn_path.write_text(REPERTOIRE, encoding="utf-8")
+    model = OpeningModel(id=1, name="repertoire", pgn_path=str(pgn_path), user_id=1, side=1)
+
+    opening = Opening(model)
+    store_path = opening.compiled_path
+    opening.close()
+    assert is_up_to_date(store_path, str(pgn_path))
+
+    # 把檔頭中的版本改成舊版
+    with open(store_path, "r+b") as f:
+        f.seek(8)
+        f.write(struct.pack("<I", FORMAT_VERSION - 1))
+    assert read_header(store_path) is None
+    assert not is_up_to_date(store_path, str(pgn_path))
+
+    opening = Opening(model)
+    try:
+        assert opening.store is not None and len(opening.all_lines) == 5
+        header = read_header(store_path)
+        assert header is not None and header[1] == FORMAT_VERSION
+        assert header[4] == os.stat(pgn_path).st_mtime_ns
+        assert os.path.getsize(store_path) > HEADER_STRUCT.size
+    finally:
+        opening.close()
+
+
+def test_branch_depths_follow_dfs_order(compile_pgn):
+    store = RepertoireStore(compile_pgn(DRILL_TREE))
+    try:
+        assert list(store.branch_depths()) == [0, 5, 2, 1]
+    finally:
+        store.close()
+
+
+def test_drill_plan_skips_moves_already_drilled(compile_pgn):
+    store = RepertoireStore(compile_pgn(DRILL_TREE))
+    try:
+        # 白方：路線 1 只多了黑方的應著，不需練習；路線 2 換序後的 4. Bb5 已在路線 0 練過
+        starts, ends = store.drill_plan(chess.WHITE)
+        assert list(starts) == [0, NO_DRILL, 2, 2]
+        assert list(ends) == [7, 0, 5, 3]
+        # 黑方：每條路線都有新的黑方走法
+        starts, ends = store.drill_plan(chess.BLACK)
+        assert list(starts) == [1, 5, 3, 1]
+        assert list(ends) == [6, 6, 6, 2]
+    finally:
+        store.close()
@@ -0,0 +1,121 @@
+# chess_opening_trainer/tests/test_spaced_repetition.py
+import datetime
+
+import pytest
+from sqlalchemy import text
+
+from ..config import SRS_INITIAL_EASE, SRS_MIN_EASE
+from ..core.spaced_repetition import (QUALITY_FAIL, QUALITY_GOOD, DueHeap, SrsState, due_lines,
+                                      line_schedule_row, line_schedule_statement, review,
+                                      save_mistake_schedule)
+
+TODAY = datetime.date(2024, 3, 10)
+
+
+def _days(n: int) -> datetime.date:
+    return TODAY + datetime.timedelta(days=n)
+
+
+def test_good_answers_grow_interval_and_keep_ease():
+    state = SrsState()
+    intervals = []
+    for _ in range(4):
+        state = review(state, QUALITY_GOOD, TODAY)
+        intervals.append(state.interval_days)
+    assert intervals == [1, 6, 15, 38]
+    assert state.repetitions == 4
+    assert state.ease == pytest.approx(SRS_INITIAL_EASE)
+    assert state.due_on == _days(38)
+
+
+def test_failed_answer_resets_repetitions_and_lowers_ease():
+    state = SrsState(ease=2.5, interval_days=15, repetitions=3, due_on=TODAY)
+    state = review(state, QUALITY_FAIL, TODAY)
+    assert (state.repetitions, state.interval_days, state.due_on) == (0, 1, _days(1))
+    assert state.ease == pytest.approx(1.96)
+    # 答錯後重新從 1 天、6 天開始
+    state = review(state, QUALITY_GOOD, TODAY)
+    assert (state.repetitions, state.interval_days) == (1, 1)
+    state = review(state, QUALITY_GOOD, TODAY)
+    assert (state.repetitions, state.interval_days) == (2, 6)
+
+
+def test_ease_never_drops_below_floor():
+    state = SrsState()
+    for _ in range(5):
+        state = review(state, QUALITY_FAIL, TODAY)
+    assert state.ease == SRS_MIN_EASE
+    state = review(review(state, QUALITY_GOOD, TODAY), QUALITY_GOOD, TODAY)
+    state = review(state, QUALITY_GOOD, TODAY)
+    assert state.ease == pytest.approx(SRS_MIN_EASE)
+    assert state.interval_days == round(6 * SRS_MIN_EASE)
+
+
+def test_due_heap_orders_by_date_then_insertion():
+    heap = DueHeap()
+    heap.push(_days(2), "c")
+    heap.push(_days(0), "a1")
+    heap.push(_days(1), "b")
+    heap.push(_days(0), "a2")
+    heap.push(_days(0), "a3")
+    assert len(heap) == 5
+    assert heap.peek() == "a1"
+    assert [heap.pop() for _ in range(5)] == ["a1", "a2", "a3", "b", "c"]
+    assert len(heap) == 0
+
+
+def _schedule(session, due: dict):
+    for line_index, due_on in due.items():
+        state = SrsState(2.5, 1, 1, due_on)
+        session.execute(line_schedule_statement(), line_schedule_row(1, 1, line_index, state))
+    session.commit()
+
+
+def test_due_lines_returns_due_then_new_lines(memory_session_factory):
+    with memory_session_factory() as session:
+        # 第 9 條超出目前的路線數（開局庫被刪減過），不應出現
+        _schedule(session, {0: _days(-1), 1: _days(0), 2: _days(1), 3: _days(-2), 9: _days(-5)})
+        order, states = due_lines(session, 1, 1, num_lines=7, new_limit=2, today=TODAY)
+        assert order == [3, 0, 1, 4, 5]
+        assert set(states) == {0, 1, 3}
+        assert states[3].due_on == _days(-2)
+
+        # 其他使用者與開局庫的排程互不影響
+        assert due_lines(session, 2, 1, num_lines=7, new_limit=3, today=TODAY) == ([0, 1, 2], {})
+
+
+def test_due_lines_reviews_earliest_when_nothing_is_due(memory_session_factory):
+    with memory_session_factory() as session:
+        _schedule(session, {0: _days(5), 1: _days(2), 2: _days(3)})
+        order, states = due_lines(session, 1, 1, num_lines=3, new_limit=2, today=TODAY)
+        assert order == [1, 2]
+        assert set(states) == {1, 2}
+
+
+class _RecordingWriter:
+    def __init__(self):
+        self.rows = []
+
+    def schedule_mistake(self, row):
+        self.rows.append(row)
+
+
+def test_save_mistake_schedule(memory_session_factory):
+    with memory_session_factory() as session:
+        session.execute(text(
+            "INSERT INTO mistakes (id, position_key, epd, correct_move_uci, user_id, ease, interval_days, repetitions)"
+            " VALUES (5, 1, 'epd', 'e2e4', 1, 2.5, 0, 0)"
+        ))
+        session.commit()
+    state = review(SrsState(), QUALITY_GOOD, TODAY)
+
+    writer = _RecordingWriter()
+    save_mistake_schedule(5, state, writer=writer, session_factory=memory_session_factory)
+    assert writer.rows == [{'mistake_id': 5, **state.values()}]
+
+    save_mistake_schedule(5, state, session_factory=memory_session_factory)
+    with memory_session_factory() as session:
+        row = session.execute(text(
+            "SELECT ease, interval_days, repetitions, due_on FROM mistakes WHERE id = 5"
+        )).one()
+    assert tuple(row) == (2.5, 1, 1, str(_days(1)))
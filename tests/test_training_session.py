@@ -0,0 +1,28 @@
+# chess_opening_trainer/tests/test_training_session.py
+import chess
+
+from ..core.progress_tracker import ProgressTracker
+from ..core.training_session import TrainingSession
+
+REPERTOIRE = "1. e4 e5 2. Nf3 (2. Bc4 Nf6) 2... Nc6 *"
+
+
+def test_stop_cancels_pending_steps(make_opening, memory_session_factory, run_event_loop):
+    opening = make_opening(REPERTOIRE)
+    progress = ProgressTracker(1, session_factory=memory_session_factory)
+    session = TrainingSession(opening, chess.WHITE, computer_move_delay=0, error_display_delay=0,
+                              progress=progress, schedule="tree")
+    events = []
+    session.state_changed.connect(lambda event, board: events.append(board))
+    session.start_new_line()
+    assert run_event_loop() == []
+    session.handle_user_move(chess.Move.from_uci("e2e4"))  # 排程電腦回應 ...e5
+    shown = len(events)
+
+    session.stop()
+    assert run_event_loop() == []
+    assert len(events) == shown
+    assert progress.data.ply_index == 1
+
+    session.handle_user_move(chess.Move.from_uci("g1f3"))
+    assert progress.data.ply_index == 1
@@ -0,0 +1,140 @@
+# chess_opening_trainer/tests/test_write_behind.py
+import datetime
+
+import chess
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from ..database.database import Base, create_sqlite_engine
+from ..database import models  # noqa: F401  註冊模型
+from ..database.write_behind import WriteBehindWriter
+from ..services.user_profile import UserProfileService
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'writer.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, username, lichess_username) VALUES (1, 'a', 'alice'), (2, 'b', 'bob')"))
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def _scalar(session_factory, sql):
+    with session_factory() as session:
+        return session.execute(text(sql)).scalar()
+
+
+def test_failed_settings_do_not_drop_rest_of_batch(session_factory):
+    writer = WriteBehindWriter(session_factory=session_factory, interval=10.0)
+    board = chess.Board()
+    board.push_san("e4")
+    # 執行緒啟動前放入佇列，保證這些意圖落在同一批
+    writer.record_mistake(1, None, board, "e7e5")
+    result = writer.save_user_settings(2, {"lichess_username": "alice"})  # 與用戶 1 重複
+    writer.save_training_progress(1, 3, {"current_line_ptr": 0, "ply_index": 4, "schedule": "tree",
+                                         "num_lines": 9, "current_line": 0}, reset=True)
+    writer.record_stat(1, None, "lines_completed")
+    writer.start()
+    try:
+        assert writer.flush()
+    finally:
+        writer.close()
+
+    assert isinstance(result.exception(), IntegrityError)
+    assert _scalar(session_factory, "SELECT lichess_username FROM users WHERE id = 2") == "bob"
+    assert _scalar(session_factory, "SELECT count(*) FROM mistakes") == 1
+    assert _scalar(session_factory, "SELECT ply_index FROM training_progress WHERE opening_id = 3") == 4
+    assert _scalar(session_factory, "SELECT mistakes_made + lines_completed FROM daily_stats") == 2
+    stats = writer.stats()
+    assert stats.batches == 1 and stats.failed_batches == 1 and stats.intents == 3
+
+
+def test_save_settings_reports_failure(session_factory):
+    writer = WriteBehindWriter(session_factory=session_factory)
+    writer.start()
+    try:
+        profiles = UserProfileService(session_factory=session_factory, writer=writer)
+        before = profiles.profile
+        with pytest.raises(IntegrityError):
+            profiles.save_settings({"lichess_username": "bob"}).result(timeout=5)
+        assert profiles.profile == before
+
+        saved = profiles.save_settings({"lichess_username": "carol", "training_delay_ms": 200}).result(timeout=5)
+        assert saved.lichess_username == "carol"
+        assert profiles.profile == saved
+        assert _scalar(session_factory, "SELECT training_delay_ms FROM users WHERE id = 1") == 200
+    finally:
+        writer.close()
+
+
+def test_save_settings_does_not_wait_for_writer(session_factory):
+    writer = WriteBehindWriter(session_factory=session_factory, interval=10.0)
+    profiles = UserProfileService(session_factory=session_factory, writer=writer)
+    before = profiles.profile
+    # 寫入執行緒尚未啟動，save_settings 仍立即回傳；提交前快照不變
+    saved = profiles.save_settings({"training_delay_ms": 300})
+    assert not saved.done()
+    assert profiles.profile == before
+    writer.start()
+    try:
+        assert writer.flush()
+        assert saved.result(timeout=5).training_delay_ms == 300
+        assert profiles.profile.training_delay_ms == 300
+    finally:
+        writer.close()
+
+
+def test_profile_is_loaded_by_username(session_factory):
+    assert UserProfileService(session_factory=session_factory, default_username="b").profile.id == 2
+    # 多帳號之前的資料庫：用戶名稱與帳號名稱不同時沿用既有的用戶，不另外建立
+    assert UserProfileService(session_factory=session_factory, default_username="default").profile.id == 1
+    assert _scalar(session_factory, "SELECT count(*) FROM users") == 2
+
+
+def test_intents_commit_to_the_profile_they_were_queued_for(session_factory, tmp_path):
+    other = create_sqlite_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    Base.metadata.create_all(other)
+    first = session_factory.kw["bind"]
+    writer = WriteBehindWriter(session_factory=session_factory, interval=10.0)
+    try:
+        writer.record_stat(1, None, "lines_completed")
+        # 切換帳號：意圖仍在佇列中時重新綁定 session_factory
+        session_factory.configure(bind=other)
+        writer.record_stat(1, None, "lines_completed", amount=5)
+        writer.start()
+        assert writer.flush()
+    finally:
+        writer.close()
+        session_factory.configure(bind=first)
+
+    assert _scalar(session_factory, "SELECT lines_completed FROM daily_stats") == 1
+    with other.connect() as conn:
+        assert conn.execute(text("SELECT lines_completed FROM daily_stats")).scalar() == 5
+    other.dispose()
+
+
+def test_stat_intents_keep_the_day_they_were_sent(session_factory):
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    writer = WriteBehindWriter(session_factory=session_factory, interval=10.0)
+    board = chess.Board()
+    board.push_san("e4")
+    writer.record_mistake(1, None, board, "e7e5", day=yesterday)
+    writer.record_stat(1, None, "lines_completed", day=yesterday)
+    writer.record_stat(1, None, "lines_completed")
+    writer.start()
+    try:
+        assert writer.flush()
+    finally:
+        writer.close()
+    with session_factory() as session:
+        rows = session.execute(text(
+            "SELECT day, mistakes_made, lines_completed FROM daily_stats ORDER BY day"
+        )).fetchall()
+    assert [tuple(row) for row in rows] == [
+        (str(yesterday), 1, 1),
+        (str(datetime.date.today()), 0, 1),
+    ]